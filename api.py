@@ -0,0 +1,270 @@
+"""
+HTTP API for the Obsidian email service.
+
+    uvicorn api:app --port 8002
+"""
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import logging
+import smtplib
+import service
+from metrics import render_metrics
+from idempotency import IdempotencyCache, IdempotencyConflict, fingerprint, request_key
+from outbox import OutboxFullError
+from rate_limit import RateLimitExceeded
+from smtp_pool import enable_smtp_debug
+from service import (
+    API_SEND_MODE, EMAIL_ADDRESS, EMAIL_PASSWORD, EMAIL_BATCH_MAX, SEND_SECONDS,
+    build_message, get_outbox, get_smtp_pool, start_sending,
+)
+from async_smtp import AsyncSMTPPool
+from starlette.concurrency import run_in_threadpool
+
+# SMTP sessions for sends made on the event loop, created on first use
+async_smtp_pool = None
+
+def get_async_smtp_pool():
+    global async_smtp_pool
+    if async_smtp_pool is None:
+        pool = get_smtp_pool()
+        # Shares the blocking pool's rate limiter so the account has one budget
+        async_smtp_pool = AsyncSMTPPool(
+            pool.host, pool.port, pool.username, pool.password, rate_limiter=pool.rate_limiter,
+        )
+    return async_smtp_pool
+
+# Outcomes of /send-email requests by idempotency key, created on first use
+idempotency_cache = None
+
+def get_idempotency_cache():
+    global idempotency_cache
+    if idempotency_cache is None:
+        idempotency_cache = IdempotencyCache()
+    return idempotency_cache
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start draining the outbox as soon as the API is up
+    start_sending()
+    yield
+    if async_smtp_pool is not None:
+        await async_smtp_pool.close_all()
+
+app = FastAPI(lifespan=lifespan)
+
+class EmailRequest(BaseModel):
+    subject: str
+    recipient: str
+    body: str
+
+def send_email(subject: str, recipient: str, body: str):
+    with SEND_SECONDS.time(path="send_email"):
+        return _send_email(subject, recipient, body)
+
+def _send_email(subject: str, recipient: str, body: str):
+    try:
+        logging.info(f"Attempting to send email to: {recipient}")
+        if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+            logging.error("Email credentials not properly loaded")
+            logging.debug(f"EMAIL_ADDRESS: {'present' if EMAIL_ADDRESS else 'missing'}")
+            logging.debug(f"EMAIL_PASSWORD: {'present' if EMAIL_PASSWORD else 'missing'}")
+            raise ValueError("Email credentials not configured")
+
+        message = build_message(subject, recipient, body)
+
+        # Enhanced error handling for SMTP connection
+        try:
+            # Reuses an authenticated session from the pool when one is available
+            get_smtp_pool().send_message(message)
+            logging.info("Email sent successfully")
+        except smtplib.SMTPAuthenticationError:
+            logging.error("Authentication failed. Please check your email and app password.")
+            raise ValueError("Invalid email credentials. Make sure you're using an App Password for Gmail.")
+        except smtplib.SMTPException as smtp_error:
+            logging.error(f"SMTP error occurred: {smtp_error}")
+            raise
+
+        return True
+    except Exception as e:
+        logging.error(f"Failed to send email: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/send-email", status_code=202)
+async def send_email_endpoint(email_request: EmailRequest, response: Response,
+                              idempotency_key: str = Header(None, max_length=255)):
+    # Retries with the same Idempotency-Key (or, without one, the same content
+    # shortly after) get the first request's answer instead of a second email
+    request_fingerprint = fingerprint(email_request.subject, email_request.recipient, email_request.body)
+    key, ttl = request_key(idempotency_key, request_fingerprint)
+    try:
+        status_code, content, replayed = await get_idempotency_cache().run(
+            key, request_fingerprint, ttl, lambda: accept_email(email_request)
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    response.status_code = status_code
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return content
+
+async def accept_email(email_request: EmailRequest):
+    if API_SEND_MODE == "direct":
+        await send_email_async(email_request.subject, email_request.recipient, email_request.body)
+        return 200, {"message": "Email sent successfully"}
+    try:
+        job_id = await run_in_threadpool(
+            get_outbox().enqueue, email_request.subject, email_request.recipient, email_request.body
+        )
+    except OutboxFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return 202, {"message": "Email queued", "job_id": job_id}
+
+async def send_email_async(subject: str, recipient: str, body: str):
+    """Send one message on the event loop; raises HTTPException on failure."""
+    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+        logging.error("Email credentials not properly loaded")
+        raise HTTPException(status_code=500, detail="Email credentials not configured")
+    try:
+        with SEND_SECONDS.time(path="send_email_async"):
+            await get_async_smtp_pool().send_message(build_message(subject, recipient, body))
+        logging.info(f"Email sent to {recipient}")
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except smtplib.SMTPAuthenticationError:
+        logging.error("Authentication failed. Please check your email and app password.")
+        raise HTTPException(status_code=500, detail="Invalid email credentials. Make sure you're using an App Password for Gmail.")
+    except (smtplib.SMTPException, OSError) as e:
+        logging.error(f"Failed to send email: {e}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+async def read_batch_items(request: Request):
+    """Yield raw items from a JSON array body or an NDJSON stream."""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+    else:
+        try:
+            items = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+        for item in items:
+            yield item
+
+@app.post("/send-emails")
+async def send_emails_endpoint(request: Request):
+    if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
+        raise HTTPException(status_code=500, detail="Email credentials not configured")
+
+    # Validate everything up front so bad items are reported without being sent
+    messages = []
+    positions = []
+    invalid = []
+    count = 0
+    async for item in read_batch_items(request):
+        if count >= EMAIL_BATCH_MAX:
+            raise HTTPException(status_code=413, detail=f"Batch is limited to {EMAIL_BATCH_MAX} messages")
+        try:
+            if isinstance(item, (bytes, str)):
+                email_request = EmailRequest.model_validate_json(item)
+            else:
+                email_request = EmailRequest.model_validate(item)
+            messages.append(build_message(email_request.subject, email_request.recipient, email_request.body))
+            positions.append(count)
+        except ValidationError as e:
+            invalid.append({"index": count, "status": "invalid", "error": str(e)})
+        count += 1
+
+    pool = get_async_smtp_pool()
+
+    async def send_one(position, message):
+        try:
+            await pool.send_message(message)
+        except (smtplib.SMTPException, OSError, ValueError) as e:
+            return {"index": position, "status": "failed", "error": str(e)}
+        return {"index": position, "status": "sent"}
+
+    async def stream_results():
+        for result in invalid:
+            yield json.dumps(result) + "\n"
+        # One task per message; the pool's semaphore bounds how many are on the wire
+        tasks = [asyncio.ensure_future(send_one(position, message)) for position, message in zip(positions, messages)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield json.dumps(await task) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: int):
+    entry = get_outbox().get(job_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {key: entry[key] for key in ("id", "status", "attempts", "last_error", "created_at", "sent_at")}
+
+@app.get("/admin/outbox")
+def list_outbox(status: str = None, limit: int = 100):
+    return {"counts": get_outbox().counts(), "messages": get_outbox().list(status, limit)}
+
+@app.post("/admin/outbox/retry")
+def retry_outbox(status: str = "dead"):
+    return {"retried": get_outbox().retry(status=status)}
+
+@app.post("/admin/outbox/{message_id}/retry")
+def retry_outbox_message(message_id: int):
+    if not get_outbox().retry(message_id):
+        raise HTTPException(status_code=404, detail="Message not found or currently sending")
+    return {"retried": 1}
+
+@app.delete("/admin/outbox")
+def purge_outbox(status: str = "sent", older_than: float = 0):
+    return {"purged": get_outbox().purge(status=status, older_than=older_than)}
+
+@app.delete("/admin/outbox/{message_id}")
+def purge_outbox_message(message_id: int):
+    if not get_outbox().purge(message_id):
+        raise HTTPException(status_code=404, detail="Message not found or currently sending")
+    return {"purged": 1}
+
+@app.post("/admin/smtp-debug")
+def smtp_debug(level: int = 1, minutes: float = 10):
+    # Wire transcripts are logged for a while, then switch themselves off
+    enable_smtp_debug(level, minutes * 60)
+    return {"level": level, "minutes": minutes if level else 0}
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/smtp-pool/stats")
+def smtp_pool_stats():
+    pool = get_smtp_pool()
+    stats = pool.stats()
+    stats["rate_limit"] = pool.rate_limiter.stats()
+    if async_smtp_pool is not None:
+        stats["async"] = async_smtp_pool.stats()
+    return stats
+
+@app.get("/watcher/stats")
+async def watcher_stats():
+    if service.vault_supervisor is not None:
+        return service.vault_supervisor.stats()
+    if service.watcher_handler is None:
+        raise HTTPException(status_code=404, detail="File watcher is not running")
+    return service.watcher_handler.stats()
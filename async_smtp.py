@@ -0,0 +1,397 @@
+"""
+asyncio SMTP client for the HTTP API.
+
+Speaks ESMTP over asyncio streams (STARTTLS, AUTH PLAIN/LOGIN, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT), so a send waiting on the server costs a coroutine
+rather than a thread. Errors are raised as the smtplib exception types, so
+callers and the rate limiter treat both clients alike. The watcher and the
+outbox keep using the blocking pool in smtp_pool.py.
+"""
+import asyncio
+import base64
+import io
+import logging
+import os
+import re
+import smtplib
+import ssl
+import time
+from email.generator import BytesGenerator
+from email.utils import getaddresses
+
+from rate_limit import RATE_LIMIT_MAX_WAIT, RateLimitExceeded
+from smtp_pool import (
+    SMTP_CONNECT_TIMEOUT, SMTP_IDLE_TIMEOUT, SMTP_KEEPALIVE_INTERVAL,
+    SMTP_MAX_MESSAGES_PER_CONNECTION, SMTP_PHASE_SECONDS, smtp_debug_level, wire_log,
+)
+
+# Sessions open at the same time; further sends wait on the semaphore without a thread each
+SMTP_ASYNC_MAX_SESSIONS = int(os.getenv("SMTP_ASYNC_MAX_SESSIONS", "10"))
+SMTP_COMMAND_TIMEOUT = float(os.getenv("SMTP_COMMAND_TIMEOUT", "60"))
+
+_LEADING_DOT = re.compile(rb"(?m)^\.")
+
+
+def _tls_context():
+    # Same settings smtplib.starttls() uses without a context, so both clients behave alike
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _flatten(message):
+    """Serialize a message the way smtplib.send_message does: CRLF line endings, dot-stuffed."""
+    buffer = io.BytesIO()
+    BytesGenerator(buffer, policy=message.policy.clone(linesep="\r\n")).flatten(message, linesep="\r\n")
+    data = _LEADING_DOT.sub(b"..", buffer.getvalue())
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+def _envelope(message):
+    sender = getaddresses([message["Sender"] or message["From"]])[0][1]
+    recipients = [address for _, address in getaddresses(
+        [value for field in ("To", "Cc", "Bcc") for value in message.get_all(field, [])]
+    )]
+    return sender, recipients
+
+
+class AsyncSMTPSession:
+    """One authenticated SMTP connection driven by asyncio streams."""
+
+    def __init__(self, host, port, timeout=SMTP_CONNECT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+        self.extensions = {}
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.message_count = 0
+        self.data_sent = False
+
+    async def _read_reply(self):
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), SMTP_COMMAND_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise smtplib.SMTPServerDisconnected("Timed out waiting for the SMTP server")
+            except (ConnectionError, OSError) as e:
+                raise smtplib.SMTPServerDisconnected(str(e))
+            if not line:
+                raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+            try:
+                code = int(line[:3])
+            except ValueError:
+                raise smtplib.SMTPServerDisconnected(f"Malformed SMTP reply: {line[:100]!r}")
+            lines.append(line[4:].strip())
+            if line[3:4] != b"-":
+                if smtp_debug_level():
+                    wire_log.info(f"reply: {code} {b' '.join(lines)!r}")
+                return code, b"\n".join(lines)
+
+    async def command(self, line, secret=False):
+        if smtp_debug_level():
+            # Credentials never reach the log
+            shown = " ".join(line.split(" ")[:2]) + " ****" if secret and line.startswith("AUTH") else "****" if secret else line
+            wire_log.info(f"send: {shown!r}")
+        try:
+            self.writer.write(line.encode() + b"\r\n")
+            await self.writer.drain()
+        except (ConnectionError, OSError) as e:
+            raise smtplib.SMTPServerDisconnected(str(e))
+        return await self._read_reply()
+
+    async def _ehlo(self):
+        code, reply = await self.command("EHLO localhost")
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, reply)
+        self.extensions = {}
+        for feature in reply.decode(errors="replace").splitlines()[1:]:
+            name, _, params = feature.partition(" ")
+            self.extensions[name.upper()] = params
+
+    async def connect(self, username, password):
+        with SMTP_PHASE_SECONDS.time(phase="connect"):
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.timeout
+            )
+        try:
+            code, reply = await self._read_reply()
+            if code != 220:
+                raise smtplib.SMTPConnectError(code, reply)
+            await self._ehlo()
+            if "STARTTLS" not in self.extensions:
+                raise smtplib.SMTPNotSupportedError("STARTTLS extension not supported by server.")
+            with SMTP_PHASE_SECONDS.time(phase="starttls"):
+                code, reply = await self.command("STARTTLS")
+                if code != 220:
+                    raise smtplib.SMTPResponseException(code, reply)
+                await asyncio.wait_for(self.writer.start_tls(_tls_context(), server_hostname=self.host), self.timeout)
+            await self._ehlo()
+            with SMTP_PHASE_SECONDS.time(phase="login"):
+                await self._login(username, password)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _login(self, username, password):
+        methods = self.extensions.get("AUTH", "").upper().split()
+        if "PLAIN" in methods:
+            token = base64.b64encode(f"\0{username}\0{password}".encode()).decode()
+            code, reply = await self.command(f"AUTH PLAIN {token}", secret=True)
+        elif "LOGIN" in methods:
+            code, reply = await self.command("AUTH LOGIN")
+            if code == 334:
+                code, reply = await self.command(base64.b64encode(username.encode()).decode(), secret=True)
+            if code == 334:
+                code, reply = await self.command(base64.b64encode(password.encode()).decode(), secret=True)
+        else:
+            raise smtplib.SMTPNotSupportedError("No suitable authentication method found.")
+        if code not in (235, 503):
+            raise smtplib.SMTPAuthenticationError(code, reply)
+
+    async def send_message(self, message):
+        sender, recipients = _envelope(message)
+        data = _flatten(message)
+        # Once the message data is on the wire the server may have accepted it
+        self.data_sent = False
+        try:
+            code, reply = await self.command(f"MAIL FROM:<{sender}>")
+            if code != 250:
+                raise smtplib.SMTPSenderRefused(code, reply, sender)
+            refused = {}
+            for recipient in recipients:
+                code, reply = await self.command(f"RCPT TO:<{recipient}>")
+                if code not in (250, 251):
+                    refused[recipient] = (code, reply)
+            if len(refused) == len(recipients):
+                raise smtplib.SMTPRecipientsRefused(refused)
+            code, reply = await self.command("DATA")
+            if code != 354:
+                raise smtplib.SMTPDataError(code, reply)
+            self.data_sent = True
+            self.writer.write(data)
+            try:
+                await self.writer.drain()
+            except (ConnectionError, OSError) as e:
+                raise smtplib.SMTPServerDisconnected(str(e))
+            code, reply = await self._read_reply()
+            if code != 250:
+                raise smtplib.SMTPDataError(code, reply)
+        except smtplib.SMTPResponseException:
+            await self._reset()
+            raise
+        except smtplib.SMTPRecipientsRefused:
+            await self._reset()
+            raise
+        self.message_count += 1
+        return refused
+
+    async def _reset(self):
+        # Leave the session usable for the next message
+        try:
+            await self.command("RSET")
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+
+    async def noop(self):
+        code, _ = await self.command("NOOP")
+        return code == 250
+
+    async def quit(self):
+        try:
+            await asyncio.wait_for(self.command("QUIT"), 5)
+        except (smtplib.SMTPException, asyncio.TimeoutError):
+            pass
+        self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class AsyncSMTPPool:
+    """
+    Pool of authenticated asyncio SMTP sessions for code running on an event loop.
+
+    At most max_sessions sends are on the wire at once; the rest wait on a
+    semaphore. Sessions are reused, checked with NOOP after a quiet spell,
+    recycled like the blocking pool's, and re-established once on disconnect.
+    The pool is tied to the loop it is first used on; used from another loop
+    it drops its sessions and starts over.
+    """
+
+    def __init__(self, host, port, username, password, max_sessions=SMTP_ASYNC_MAX_SESSIONS,
+                 max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 keepalive_interval=SMTP_KEEPALIVE_INTERVAL, timeout=SMTP_CONNECT_TIMEOUT,
+                 rate_limiter=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+
+        self._loop = None
+        self._semaphore = None
+        self._idle = []
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.recycled = 0
+        self.handshakes = 0
+        self.handshake_time_total = 0.0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Streams cannot move between loops; anything left from the old one is abandoned
+            for session in self._idle:
+                session.close()
+            self._idle = []
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_sessions)
+
+    async def _connect(self):
+        start = time.perf_counter()
+        session = AsyncSMTPSession(self.host, self.port, self.timeout)
+        await session.connect(self.username, self.password)
+        elapsed = time.perf_counter() - start
+        self.handshakes += 1
+        self.handshake_time_total += elapsed
+        logging.info(f"Opened async SMTP session to {self.host}:{self.port} in {elapsed * 1000:.1f} ms")
+        return session
+
+    async def _checkout(self):
+        now = time.monotonic()
+        while self._idle:
+            session = self._idle.pop()
+            if session.writer is None:
+                continue
+            if (session.message_count >= self.max_messages
+                    or now - session.last_used >= self.idle_timeout):
+                self.recycled += 1
+                await session.quit()
+                continue
+            if now - session.last_used >= self.keepalive_interval:
+                try:
+                    alive = await session.noop()
+                except smtplib.SMTPException:
+                    alive = False
+                if not alive:
+                    self.reconnects += 1
+                    session.close()
+                    continue
+            self.hits += 1
+            return session
+        self.misses += 1
+        return await self._connect()
+
+    def _checkin(self, session):
+        session.last_used = time.monotonic()
+        if session.writer is None:
+            return
+        if session.message_count >= self.max_messages:
+            self.recycled += 1
+            session.close()
+            return
+        self._idle.append(session)
+
+    async def _acquire_budget(self):
+        # The limiter's own acquire() sleeps in the calling thread, so poll it without waiting;
+        # it takes a lock and persists the daily count, so even the poll runs off the event loop
+        waited = 0.0
+        while True:
+            try:
+                await asyncio.to_thread(self.rate_limiter.acquire, max_wait=0)
+                return
+            except RateLimitExceeded as e:
+                if waited + e.retry_after > RATE_LIMIT_MAX_WAIT:
+                    raise
+                await asyncio.sleep(e.retry_after)
+                waited += e.retry_after
+
+    async def _send(self, session, message):
+        try:
+            with SMTP_PHASE_SECONDS.time(phase="data"):
+                await session.send_message(message)
+        except smtplib.SMTPException as e:
+            if self.rate_limiter is not None:
+                await asyncio.to_thread(self.rate_limiter.record_failure, e)
+            raise
+        if self.rate_limiter is not None:
+            await asyncio.to_thread(self.rate_limiter.record_success)
+
+    async def send_message(self, message):
+        """
+        Send a message over a pooled session, reconnecting once if the
+        session drops before the message data was sent. One rate limit token
+        is spent per message, however many attempts it takes.
+        """
+        self._bind_loop()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            if self.rate_limiter is not None:
+                await self._acquire_budget()
+            for attempt in range(2):
+                session = await self._checkout()
+                try:
+                    await self._send(session, message)
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    session.close()
+                    # Sending again could deliver the message twice
+                    if attempt == 1 or session.data_sent:
+                        raise
+                    self.reconnects += 1
+                    logging.warning("Async SMTP session dropped, reconnecting...")
+                    continue
+                except smtplib.SMTPException:
+                    self._checkin(session)
+                    raise
+                except BaseException:
+                    # Cancelled mid-command: the session's state is unknown
+                    session.close()
+                    raise
+                self._checkin(session)
+                return
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def close_all(self):
+        idle, self._idle = self._idle, []
+        for session in idle:
+            await session.quit()
+
+    def stats(self):
+        return {
+            "max_sessions": self.max_sessions,
+            "idle": len(self._idle),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reconnects": self.reconnects,
+            "recycled": self.recycled,
+            "handshakes": self.handshakes,
+            "handshake_time_total_ms": round(self.handshake_time_total * 1000, 3),
+            "handshake_time_avg_ms": round(self.handshake_time_total * 1000 / self.handshakes, 3) if self.handshakes else 0.0,
+        }
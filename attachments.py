@@ -0,0 +1,204 @@
+"""
+Files embedded in notes ("![[file.png]]"), sent as attachments.
+
+Embeds are resolved against the vault the way Obsidian resolves links: a
+path relative to the vault root or to the note, otherwise the file with
+that name closest to the vault root. Resolved lookups are cached per vault.
+Only the paths are stored with a queued message; at send time each file is
+read in chunks and base64-encoded straight onto the SMTP socket, so memory
+use does not grow with attachment size.
+"""
+import base64
+import logging
+import mimetypes
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from email.generator import BytesGenerator
+from email.mime.base import MIMEBase
+from io import BytesIO
+
+ATTACHMENTS_ENABLED = os.getenv("ATTACHMENTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Per file and per message, before base64 (which adds a third)
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+ATTACHMENT_MAX_TOTAL_BYTES = int(os.getenv("ATTACHMENT_MAX_TOTAL_BYTES", str(18 * 1024 * 1024)))
+ATTACHMENT_CACHE_SIZE = int(os.getenv("ATTACHMENT_CACHE_SIZE", "1000"))
+# A name that is not found triggers a fresh walk of the vault at most this often
+ATTACHMENT_INDEX_TTL = 60.0
+# A multiple of 57 bytes, so every chunk encodes to whole 76-character lines
+ATTACHMENT_CHUNK_SIZE = 57 * 1024
+
+_NEWLINES = re.compile(rb"\r\n|\n|\r")
+_LEADING_DOT = re.compile(rb"(?m)^\.")
+
+
+class AttachmentResolver:
+    def __init__(self, vault_path, path_filter=None, cache_size=ATTACHMENT_CACHE_SIZE):
+        self.root = os.path.realpath(vault_path)
+        self.path_filter = path_filter
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # (note directory, link) -> path
+        self._index = None  # file name -> [paths]
+        self._indexed_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve_all(self, links, note_path):
+        paths = []
+        for link in links:
+            path = self.resolve(link, note_path)
+            if path is None:
+                logging.info(f"Embedded file not found in the vault: {link}")
+            elif path not in paths:
+                paths.append(path)
+        return paths
+
+    def resolve(self, link, note_path):
+        """Absolute path of the vault file an embed refers to, or None; embedded notes are not attachments."""
+        if os.path.splitext(link)[1].lower() in ("", ".md"):
+            return None
+        key = (os.path.dirname(note_path), link)
+        with self._lock:
+            path = self._cache.get(key)
+            if path is not None:
+                self._cache.move_to_end(key)
+        if path is not None and os.path.isfile(path):
+            self.hits += 1
+            return path
+        self.misses += 1
+        path = self._lookup(link, key[0])
+        with self._lock:
+            if path is None:
+                self._cache.pop(key, None)
+            else:
+                self._cache[key] = path
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return path
+
+    def _inside(self, path):
+        real = os.path.realpath(path)
+        return real if real.startswith(os.path.join(self.root, "")) and os.path.isfile(real) else None
+
+    def _lookup(self, link, note_dir):
+        for candidate in (os.path.join(self.root, link), os.path.join(note_dir, link)):
+            path = self._inside(candidate)
+            if path is not None:
+                return path
+        with self._lock:
+            index, indexed_at = self._index, self._indexed_at
+        if index is None:
+            index, indexed_at = self._build_index(), time.monotonic()
+        path = self._search(index, link)
+        if path is None and time.monotonic() - indexed_at >= ATTACHMENT_INDEX_TTL:
+            # Possibly added since the vault was last walked
+            path = self._search(self._build_index(), link)
+        return path
+
+    def _search(self, index, link):
+        suffix = os.sep + os.path.normpath(link)
+        candidates = [path for path in index.get(os.path.basename(link), ()) if path.endswith(suffix)]
+        # Closest to the vault root wins, as in Obsidian
+        for path in sorted(candidates, key=lambda path: (path.count(os.sep), path)):
+            path = self._inside(path)
+            if path is not None:
+                return path
+        return None
+
+    def _build_index(self):
+        index = {}
+        for directory, subdirs, files in os.walk(self.root):
+            if self.path_filter is not None:
+                subdirs[:] = [name for name in subdirs if not self.path_filter.excludes_dir(os.path.join(directory, name))]
+            for name in files:
+                index.setdefault(name, []).append(os.path.join(directory, name))
+        with self._lock:
+            self._index = index
+            self._indexed_at = time.monotonic()
+        return index
+
+    def stats(self):
+        with self._lock:
+            return {"attachment_cache": len(self._cache), "attachment_cache_hits": self.hits,
+                    "attachment_cache_misses": self.misses}
+
+
+def select_attachments(paths, max_bytes=ATTACHMENT_MAX_BYTES, max_total=ATTACHMENT_MAX_TOTAL_BYTES):
+    """Split paths into those within the size caps and a line for the email body about each one left out."""
+    kept, skipped = [], []
+    total = 0
+    for path in paths:
+        name = os.path.basename(path)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            skipped.append(f"Attachment not sent: {name} (no longer in the vault)")
+            continue
+        if size > max_bytes:
+            skipped.append(f"Attachment not sent: {name} ({_megabytes(size)} is over the {_megabytes(max_bytes)} limit)")
+        elif total + size > max_total:
+            skipped.append(f"Attachment not sent: {name} (attachments are limited to {_megabytes(max_total)} per email)")
+        else:
+            kept.append(path)
+            total += size
+    return kept, skipped
+
+
+def _megabytes(size):
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+class StreamingMessage:
+    """
+    A built message plus files to attach when it is sent. chunks() yields
+    the whole message as SMTP DATA (CRLF line ends, dot-stuffed): the headers
+    and text part first, then each file base64-encoded a chunk at a time.
+    """
+
+    def __init__(self, message, paths, max_bytes=ATTACHMENT_MAX_BYTES):
+        self.message = message
+        self.paths = paths
+        self.max_bytes = max_bytes
+
+    def envelope(self):
+        return self.message["From"], [self.message["To"]]
+
+    def _flatten(self, part):
+        buffer = BytesIO()
+        BytesGenerator(buffer, policy=part.policy.clone(linesep="\r\n")).flatten(part)
+        return _LEADING_DOT.sub(b"..", _NEWLINES.sub(b"\r\n", buffer.getvalue()))
+
+    def chunks(self):
+        boundary = "=" * 15 + uuid.uuid4().hex
+        self.message.set_boundary(boundary)
+        delimiter = f"--{boundary}".encode()
+        # Everything up to the closing delimiter; the files go in its place
+        head, _, _ = self._flatten(self.message).rpartition(delimiter + b"--")
+        yield head
+        for path in self.paths:
+            try:
+                file = open(path, "rb")
+            except OSError as e:
+                logging.warning(f"Attachment skipped, cannot open {path}: {e}")
+                continue
+            with file:
+                size = os.fstat(file.fileno()).st_size
+                if size > self.max_bytes:
+                    logging.warning(f"Attachment skipped, {path} grew to {_megabytes(size)}")
+                    continue
+                maintype, subtype = (mimetypes.guess_type(path)[0] or "application/octet-stream").split("/", 1)
+                part = MIMEBase(maintype, subtype)
+                part.add_header("Content-Disposition", "attachment", filename=os.path.basename(path))
+                part["Content-Transfer-Encoding"] = "base64"
+                # An empty payload flattens to just the part's headers and the blank line after them
+                yield delimiter + b"\r\n" + self._flatten(part)
+                while True:
+                    chunk = file.read(ATTACHMENT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield base64.encodebytes(chunk).replace(b"\n", b"\r\n")
+        yield delimiter + b"--\r\n"
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark for note parsing.
+
+Compares the original split-and-walk-twice parse_content with the single-pass
+streaming parser on synthetic notes of growing size, reporting parse time and
+peak traced memory (which includes the returned task list).
+
+    python benchmarks/bench_parser.py [--sizes 10000,100000,1000000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from note_parser import parse_file  # noqa: E402
+
+
+def legacy_parse_file(file_path):
+    # The parser as it was before note_parser, kept here as the baseline
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = file.read()
+    lines = content.split("\n")
+    sender_name = None
+    tasks = []
+    has_send_tag = False
+    for line in lines:
+        if line.replace(" ", "").startswith("#sender:"):
+            sender_name = line[line.find("#sender")+7:].strip()
+        elif line.strip() == "#send":
+            has_send_tag = True
+    for line in lines:
+        if not line.strip().startswith("#"):
+            tasks.append(line.strip())
+    return has_send_tag, sender_name, tasks
+
+
+def write_note(path, size):
+    line = "- [ ] some journal entry with a reasonable amount of text in it\n"
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("#sender: Bench\n")
+        written = 0
+        while written < size:
+            file.write(line)
+            written += len(line)
+        file.write("#send\n")
+
+
+def measure(func, path, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(path)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    result = func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000,5000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'size':>10} {'parser':>9} {'best ms':>10} {'peak KiB':>10}")
+        for size in (int(s) for s in args.sizes.split(",")):
+            path = os.path.join(tmp, f"note_{size}.md")
+            write_note(path, size)
+            for name, func in (("legacy", legacy_parse_file), ("streaming", parse_file)):
+                best, peak, _ = measure(func, path, args.repeat)
+                print(f"{size:>10} {name:>9} {best * 1000:>10.2f} {peak / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
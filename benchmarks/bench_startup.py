@@ -0,0 +1,77 @@
+"""
+Import-time profile of each entry point.
+
+Runs every configuration in a fresh interpreter (so nothing is cached in
+sys.modules), reports the median wall time and the heaviest imports from
+`python -X importtime`.
+
+    python benchmarks/bench_startup.py --runs 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# What each way of starting the service imports before it can do any work
+ENTRY_POINTS = {
+    "daemon (watcher)": "import daemon, service, watchdog.observers",
+    "daemon (api)": "import daemon, service, api, uvicorn",
+    "daemon (watcher + api)": "import daemon, service, watchdog.observers, api, uvicorn",
+    "desktop app": "import main",
+}
+
+
+def wall_time(code, env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def heaviest_imports(code, env, top):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Only top-level entries; nested imports are indented
+        if not name.startswith("  "):
+            timings.append((int(cumulative), name.strip()))
+    timings.sort(reverse=True)
+    return {name: round(us / 1000, 1) for us, name in timings[:top]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Heaviest top-level imports to list")
+    args = parser.parse_args()
+
+    # Keep a stray .env from changing what gets configured
+    env = dict(os.environ, DB_PATH=os.devnull)
+    # Warm the filesystem cache and compile bytecode first
+    wall_time("import main, daemon, api", env)
+
+    results = {}
+    for name, code in ENTRY_POINTS.items():
+        times = [wall_time(code, env) for _ in range(args.runs)]
+        results[name] = {
+            "median_ms": round(statistics.median(times) * 1000, 1),
+            "min_ms": round(min(times) * 1000, 1),
+            "heaviest_imports_ms": heaviest_imports(code, env, args.top),
+        }
+    results["python -c pass"] = {"median_ms": round(statistics.median(
+        [wall_time("pass", env) for _ in range(args.runs)]) * 1000, 1)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+End-to-end benchmarks against a synthetic vault and a local SMTP sink.
+
+Runs fully offline. Scenarios:
+  cold_start  - startup catch-up over a fresh vault, then a rescan with a warm manifest
+  burst       - many notes edited at once under the real watchdog observer
+  send_email  - concurrent POST /send-email load through the API and the outbox
+
+Results are printed as JSON (events/sec, p50/p99 latency in ms, RSS in MiB),
+so runs of different revisions can be compared directly.
+
+    python benchmarks/run_benchmarks.py --notes 5000 --output bench_output.txt
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smtp_sink import SMTPSink  # noqa: E402
+from synthetic_vault import generate_vault  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    return {
+        "p50_ms": round(percentile(seconds, 0.50) * 1000, 3) if seconds else None,
+        "p99_ms": round(percentile(seconds, 0.99) * 1000, 3) if seconds else None,
+    }
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        try:
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        except ImportError:
+            return None
+
+
+def wait_for(condition, timeout, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def outbox_sent_times(service, source_paths):
+    conn = service.get_outbox().store.connection()
+    rows = conn.execute(
+        "SELECT source_path, sent_at FROM outbox WHERE status = 'sent' AND source_path IS NOT NULL"
+    ).fetchall()
+    return {path: sent_at for path, sent_at in rows if path in source_paths}
+
+
+def wait_until_idle(handler, timeout):
+    return wait_for(
+        lambda: handler.debouncer.pending() == 0 and handler.workers.stats()["queue_depth"] == 0
+        and handler.workers.stats()["busy_workers"] == 0,
+        timeout,
+    )
+
+
+def run_cold_start(service, vault, paths, timeout):
+    handler = service.ObsidianHandler(vault)
+    try:
+        start = time.perf_counter()
+        handler.catch_up()
+        scan = handler.scan_report
+        wait_until_idle(handler, timeout)
+        elapsed = time.perf_counter() - start
+        handler.manifest.flush()
+
+        start = time.perf_counter()
+        handler.catch_up()
+        rescan = handler.scan_report
+        rescan_elapsed = time.perf_counter() - start
+    finally:
+        handler.stop()
+    return {
+        "files": scan["files"],
+        "scan_s": scan["duration_s"],
+        "catch_up_s": round(elapsed, 3),
+        "events_per_sec": round(scan["queued"] / elapsed, 1) if elapsed else None,
+        "warm_rescan_s": round(rescan_elapsed, 3),
+        "warm_rescan_queued": rescan["queued"],
+        "rss_mb": rss_mb(),
+    }
+
+
+def run_burst(service, vault, paths, edits, timeout):
+    from watchdog.observers import Observer
+
+    processed = service.is_file_processed
+    targets = [path for path in paths if not processed(path)][:edits]
+    handler = service.ObsidianHandler(vault)
+    observer = Observer()
+    service.schedule_vault(observer, handler, vault)
+    observer.start()
+    try:
+        time.sleep(0.5)
+        edited_at = {}
+        start = time.perf_counter()
+        for path in targets:
+            with open(path, "a", encoding="utf-8") as file:
+                file.write("- [ ] one more thing\n#send\n")
+            edited_at[path] = time.time()
+        target_set = set(targets)
+        wait_for(lambda: len(outbox_sent_times(service, target_set)) >= len(targets), timeout, interval=0.2)
+        sent = outbox_sent_times(service, target_set)
+        elapsed = time.perf_counter() - start
+    finally:
+        observer.stop()
+        observer.join()
+        handler.stop()
+    latencies = [sent[path] - edited_at[path] for path in sent]
+    result = {
+        "edits": len(targets),
+        "delivered": len(sent),
+        "events_per_sec": round(len(sent) / elapsed, 1) if elapsed else None,
+        "rss_mb": rss_mb(),
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def run_send_email(service, requests, concurrency, timeout):
+    from fastapi.testclient import TestClient
+    from api import app
+
+    payload = {"subject": "Benchmark", "recipient": "sink@example.com", "body": "Hello from the benchmark"}
+    latencies = []
+    lock = threading.Lock()
+
+    with TestClient(app) as client:
+        sent_before = service.get_outbox().counts().get("sent", 0)
+
+        def post(i):
+            start = time.perf_counter()
+            # Distinct bodies, or the API would treat the requests as retries of one another
+            response = client.post("/send-email", json=dict(payload, body=f"{payload['body']} #{i}"))
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+            return response.status_code
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            statuses = list(executor.map(post, range(requests)))
+        accepted_s = time.perf_counter() - start
+        accepted = sum(1 for status in statuses if status == 202)
+        wait_for(lambda: service.get_outbox().counts().get("sent", 0) - sent_before >= accepted, timeout, interval=0.1)
+        delivered_s = time.perf_counter() - start
+        delivered = service.get_outbox().counts().get("sent", 0) - sent_before
+
+    result = {
+        "requests": requests,
+        "accepted": accepted,
+        "requests_per_sec": round(requests / accepted_s, 1),
+        "delivered": delivered,
+        "delivered_per_sec": round(delivered / delivered_s, 1) if delivered_s else None,
+        "rss_mb": rss_mb(),
+    }
+    result.update(latency_summary(latencies))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--note-size", type=int, default=2000)
+    parser.add_argument("--send-share", type=float, default=0.05)
+    parser.add_argument("--burst-edits", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay the sink adds to every SMTP reply")
+    parser.add_argument("--quiet-period", type=float, default=0.2, help="Debounce quiet period in seconds")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--scenarios", default="cold_start,burst,send_email")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="obsidian-bench-")
+    vault = os.path.join(workdir, "vault")
+    sink = SMTPSink(latency=args.latency_ms / 1000)
+    port = sink.start()
+
+    # Configuration is read at import time, so it has to be in place first
+    os.environ.update({
+        "EMAIL_ADDRESS": "bench@example.com",
+        "EMAIL_PASSWORD": "bench",
+        "SMTP_SERVER": "127.0.0.1",
+        "SMTP_PORT": str(port),
+        "SMTP_DEBUG_LEVEL": "0",
+        "OBSIDIAN_VAULT_PATH": vault,
+        "DB_PATH": os.path.join(workdir, "data", "bench.db"),
+        "DEBOUNCE_QUIET_PERIOD": str(args.quiet_period),
+        "RATE_LIMIT_PER_SECOND": "0",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "RATE_LIMIT_PER_DAY": "0",
+    })
+    import logging
+    import service
+    from database import init_db
+    logging.getLogger().setLevel(logging.WARNING)
+    init_db()
+
+    paths = generate_vault(vault, args.notes, args.note_size, args.send_share)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    results = {
+        "config": vars(args),
+        "rss_mb_start": rss_mb(),
+    }
+    try:
+        if "cold_start" in scenarios:
+            results["cold_start"] = run_cold_start(service, vault, paths, args.timeout)
+        if "burst" in scenarios:
+            results["burst"] = run_burst(service, vault, paths, args.burst_edits, args.timeout)
+        if "send_email" in scenarios:
+            results["send_email"] = run_send_email(service, args.requests, args.concurrency, args.timeout)
+        results["smtp_sink"] = sink.stats()
+        results["smtp_pool"] = service.get_smtp_pool().stats()
+    finally:
+        service.get_outbox().stop()
+        service.get_smtp_pool().close_all()
+        sink.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
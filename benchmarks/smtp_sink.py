@@ -0,0 +1,168 @@
+"""
+Local SMTP stand-in for offline benchmarks.
+
+Speaks just enough ESMTP for smtplib: EHLO, STARTTLS (with a throwaway
+self-signed certificate made by the openssl CLI), AUTH PLAIN/LOGIN, MAIL,
+RCPT, DATA, RSET, NOOP and QUIT. Every command can be delayed to mimic a
+network round trip, and per-phase timings are recorded.
+
+    python benchmarks/smtp_sink.py --port 2525 --latency-ms 20
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+
+def make_tls_context(directory):
+    if shutil.which("openssl") is None:
+        raise RuntimeError("The SMTP sink needs the openssl command line tool to create a certificate")
+    cert = os.path.join(directory, "sink.crt")
+    key = os.path.join(directory, "sink.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+class SMTPSink:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.sessions = 0
+        self.messages = 0
+        self.bytes_received = 0
+        self.tls_handshake_times = []
+        self.data_times = []
+        self._tmpdir = tempfile.mkdtemp(prefix="smtp-sink-")
+        self._tls = make_tls_context(self._tmpdir)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    async def _reply(self, writer, line):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        with self._lock:
+            self.sessions += 1
+        try:
+            await self._reply(writer, "220 localhost benchmark sink ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                command = line.decode(errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb in ("EHLO", "HELO"):
+                    await self._reply(writer, "250-localhost\r\n250-STARTTLS\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif verb == "STARTTLS":
+                    await self._reply(writer, "220 ready to start TLS")
+                    start = time.perf_counter()
+                    await writer.start_tls(self._tls)
+                    with self._lock:
+                        self.tls_handshake_times.append(time.perf_counter() - start)
+                elif verb == "AUTH":
+                    parts = command.split()
+                    if len(parts) == 2 and parts[1].upper() == "LOGIN":
+                        await self._reply(writer, "334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        await self._reply(writer, "334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    await self._reply(writer, "235 2.7.0 Accepted")
+                elif verb == "DATA":
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    start = time.perf_counter()
+                    size = 0
+                    while True:
+                        data_line = await reader.readline()
+                        if not data_line or data_line == b".\r\n":
+                            break
+                        size += len(data_line)
+                    with self._lock:
+                        self.messages += 1
+                        self.bytes_received += size
+                        self.data_times.append(time.perf_counter() - start)
+                    await self._reply(writer, "250 2.0.0 OK queued")
+                elif verb == "QUIT":
+                    await self._reply(writer, "221 bye")
+                    return
+                else:
+                    # MAIL, RCPT, RSET, NOOP and anything else
+                    await self._reply(writer, "250 OK")
+        except (ConnectionError, ssl.SSLError):
+            return
+        finally:
+            writer.close()
+
+    def start(self):
+        """Run the sink on a background event loop; returns the bound port."""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="smtp-sink", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            handshakes = sorted(self.tls_handshake_times)
+            return {
+                "sessions": self.sessions,
+                "messages": self.messages,
+                "bytes_received": self.bytes_received,
+                "tls_handshake_p50_ms": round(handshakes[len(handshakes) // 2] * 1000, 3) if handshakes else None,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, args.latency_ms / 1000)
+    port = sink.start()
+    print(f"SMTP sink listening on {args.host}:{port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(sink.stats())
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Generate a synthetic Obsidian vault for benchmarks.
+
+    python benchmarks/synthetic_vault.py /tmp/vault --notes 10000 --note-size 2000 --send-share 0.05
+"""
+import argparse
+import os
+import random
+
+TASK_LINES = (
+    "- [ ] Review pull requests",
+    "- [x] Standup notes",
+    "- [ ] Write the weekly report",
+    "- Follow up with the design team about the new onboarding flow",
+    "- [ ] Fix flaky integration test",
+)
+
+
+def note_content(size, tagged, rng):
+    lines = ["#sender: Benchmark"]
+    written = len(lines[0]) + 1
+    while written < size:
+        line = rng.choice(TASK_LINES)
+        lines.append(line)
+        written += len(line) + 1
+    if tagged:
+        lines.append("#send")
+    return "\n".join(lines) + "\n"
+
+
+def generate_vault(root, notes=1000, note_size=2000, send_share=0.05, notes_per_dir=200,
+                   noise_files=True, seed=1):
+    """
+    Write `notes` notes of roughly `note_size` bytes under `root`, spread over
+    subdirectories, with `send_share` of them tagged #send. Also writes the
+    kind of noise Obsidian produces (.obsidian config, .trash, attachments).
+    Returns the list of note paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for i in range(notes):
+        directory = os.path.join(root, f"folder{i // notes_per_dir:04d}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"note{i:06d}.md")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(note_content(note_size, rng.random() < send_share, rng))
+        paths.append(path)
+
+    if noise_files:
+        for directory in (".obsidian", ".trash", "attachments"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        with open(os.path.join(root, ".obsidian", "workspace.json"), "w") as file:
+            file.write("{}")
+        with open(os.path.join(root, "attachments", "image.png"), "wb") as file:
+            file.write(os.urandom(1024))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root")
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--note-size", type=int, default=2000)
+    parser.add_argument("--send-share", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    paths = generate_vault(args.root, args.notes, args.note_size, args.send_share, seed=args.seed)
+    print(f"Wrote {len(paths)} notes to {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Headless entry point for servers without a display.
+
+Runs the vault watcher, the HTTP API, or both, and never imports tkinter.
+FastAPI and uvicorn are only imported when the API is requested. With
+--vaults, many vaults are watched by worker processes (see supervisor.py).
+
+    python daemon.py                                   # watcher and API
+    python daemon.py --components watcher --config /etc/obsidian-email.env
+    python daemon.py --vaults vaults.json --processes 4
+
+Configuration comes from the environment, optionally from a dotenv file
+given with --config (variables already set in the environment win), and
+finally from a .env file in the working directory.
+"""
+import argparse
+import logging
+import os
+import signal
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+COMPONENTS = ("watcher", "api")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Obsidian email service without the desktop window")
+    parser.add_argument(
+        "--components", default=os.getenv("DAEMON_COMPONENTS", "watcher,api"),
+        help="Comma-separated components to start: watcher, api (default: both)",
+    )
+    parser.add_argument("--config", default=os.getenv("OBSIDIAN_EMAIL_CONFIG"), help="dotenv file with settings")
+    parser.add_argument("--vault", help="Vault to watch (overrides OBSIDIAN_VAULT_PATH)")
+    parser.add_argument("--vaults", default=os.getenv("VAULTS_CONFIG"), help="JSON file listing several vaults to watch")
+    parser.add_argument("--processes", type=int, help="Worker processes for --vaults (overrides VAULT_PROCESSES)")
+    parser.add_argument("--host", help="API bind address (overrides API_HOST)")
+    parser.add_argument("--port", type=int, help="API port (overrides API_PORT)")
+    return parser.parse_args(argv)
+
+
+def run_api(host, port):
+    # Blocks until uvicorn sees SIGINT/SIGTERM; it hands the signal on to our handler afterwards
+    import uvicorn
+    from api import app
+
+    config = uvicorn.Config(app, host=host, port=port, log_config=None, access_log=False)
+    uvicorn.Server(config).run()
+
+
+def install_stop_handlers():
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    return stop
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    components = {name.strip() for name in args.components.split(",") if name.strip()}
+    unknown = components - set(COMPONENTS)
+    if unknown or not components:
+        print(f"Unknown components: {', '.join(sorted(unknown)) or 'none given'} "
+              f"(choose from {', '.join(COMPONENTS)})", file=sys.stderr)
+        return 2
+
+    if args.config:
+        if not os.path.exists(args.config):
+            print(f"Config file not found: {args.config}", file=sys.stderr)
+            return 2
+        load_dotenv(args.config)
+    overrides = {"OBSIDIAN_VAULT_PATH": args.vault, "API_HOST": args.host, "API_PORT": args.port}
+    for name, value in overrides.items():
+        if value is not None:
+            os.environ[name] = str(value)
+
+    # Settings are read when service is imported, so that happens only now
+    import service
+    from database import init_db
+
+    vaults = None
+    if "watcher" in components and args.vaults:
+        from supervisor import VAULT_PROCESSES, VaultSupervisor, load_config
+        try:
+            accounts, vaults = load_config(args.vaults)
+        except (OSError, ValueError) as e:
+            logging.error(f"Invalid vaults file {args.vaults}: {e}")
+            return 1
+
+    missing = []
+    # The default account is only needed if something sends from it
+    if vaults is None or "api" in components or any(vault["account"] is None for vault in vaults):
+        missing = [name for name in ("EMAIL_ADDRESS", "EMAIL_PASSWORD") if not os.getenv(name)]
+    if "watcher" in components and vaults is None and not os.getenv("OBSIDIAN_VAULT_PATH"):
+        missing.append("OBSIDIAN_VAULT_PATH")
+    if missing:
+        logging.error(f"Missing required configuration: {', '.join(missing)}")
+        return 1
+    if not init_db():
+        logging.error("Failed to initialize database")
+        return 1
+
+    # Resume delivery of anything left in the outbox by the previous run
+    service.start_sending()
+    watcher = None
+    if vaults is not None:
+        service.vault_supervisor = VaultSupervisor(vaults, accounts, args.processes or VAULT_PROCESSES)
+        service.vault_supervisor.start()
+    elif "watcher" in components:
+        watcher = service.start_watcher()
+        if watcher is None:
+            service.stop_sending()
+            return 1
+
+    stop = install_stop_handlers()
+    try:
+        if "api" in components:
+            logging.info(f"Serving the API on {service.API_HOST}:{service.API_PORT}")
+            run_api(service.API_HOST, service.API_PORT)
+        else:
+            # Wake up periodically so Ctrl+C is handled promptly on Windows too
+            while not stop.wait(1):
+                pass
+    finally:
+        logging.info("Shutting down")
+        if service.vault_supervisor is not None:
+            service.vault_supervisor.stop()
+        if watcher is not None:
+            service.stop_watcher(*watcher)
+        service.stop_sending()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
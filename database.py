@@ -1,41 +1,355 @@
 import sqlite3
 import os
 import logging
+import threading
+import time
+import atexit
+from collections import OrderedDict
 from pathlib import Path
 
+from metrics import Histogram
+
 # SQLite Database file path
 DATABASE_FILE = 'processed_files.db'
 
+# Store configuration
+PROCESSED_CACHE_SIZE = int(os.getenv("PROCESSED_CACHE_SIZE", "100000"))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "50"))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", "0.5"))
+# Forget processed notes after this many days (0 keeps them forever). A pruned
+# note that still has its #send tag is sent again if it is edited afterwards.
+PROCESSED_RETENTION_DAYS = float(os.getenv("PROCESSED_RETENTION_DAYS", "0"))
+DB_MAINTENANCE_INTERVAL = float(os.getenv("DB_MAINTENANCE_INTERVAL", "3600"))
+PRUNE_BATCH_SIZE = 500
+# Free pages are handed back to the file system in chunks of this many
+VACUUM_BATCH_PAGES = 1000
+
+SCHEMA_VERSION = 1
+
+DB_SECONDS = Histogram("obsidian_db_operation_seconds", "Time spent in processed-file database operations", ["operation"])
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+def get_db_path():
+    return os.getenv('DB_PATH', os.path.join(str(Path(__file__).parent), 'data', 'obsidian_email.db'))
+
+
+class ProcessedFileStore:
+    """
+    Long-lived access to the processed_files table.
+
+    Each thread gets its own WAL-mode connection. Processed paths are kept in
+    an in-memory LRU so repeated lookups never touch SQLite; while every row
+    fits in the cache it is authoritative and misses are answered from memory
+    too. Inserts are buffered and written in small transactions, either once
+    DB_BATCH_SIZE rows are pending or after DB_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, db_path, cache_size=PROCESSED_CACHE_SIZE,
+                 batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_complete = False
+        self._pending = []
+        self._flush_timer = None
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def init_schema(self):
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self.connection()
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+            # Only takes effect before the first table exists; older files are converted in _migrate
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS processed_files
+                (file_path TEXT PRIMARY KEY, processed_at TIMESTAMP)
+            ''')
+        self._migrate(conn)
+        self._warm_cache()
+
+    def _migrate(self, conn):
+        """Bring the schema up to SCHEMA_VERSION, tracked in PRAGMA user_version."""
+        # IMMEDIATE takes the write lock first, so processes starting together migrate once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                logging.info("Migrating processed_files to schema version 1")
+                conn.execute("ALTER TABLE processed_files ADD COLUMN content_hash TEXT")
+                conn.execute("ALTER TABLE processed_files ADD COLUMN status TEXT NOT NULL DEFAULT 'processed'")
+                # Older rows never got a timestamp: use the delivery time where the outbox has one
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outbox'").fetchone():
+                    conn.execute('''
+                        UPDATE processed_files SET
+                            processed_at = (SELECT MAX(COALESCE(o.sent_at, o.created_at)) FROM outbox o
+                                            WHERE o.source_path = processed_files.file_path),
+                            status = COALESCE((SELECT o.status FROM outbox o
+                                               WHERE o.source_path = processed_files.file_path
+                                               ORDER BY o.id DESC LIMIT 1), status)
+                        WHERE processed_at IS NULL
+                    ''')
+                    conn.execute(
+                        "UPDATE processed_files SET status = 'failed' WHERE status = 'dead'"
+                    )
+                    conn.execute(
+                        "UPDATE processed_files SET status = 'queued' WHERE status IN ('pending', 'sending')"
+                    )
+                conn.execute("UPDATE processed_files SET processed_at = ? WHERE processed_at IS NULL", (time.time(),))
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_processed_files_processed_at ON processed_files (processed_at)"
+                )
+            if version < SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # One full VACUUM switches an existing file to incremental vacuuming
+            start = time.perf_counter()
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            logging.info(f"Enabled incremental vacuum on {self.db_path} in {time.perf_counter() - start:.1f}s")
+
+    def _warm_cache(self):
+        conn = self.connection()
+        # Most recently processed first: those are the notes still being edited
+        rows = conn.execute(
+            "SELECT file_path FROM processed_files ORDER BY processed_at DESC LIMIT ?", (self.cache_size + 1,)
+        ).fetchall()
+        with self._lock:
+            for (file_path,) in rows[:self.cache_size]:
+                self._cache[file_path] = True
+            self._cache_complete = len(rows) <= self.cache_size
+
+    def _remember(self, file_path):
+        # Caller holds self._lock
+        self._cache[file_path] = True
+        self._cache.move_to_end(file_path)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+            self._cache_complete = False
+
+    def is_processed(self, file_path):
+        with self._lock:
+            if file_path in self._cache:
+                self._cache.move_to_end(file_path)
+                return True
+            if self._cache_complete:
+                return False
+        cursor = self.connection().execute(
+            "SELECT 1 FROM processed_files WHERE file_path = ?", (file_path,)
+        )
+        found = cursor.fetchone() is not None
+        if found:
+            with self._lock:
+                self._remember(file_path)
+        return found
+
+    def cache_processed(self, file_path):
+        """Record a path that was written to processed_files by another transaction."""
+        with self._lock:
+            self._remember(file_path)
+
+    def mark_processed(self, file_path, content_hash=None, status="processed"):
+        with self._lock:
+            self._remember(file_path)
+            self._pending.append((file_path, time.time(), content_hash, status))
+            flush_now = len(self._pending) >= self.batch_size
+            if not flush_now and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not pending:
+            return
+        conn = self.connection()
+        try:
+            with conn, DB_SECONDS.time(operation="flush"):
+                conn.executemany(
+                    "INSERT OR IGNORE INTO processed_files (file_path, processed_at, content_hash, status) "
+                    "VALUES (?, ?, ?, ?)",
+                    pending,
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write processed files: {e}")
+            with self._lock:
+                self._pending[:0] = pending
+
+    def set_status(self, file_paths, status):
+        """Record the delivery outcome of processed notes."""
+        conn = self.connection()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE processed_files SET status = ? WHERE file_path = ?",
+                    [(status, file_path) for file_path in file_paths],
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to update processed file status: {e}")
+
+    def prune(self, retention_days=PROCESSED_RETENTION_DAYS, batch_size=PRUNE_BATCH_SIZE):
+        """Delete rows older than the retention period in small transactions; returns how many went."""
+        if retention_days <= 0:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        conn = self.connection()
+        pruned = 0
+        while True:
+            with conn, DB_SECONDS.time(operation="prune"):
+                # Notes whose mail is still queued stay until the outbox is done with them
+                deleted = conn.execute(
+                    "DELETE FROM processed_files WHERE rowid IN (SELECT rowid FROM processed_files "
+                    "WHERE processed_at < ? AND status != 'queued' LIMIT ?)", (cutoff, batch_size)
+                ).rowcount
+            pruned += deleted
+            if deleted < batch_size:
+                break
+            # Let the watcher's writes in between batches
+            time.sleep(0.05)
+        if pruned:
+            with self._lock:
+                self._cache.clear()
+                self._cache_complete = False
+            self._warm_cache()
+            logging.info(f"Pruned {pruned} processed files older than {retention_days:g} days")
+        return pruned
+
+    def vacuum(self, batch_pages=VACUUM_BATCH_PAGES):
+        """Return free pages to the file system a chunk at a time; returns the number released."""
+        conn = self.connection()
+        released = 0
+        while True:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free == 0:
+                break
+            pages = min(free, batch_pages)
+            with DB_SECONDS.time(operation="vacuum"):
+                # executescript steps the pragma to completion; execute() frees a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+            released += pages
+        conn.execute("PRAGMA optimize")
+        return released
+
+    def maintain(self):
+        try:
+            self.flush()
+            self.prune()
+            released = self.vacuum()
+            if released:
+                logging.info(f"Released {released} free database pages")
+        except sqlite3.Error as e:
+            logging.error(f"Database maintenance failed: {e}")
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def open_store():
+    """(Re)open the shared store, picking up a changed DB_PATH."""
+    global _store
+    with _store_lock:
+        db_path = get_db_path()
+        if _store is None or _store.db_path != db_path:
+            if _store is not None:
+                _store.close()
+            store = ProcessedFileStore(db_path)
+            store.init_schema()
+            _store = store
+        return _store
+
+def get_store():
+    store = _store
+    if store is None:
+        store = open_store()
+    return store
+
+@atexit.register
+def _close_store():
+    if _store is not None:
+        _store.close()
+
 # Create the database and table if they don't exist
 def init_db():
     try:
-        db_path = os.getenv('DB_PATH', os.path.join(str(Path(__file__).parent), 'data', 'obsidian_email.db'))
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processed_files
-            (file_path TEXT PRIMARY KEY, processed_at TIMESTAMP)
-        ''')
-        conn.commit()
-        conn.close()
+        with DB_SECONDS.time(operation="init_db"):
+            open_store()
         return True
     except Exception as e:
         logging.error(f"Database initialization failed: {e}")
         return False
 
 def is_file_processed(file_path: str) -> bool:
-    db_path = os.getenv('DB_PATH', os.path.join(str(Path(__file__).parent), 'data', 'obsidian_email.db'))
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT file_path FROM processed_files WHERE file_path = ?", (file_path,))
-        return cursor.fetchone() is not None
-
-def mark_file_processed(file_path: str):
-    db_path = os.getenv('DB_PATH', os.path.join(str(Path(__file__).parent), 'data', 'obsidian_email.db'))
-    with sqlite3.connect(db_path) as conn:
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO processed_files (file_path) VALUES (?)", (file_path,))
-        conn.commit()
+    with DB_SECONDS.time(operation="is_file_processed"):
+        return get_store().is_processed(file_path)
+
+def mark_file_processed(file_path: str, content_hash: str = None, status: str = "processed"):
+    with DB_SECONDS.time(operation="mark_file_processed"):
+        get_store().mark_processed(file_path, content_hash, status)
+
+_maintenance_stop = None
+
+def start_maintenance(interval=DB_MAINTENANCE_INTERVAL):
+    """Prune and compact the database every interval seconds, in the background."""
+    global _maintenance_stop
+    if _maintenance_stop is not None:
+        return
+    stop = _maintenance_stop = threading.Event()
+
+    def run():
+        # First pass shortly after startup, out of the way of the catch-up scan
+        delay = min(60.0, interval)
+        while not stop.wait(delay):
+            get_store().maintain()
+            delay = interval
+
+    threading.Thread(target=run, name="db-maintenance", daemon=True).start()
+
+def stop_maintenance():
+    global _maintenance_stop
+    if _maintenance_stop is not None:
+        _maintenance_stop.set()
+        _maintenance_stop = None
@@ -0,0 +1,104 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Debounce configuration
+DEBOUNCE_QUIET_PERIOD = float(os.getenv("DEBOUNCE_QUIET_PERIOD", "1.0"))
+DEBOUNCE_MAX_PENDING = int(os.getenv("DEBOUNCE_MAX_PENDING", "10000"))
+
+
+class DebounceScheduler:
+    """
+    Trailing-edge debouncer keyed by file path.
+
+    Every touch() pushes the path's deadline to now + quiet_period; the
+    callback fires once per path after it has been quiet for that long, so a
+    burst of editor saves collapses into a single processing pass that always
+    sees the final write. Deadlines live in a heap with lazy deletion and are
+    served by one background thread. At most max_pending paths are tracked;
+    beyond that the least recently touched path is fired early rather than
+    dropped, so memory stays bounded without losing events.
+    """
+
+    def __init__(self, callback, quiet_period=DEBOUNCE_QUIET_PERIOD, max_pending=DEBOUNCE_MAX_PENDING):
+        self.callback = callback
+        self.quiet_period = quiet_period
+        self.max_pending = max_pending
+
+        self._pending = OrderedDict()  # path -> deadline, least recently touched first
+        self._heap = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.coalesced = 0
+        self.fired = 0
+        self.evicted = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="debounce", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def touch(self, key):
+        evicted = None
+        with self._cond:
+            deadline = time.monotonic() + self.quiet_period
+            if key in self._pending:
+                self.coalesced += 1
+                self._pending.move_to_end(key)
+            self._pending[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+            if len(self._pending) > self.max_pending:
+                evicted, _ = self._pending.popitem(last=False)
+                self.evicted += 1
+            # Drop stale heap entries once they outnumber live ones
+            if len(self._heap) > 2 * len(self._pending) + 64:
+                self._heap = [(d, k) for k, d in self._pending.items()]
+                heapq.heapify(self._heap)
+            self._cond.notify()
+        if evicted is not None:
+            self._fire(evicted)
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _fire(self, key):
+        self.fired += 1
+        try:
+            self.callback(key)
+        except Exception as e:
+            logging.error(f"Debounced callback failed for {key}: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running:
+                    now = time.monotonic()
+                    # Discard heap entries superseded by a later touch
+                    while self._heap and self._pending.get(self._heap[0][1]) != self._heap[0][0]:
+                        heapq.heappop(self._heap)
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _, key = heapq.heappop(self._heap)
+                del self._pending[key]
+            self._fire(key)
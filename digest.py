@@ -0,0 +1,228 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from attachments import select_attachments
+from database import get_store
+
+# Digest mode: tagged notes are collected and sent as one message per sender
+DIGEST_MODE = os.getenv("DIGEST_MODE", "false").lower() in ("1", "true", "yes")
+# A digest goes out once its oldest note has waited this long...
+DIGEST_WINDOW = float(os.getenv("DIGEST_WINDOW", "3600"))
+# ...or as soon as it holds this many notes
+DIGEST_MAX_NOTES = int(os.getenv("DIGEST_MAX_NOTES", "20"))
+DIGEST_POLL_INTERVAL = 5.0
+
+
+class DigestCollector:
+    """
+    Collects parsed notes in the digest_items table and turns each group of
+    notes with the same account, recipient and sender into one outbox message.
+
+    A note stays unprocessed while it waits, so edits just replace its
+    section. When a group is flushed its items are linked to the outbox row in
+    the same transaction that creates it. Once the outbox reports the message
+    delivered, all of its notes are marked processed in one transaction. A
+    note whose digest is in flight or dead is not collected again; retrying
+    the dead message from the outbox admin endpoints completes it.
+    """
+
+    def __init__(self, get_outbox, store=None, window=DIGEST_WINDOW, max_notes=DIGEST_MAX_NOTES):
+        self.get_outbox = get_outbox
+        self.store = store or get_store()
+        self.window = window
+        self.max_notes = max_notes
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._init_table()
+
+    def _init_table(self):
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS digest_items
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 created_at REAL NOT NULL,
+                 account TEXT,
+                 recipient TEXT NOT NULL,
+                 sender_name TEXT NOT NULL,
+                 source_path TEXT NOT NULL,
+                 body TEXT NOT NULL,
+                 outbox_id INTEGER)
+            ''')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(digest_items)")}
+            if "attachments" not in columns:
+                conn.execute("ALTER TABLE digest_items ADD COLUMN attachments TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_digest_items_path ON digest_items (source_path)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_digest_items_outbox ON digest_items (outbox_id)")
+
+    def start(self):
+        if self._running:
+            return
+        self._reconcile()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="digest", daemon=True)
+        self._thread.start()
+        logging.info(f"Digest mode on: flushing after {self.window:.0f}s or {self.max_notes} notes")
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, account, recipient, sender_name, source_path, body, attachments=None):
+        """
+        Collect a note's section and the files it embeds. Returns False if the
+        note is already processed or part of a digest that is being delivered.
+        """
+        conn = self.store.connection()
+        with conn:
+            # Checked in the database: the sender side may have marked it processed
+            if conn.execute("SELECT 1 FROM processed_files WHERE file_path = ?", (source_path,)).fetchone():
+                self.store.cache_processed(source_path)
+                return False
+            if conn.execute(
+                "SELECT 1 FROM digest_items WHERE source_path = ? AND outbox_id IS NOT NULL", (source_path,)
+            ).fetchone():
+                return False
+            # Keep the original arrival time so edits do not hold the digest back
+            row = conn.execute(
+                "SELECT MIN(created_at) FROM digest_items WHERE source_path = ? AND outbox_id IS NULL", (source_path,)
+            ).fetchone()
+            conn.execute("DELETE FROM digest_items WHERE source_path = ? AND outbox_id IS NULL", (source_path,))
+            conn.execute(
+                "INSERT INTO digest_items (created_at, account, recipient, sender_name, source_path, body, attachments) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row[0] or time.time(), account, recipient, sender_name, source_path, body,
+                 json.dumps(attachments) if attachments else None),
+            )
+            count = conn.execute(
+                "SELECT COUNT(*) FROM digest_items WHERE outbox_id IS NULL AND account IS ? "
+                "AND recipient = ? AND sender_name = ?",
+                (account, recipient, sender_name),
+            ).fetchone()[0]
+        if count >= self.max_notes:
+            self._wakeup.set()
+        return True
+
+    def pending(self):
+        return self.store.connection().execute(
+            "SELECT COUNT(*) FROM digest_items WHERE outbox_id IS NULL"
+        ).fetchone()[0]
+
+    def flush(self, force=False):
+        """Send every group that is due (or every group, with force); returns the number of digests queued."""
+        cutoff = time.time() - self.window
+        groups = self.store.connection().execute(
+            "SELECT account, recipient, sender_name, COUNT(*), MIN(created_at) FROM digest_items "
+            "WHERE outbox_id IS NULL GROUP BY account, recipient, sender_name"
+        ).fetchall()
+        queued = 0
+        for account, recipient, sender_name, count, oldest in groups:
+            if force or count >= self.max_notes or oldest <= cutoff:
+                try:
+                    if self._send_group(account, recipient, sender_name):
+                        queued += 1
+                except Exception as e:
+                    logging.error(f"Failed to queue digest for {sender_name} to {recipient}: {e}")
+        return queued
+
+    def _send_group(self, account, recipient, sender_name):
+        conn = self.store.connection()
+        items = conn.execute(
+            "SELECT id, source_path, body, attachments FROM digest_items WHERE outbox_id IS NULL AND account IS ? "
+            "AND recipient = ? AND sender_name = ? ORDER BY created_at LIMIT ?",
+            (account, recipient, sender_name, self.max_notes),
+        ).fetchall()
+        if not items:
+            return False
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        sections = "\n\n".join(
+            f"{os.path.splitext(os.path.basename(path))[0]}\n{body}" for _, path, body, _ in items
+        )
+        # Each note's files were within the per-file cap; together they must fit one email
+        paths = []
+        for *_, item_attachments in items:
+            for path in json.loads(item_attachments or "[]"):
+                if path not in paths:
+                    paths.append(path)
+        attachments, skipped = select_attachments(paths)
+        if skipped:
+            sections += "\n\n" + "\n".join(skipped)
+        subject = f"{sender_name}- {today}"
+        if len(items) > 1:
+            subject += f" ({len(items)} notes)"
+        email_body = f"""{sender_name} - {today}:
+
+{sections}
+
+
+
+
+
+"""
+
+        def link(conn, message_id):
+            conn.executemany(
+                "UPDATE digest_items SET outbox_id = ? WHERE id = ?", [(message_id, item[0]) for item in items]
+            )
+
+        message_id = self.get_outbox(account).enqueue(subject, recipient, email_body, in_transaction=link,
+                                                      attachments=attachments)
+        logging.info(f"Digest of {len(items)} notes from {sender_name} queued as outbox message {message_id}")
+        return True
+
+    def complete(self, outbox_id, sent):
+        """
+        Called with the final outcome of an outbox message. Returns the note
+        paths it carried (empty if it was not a digest).
+        """
+        conn = self.store.connection()
+        paths = [row[0] for row in conn.execute(
+            "SELECT source_path FROM digest_items WHERE outbox_id = ?", (outbox_id,)
+        )]
+        if not paths or not sent:
+            return paths
+        with conn:
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_files (file_path, processed_at, status) VALUES (?, ?, 'sent')",
+                [(p, now) for p in paths],
+            )
+            # Edits collected while the digest was out are moot now that the note is processed
+            conn.executemany("DELETE FROM digest_items WHERE source_path = ?", [(p,) for p in paths])
+        for path in paths:
+            self.store.cache_processed(path)
+        return paths
+
+    def _reconcile(self):
+        """Finish digests whose outcome was recorded but not applied before a restart."""
+        conn = self.store.connection()
+        rows = conn.execute(
+            "SELECT DISTINCT d.outbox_id, o.status FROM digest_items d LEFT JOIN outbox o ON o.id = d.outbox_id "
+            "WHERE d.outbox_id IS NOT NULL AND (o.id IS NULL OR o.status = 'sent')"
+        ).fetchall()
+        for outbox_id, status in rows:
+            if status == "sent":
+                self.complete(outbox_id, True)
+            else:
+                # The outbox row was purged: collect these notes again
+                with conn:
+                    conn.execute("DELETE FROM digest_items WHERE outbox_id = ?", (outbox_id,))
+
+    def _run(self):
+        while self._running:
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Digest flush failed: {e}")
+            self._wakeup.wait(min(DIGEST_POLL_INTERVAL, self.window))
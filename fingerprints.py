@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+from database import get_store
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class FingerprintIndex:
+    """
+    Per-file (size, mtime_ns, content hash) index used to skip unchanged files.
+
+    The index lives in memory and is written through to the file_fingerprints
+    table next to processed_files. A file whose stat matches its fingerprint
+    costs a single stat() call; a file whose stat changed but whose content
+    hash did not is recognised after one read without being parsed again. The
+    reverse hash lookup lets a renamed or copied note be matched to the path
+    it was originally recorded under.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_store()
+        self._lock = threading.Lock()
+        self._by_path = {}
+        self._by_hash = {}
+        self._init_table()
+        self._load()
+
+    def _init_table(self):
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_fingerprints
+                (file_path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, content_hash TEXT)
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_fingerprints_hash
+                ON file_fingerprints (content_hash)
+            ''')
+
+    def _load(self):
+        rows = self.store.connection().execute(
+            "SELECT file_path, size, mtime_ns, content_hash FROM file_fingerprints"
+        ).fetchall()
+        with self._lock:
+            for file_path, size, mtime_ns, digest in rows:
+                self._by_path[file_path] = (size, mtime_ns, digest)
+                self._by_hash[digest] = file_path
+        logging.info(f"Loaded {len(rows)} file fingerprints")
+
+    def stat_unchanged(self, file_path):
+        """
+        Return (unchanged, stat_result). Only stats the file; never reads it.
+        stat_result is None when the file no longer exists.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False, None
+        with self._lock:
+            known = self._by_path.get(file_path)
+        unchanged = known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns
+        return unchanged, st
+
+    def hash_unchanged(self, file_path, digest):
+        with self._lock:
+            known = self._by_path.get(file_path)
+        return known is not None and known[2] == digest
+
+    def path_for_hash(self, digest):
+        """Return another path already recorded with this content, if any."""
+        with self._lock:
+            return self._by_hash.get(digest)
+
+    def record(self, file_path, st, digest):
+        with self._lock:
+            previous = self._by_path.get(file_path)
+            if previous is not None and self._by_hash.get(previous[2]) == file_path:
+                del self._by_hash[previous[2]]
+            self._by_path[file_path] = (st.st_size, st.st_mtime_ns, digest)
+            self._by_hash[digest] = file_path
+        self._write(
+            "INSERT OR REPLACE INTO file_fingerprints (file_path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+            (file_path, st.st_size, st.st_mtime_ns, digest),
+        )
+
+    def move(self, src_path, dest_path):
+        """Carry a fingerprint over to a renamed or moved path."""
+        with self._lock:
+            entry = self._by_path.pop(src_path, None)
+            if entry is None:
+                return False
+            self._by_path[dest_path] = entry
+            self._by_hash[entry[2]] = dest_path
+        self._write(
+            "UPDATE OR REPLACE file_fingerprints SET file_path = ? WHERE file_path = ?",
+            (dest_path, src_path),
+        )
+        return True
+
+    def forget(self, file_path):
+        with self._lock:
+            entry = self._by_path.pop(file_path, None)
+            if entry is not None and self._by_hash.get(entry[2]) == file_path:
+                del self._by_hash[entry[2]]
+        if entry is not None:
+            self._write("DELETE FROM file_fingerprints WHERE file_path = ?", (file_path,))
+
+    def _write(self, sql, params):
+        conn = self.store.connection()
+        try:
+            with conn:
+                conn.execute(sql, params)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to persist file fingerprint: {e}")
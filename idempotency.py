@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_store
+from metrics import Counter
+
+# How long a stored outcome is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Requests without a key are matched on their content, but only for this long,
+# so sending the same text again later on purpose still works (0 turns it off)
+IDEMPOTENCY_CONTENT_TTL = float(os.getenv("IDEMPOTENCY_CONTENT_TTL", "600"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_PURGE_INTERVAL = 60.0
+
+IDEMPOTENT_REPLAYS = Counter("obsidian_idempotent_replays_total", "Requests answered from a stored or in-flight outcome", ["source"])
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused for a request with different content."""
+
+
+def fingerprint(*fields):
+    return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+
+def request_key(header_key, request_fingerprint):
+    """Key to store a request's outcome under, and how long to keep it; (None, 0) if it is not deduplicated."""
+    if header_key:
+        return f"key:{header_key}", IDEMPOTENCY_TTL
+    if IDEMPOTENCY_CONTENT_TTL > 0:
+        return f"content:{request_fingerprint}", IDEMPOTENCY_CONTENT_TTL
+    return None, 0
+
+
+class IdempotencyCache:
+    """
+    Outcomes of completed requests, by idempotency key.
+
+    Recent outcomes sit in an in-memory LRU in front of the idempotency_keys
+    table, which keeps them across restarts until they expire. Only
+    successful outcomes are stored, so a failed request can be retried.
+    Requests that arrive while the same key is still being handled wait for
+    that attempt and share its outcome instead of sending again.
+    """
+
+    def __init__(self, store=None, cache_size=IDEMPOTENCY_CACHE_SIZE):
+        self.store = store or get_store()
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # key -> (expires_at, fingerprint, status_code, content)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._purged_at = 0.0
+        self._init_table()
+
+    def _init_table(self):
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS idempotency_keys
+                (key TEXT PRIMARY KEY,
+                 expires_at REAL NOT NULL,
+                 fingerprint TEXT NOT NULL,
+                 status_code INTEGER NOT NULL,
+                 response TEXT NOT NULL)
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency_keys (expires_at)")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1:]
+
+    def get(self, key):
+        """Stored (fingerprint, status_code, content) for key, or None."""
+        stored = self._cached(key)
+        if stored is not None:
+            return stored
+        row = self.store.connection().execute(
+            "SELECT expires_at, fingerprint, status_code, response FROM idempotency_keys "
+            "WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], row[1], row[2], json.loads(row[3]))
+        self._remember(key, entry)
+        return entry[1:]
+
+    def put(self, key, request_fingerprint, status_code, content, ttl):
+        now = time.time()
+        entry = (now + ttl, request_fingerprint, status_code, content)
+        self._remember(key, entry)
+        conn = self.store.connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO idempotency_keys (key, expires_at, fingerprint, status_code, response) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, entry[0], request_fingerprint, status_code, json.dumps(content))
+                )
+                if now - self._purged_at >= IDEMPOTENCY_PURGE_INTERVAL:
+                    self._purged_at = now
+                    conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            # The in-memory copy still covers retries to this process
+            logging.error(f"Failed to store idempotency key: {e}")
+
+    async def run(self, key, request_fingerprint, ttl, handle):
+        """
+        Return (status_code, content, replayed) for a request, awaiting
+        handle() only if key has no stored or in-flight outcome. handle()
+        returns (status_code, content); an exception it raises is passed on
+        to every waiting duplicate and nothing is stored.
+        """
+        if key is None:
+            return (*await handle(), False)
+
+        loaded = False
+        while True:
+            # Checked again after every await: the outcome may have landed meanwhile
+            stored = self._cached(key)
+            if stored is None and key not in self._in_flight and not loaded:
+                stored = await asyncio.to_thread(self.get, key)
+                loaded = True
+            if stored is not None:
+                stored_fingerprint, status_code, content = stored
+                if stored_fingerprint != request_fingerprint:
+                    raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+                IDEMPOTENT_REPLAYS.inc(source="stored")
+                return status_code, content, True
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            pending_fingerprint, future = in_flight
+            if pending_fingerprint != request_fingerprint:
+                raise IdempotencyConflict("Idempotency-Key is in use by a different request")
+            try:
+                status_code, content = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The first attempt was abandoned before it finished; try to handle the request here
+                continue
+            IDEMPOTENT_REPLAYS.inc(source="in_flight")
+            return status_code, content, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (request_fingerprint, future)
+        try:
+            status_code, content = await handle()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so an exception nobody waited for is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result((status_code, content))
+            if 200 <= status_code < 300:
+                await asyncio.to_thread(self.put, key, request_fingerprint, status_code, content, ttl)
+        finally:
+            del self._in_flight[key]
+        return status_code, content, False
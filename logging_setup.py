@@ -0,0 +1,155 @@
+"""
+Logging for the service: records are handed to a background writer through
+a queue, carry a per-file trace id, and repetitive hot-path messages are
+sampled.
+
+    logging.info(f"File already processed: {path}", extra={"sample": "already_processed"})
+
+Records with a "sample" key get at most LOG_SAMPLE_BURST lines per key every
+LOG_SAMPLE_INTERVAL seconds; the next line after a quiet spell says how many
+were suppressed. Everything logged inside traced(path) is tagged with the
+same short id for that file, from the watcher event to the SMTP delivery.
+"""
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Write log lines from a background thread so callers never wait on the console
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+# "text", or "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", "5"))
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", "10"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+trace_id = contextvars.ContextVar("trace_id", default="-")
+
+
+def file_trace_id(path):
+    """Stable short id for a file, so its lines can be grepped across threads and restarts."""
+    return hashlib.blake2b(os.fsencode(path), digest_size=4).hexdigest()
+
+
+@contextmanager
+def traced(path):
+    token = trace_id.set(file_trace_id(path) if path else "-")
+    try:
+        yield
+    finally:
+        trace_id.reset(token)
+
+
+class TraceFilter(logging.Filter):
+    # Runs on the thread that logs, where the context variable is set
+    def filter(self, record):
+        record.trace_id = trace_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    def __init__(self, burst=LOG_SAMPLE_BURST, interval=LOG_SAMPLE_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}  # key -> [window start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or self.burst <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the writer falls behind, records are counted and dropped."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+
+
+def configure_logging():
+    """Install the handlers on the root logger; safe to call more than once."""
+    global _listener
+    root = logging.getLogger()
+    if any(getattr(handler, "_obsidian_email", False) for handler in root.handlers):
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    if LOG_ASYNC:
+        handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = logging.handlers.QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(_stop_listener, root, handler, output)
+    else:
+        handler = output
+    # Filters run on the caller's thread: the trace id is read there, and sampled lines are dropped before queueing
+    handler.addFilter(TraceFilter())
+    handler.addFilter(SampleFilter())
+    handler._obsidian_email = True
+
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(handler)
+
+
+def _stop_listener(root, handler, output):
+    # Drain what is queued, then write directly so lines logged later during exit are not lost
+    _listener.stop()
+    root.removeHandler(handler)
+    for log_filter in handler.filters:
+        output.addFilter(log_filter)
+    output._obsidian_email = True
+    root.addHandler(output)
@@ -1,16 +1,9 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import time
 import threading
-from database import init_db, is_file_processed, mark_file_processed
-from datetime import datetime
+from database import init_db
+from service import API_HOST, API_PORT, SMTP_PORT, SMTP_SERVER, start_file_watcher, start_sending
 from tkinter import Tk, Label, Entry, Button, StringVar, messagebox
 import tkinter as tk
 import logging
@@ -19,38 +12,14 @@ import webbrowser
 from tkinter import filedialog
 from pathlib import Path
 
-# Configure basic logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-# Load environment variables
-try:
-    load_dotenv()
-except OSError:
-    # Silently continue if .env file is not found
-    pass
-
-app = FastAPI()
-
-class EmailRequest(BaseModel):
-    subject: str
-    recipient: str
-    body: str
-
-# Email configuration
-EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-
-# Obsidian configuration
-# OBSIDIAN_VAULT_PATH = "C:/obsidian vault"  # Replace with your path
-RECIPIENT_EMAIL = "rahulroy.agtt@gmail.com"  # Replace with your email
+# Desktop app. For servers without a display use daemon.py, which never imports tkinter.
+
+def __getattr__(name):
+    # `uvicorn main:app` keeps working; the API itself lives in api.py
+    if name == "app":
+        from api import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class StatusWindow:
     def __init__(self):
@@ -185,11 +154,12 @@ class StatusWindow:
         # Start the FastAPI server in a separate thread
         def run_server():
             import uvicorn
+            from api import app
             try:
                 config = uvicorn.Config(
                     app,
-                    host="localhost",
-                    port=8002,
+                    host=API_HOST,
+                    port=API_PORT,
                     log_config=None,
                     access_log=False
                 )
@@ -197,7 +167,7 @@ class StatusWindow:
                 server.run()
             except OSError as e:
                 if "only one usage of each socket address" in str(e):
-                    logging.warning("Server already running on port 8002")
+                    logging.warning(f"Server already running on port {API_PORT}")
                 else:
                     logging.error(f"Failed to start server: {e}")
         
@@ -258,199 +228,6 @@ class StatusWindow:
     def run(self):
         self.root.mainloop()
 
-def send_email(subject: str, recipient: str, body: str):
-    try:
-        logging.info(f"Attempting to send email to: {recipient}")
-        if not EMAIL_ADDRESS or not EMAIL_PASSWORD:
-            logging.error("Email credentials not properly loaded")
-            logging.debug(f"EMAIL_ADDRESS: {'present' if EMAIL_ADDRESS else 'missing'}")
-            logging.debug(f"EMAIL_PASSWORD: {'present' if EMAIL_PASSWORD else 'missing'}")
-            raise ValueError("Email credentials not configured")
-
-        # Create message
-        message = MIMEMultipart()
-        message["From"] = EMAIL_ADDRESS
-        message["To"] = recipient
-        message["Subject"] = subject
-        message.attach(MIMEText(body, "plain"))
-
-        # Enhanced error handling for SMTP connection
-        try:
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30) as server:
-                server.set_debuglevel(1)  # Enable debug output
-                server.starttls()
-                logging.info("Attempting login...")
-                server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-                logging.info("Login successful, sending message...")
-                server.send_message(message)
-                logging.info("Email sent successfully")
-        except smtplib.SMTPAuthenticationError:
-            logging.error("Authentication failed. Please check your email and app password.")
-            raise ValueError("Invalid email credentials. Make sure you're using an App Password for Gmail.")
-        except smtplib.SMTPException as smtp_error:
-            logging.error(f"SMTP error occurred: {smtp_error}")
-            raise
-
-        return True
-    except Exception as e:
-        logging.error(f"Failed to send email: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.post("/send-email")
-async def send_email_endpoint(email_request: EmailRequest):
-    try:
-        send_email(email_request.subject, email_request.recipient, email_request.body)
-        return {"message": "Email sent successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-class ObsidianHandler(FileSystemEventHandler):
-    def __init__(self):
-        self.last_modified = {}
-
-    def parse_content(self, content):
-        """
-        Parse content to check format:
-        #sender: Name 
-        Today's Task
-        .
-        .
-        -------------------
-        Tomorrow's Task
-        .
-        .
-        #send
-        """
-        lines = content.split("\n")
-        sender_name = None
-        tasks = []
-        has_send_tag = False
-
-        # First find sender
-        for line in lines:
-            if line.replace(" ", "").startswith("#sender:"):  # Remove all spaces before checking
-                # Extract the part after "#sender:" regardless of spaces
-                sender_part = line[line.find("#sender")+7:].strip()
-                sender_name = sender_part
-            # Check for #send tag anywhere in the content
-            elif line.strip() == "#send":
-                has_send_tag = True
-        # Then collect tasks
-        for line in lines:
-            if not line.strip().startswith("#"):
-                tasks.append(line.strip())
-
-        return has_send_tag, sender_name, tasks
-
-    def on_modified(self, event):
-        try:
-            if event.is_directory:
-                return
-
-            file_path = event.src_path
-            logging.info(f"File modified: {file_path}")
-
-            # Skip if we've already processed this file
-            if is_file_processed(file_path):
-                logging.info(f"File already processed: {file_path}")
-                return
-
-            current_time = time.time()
-            if file_path in self.last_modified:
-                if current_time - self.last_modified[file_path] < 1:
-                    logging.info("Skipping due to debounce")
-                    return
-
-            self.last_modified[file_path] = current_time
-
-            logging.info(f"Reading file content: {file_path}")
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-            
-            has_send_tag, sender_name, tasks = self.parse_content(content)
-            logging.info(f"Parsed content - has_send_tag: {has_send_tag}, sender_name: {sender_name}, tasks count: {len(tasks)}")
-
-            # Check required elements
-            if not has_send_tag:
-                print(f"#send tag not found in file: {file_path}")
-                return
-
-            if not sender_name:
-                print(f"No sender name found in file: {file_path}")
-                return
-
-            if not tasks:
-                print(f"No tasks found in file: {file_path}")
-                return
-
-            try:
-                # Format email body
-                email_body = f"""{sender_name} - {datetime.now().strftime('%Y-%m-%d')}:
-
-{chr(10).join('• ' + task for task in tasks)}
-
-
-
-
-
-"""
-                # Send email
-                send_email(
-                    f"{sender_name}- {datetime.now().strftime('%Y-%m-%d')}",
-                    RECIPIENT_EMAIL,
-                    email_body,
-                )
-
-                # time.sleep(1)
-
-                # Mark this file as processed
-                mark_file_processed(file_path)
-                print(f"Tasks email sent successfully for {file_path}!")
-
-                # Add success message to file
-                self.append_status_to_file(file_path, "sent OK")
-            except Exception as e:
-                print(f"Failed to send email for {file_path}. Error: {str(e)}")
-                
-                # Add failure message to file
-                self.append_status_to_file(file_path, "sent Failed")
-
-        except Exception as e:
-            print(f"Error processing file: {str(e)}")
-
-    def append_status_to_file(self, file_path, status):
-        try:
-            current_time = datetime.now().strftime("%I:%M %p - %d/%m/%y")
-            with open(file_path, "a", encoding="utf-8") as file:
-                file.write(f"\nServer Sent Timestamp: {current_time} : {status}\n")
-        except Exception as e:
-            print(f"Failed to write status to file: {str(e)}")
-
-def start_file_watcher():
-    # Get the vault path from environment variables
-    obsidian_vault_path = os.getenv("OBSIDIAN_VAULT_PATH")
-    
-    if not obsidian_vault_path:
-        logging.error("OBSIDIAN_VAULT_PATH not found in environment variables")
-        return
-        
-    if not os.path.exists(obsidian_vault_path):
-        logging.error(f"Vault path not found: {obsidian_vault_path}")
-        return
-
-    event_handler = ObsidianHandler()
-    observer = Observer()
-    observer.schedule(event_handler, obsidian_vault_path, recursive=True)
-    observer.start()
-    logging.info(f"Started watching Obsidian vault at: {obsidian_vault_path}")
-
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
-
 # Update the load_dotenv logic to handle exe environments
 def get_base_path():
     if getattr(sys, 'frozen', False):
@@ -552,6 +329,8 @@ def start_service():
 
     # Initialize remaining services
     init_db()
+    # Resume delivery of anything left in the outbox by the previous run
+    start_sending()
     
     # Start the file watcher in a separate thread
     watcher_thread = threading.Thread(target=start_file_watcher, daemon=True)
@@ -560,10 +339,11 @@ def start_service():
     # Start the FastAPI server in a separate thread
     def run_server():
         import uvicorn
+        from api import app
         config = uvicorn.Config(
             app,
-            host="localhost",
-            port=8002,
+            host=API_HOST,
+            port=API_PORT,
             log_config=None,
             access_log=False
         )
@@ -0,0 +1,84 @@
+import re
+
+# "#sender: Name" (spaces around the tag and colon are tolerated)
+SENDER_PATTERN = re.compile(r"^\s*#\s*sender\s*:(.*)$")
+# A line that is exactly "#send"
+SEND_PATTERN = re.compile(r"^\s*#send\s*$")
+# "![[file.png]]", "![[folder/doc.pdf|alias]]", "![[Note#Heading]]"
+EMBED_PATTERN = re.compile(r"!\[\[([^\]]+)\]\]")
+
+
+class NoteParser:
+    """
+    Incremental parser for the note format:
+    #sender: Name
+    Today's Task
+    .
+    .
+    -------------------
+    Tomorrow's Task
+    .
+    .
+    #send
+
+    Lines are fed one at a time, so a note can be parsed in a single pass
+    and a parse can be resumed when more lines are appended to the file.
+    Embedded files ("![[file.png]]") are collected in order; a line that
+    holds nothing but embeds is not a task.
+    """
+
+    def __init__(self):
+        self.sender_name = None
+        self.tasks = []
+        self.embeds = []
+        self.has_send_tag = False
+
+    def feed(self, line):
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            match = SENDER_PATTERN.match(stripped)
+            if match:
+                self.sender_name = match.group(1).strip()
+            elif SEND_PATTERN.match(stripped):
+                self.has_send_tag = True
+        else:
+            if "![[" in stripped:
+                for target in EMBED_PATTERN.findall(stripped):
+                    # Drop the alias and any heading or block reference
+                    target = re.split(r"[|#^]", target, 1)[0].strip()
+                    if target and target not in self.embeds:
+                        self.embeds.append(target)
+                if not EMBED_PATTERN.sub("", stripped).strip():
+                    return
+            self.tasks.append(stripped)
+
+    def result(self, trailing_line=None):
+        """
+        Return (has_send_tag, sender_name, tasks, embeds), optionally as if
+        trailing_line had also been fed, without changing the parser state.
+        """
+        if trailing_line is None:
+            return self.has_send_tag, self.sender_name, list(self.tasks), list(self.embeds)
+        peek = NoteParser()
+        peek.sender_name = self.sender_name
+        peek.has_send_tag = self.has_send_tag
+        peek.embeds = list(self.embeds)
+        peek.feed(trailing_line)
+        return peek.has_send_tag, peek.sender_name, self.tasks + peek.tasks, peek.embeds
+
+
+def parse_lines(lines):
+    """
+    Parse a note in a single pass over an iterable of lines and return
+    (has_send_tag, sender_name, tasks, embeds). A file object can be passed directly
+    without loading it whole.
+    """
+    parser = NoteParser()
+    for line in lines:
+        parser.feed(line)
+    return parser.result()
+
+
+def parse_file(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return parse_lines(file)
@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.utils import make_msgid
+
+from database import get_store
+from logging_setup import traced
+from rate_limit import is_throttle_response
+
+# Outbox configuration
+OUTBOX_SENDERS = int(os.getenv("OUTBOX_SENDERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "5"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+OUTBOX_MAX_PENDING = int(os.getenv("OUTBOX_MAX_PENDING", "10000"))
+OUTBOX_POLL_INTERVAL = 5.0
+
+OUTBOX_COLUMNS = (
+    "id", "created_at", "subject", "recipient", "body", "source_path", "message_id",
+    "status", "attempts", "next_attempt_at", "last_error", "sent_at", "account", "attachments",
+)
+
+
+class OutboxFullError(Exception):
+    pass
+
+
+def is_permanent_failure(error):
+    """
+    5xx replies will not succeed on retry, except auth problems (an operator
+    can fix them) and quota replies (they clear up on their own).
+    """
+    if is_throttle_response(error):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return isinstance(error, ValueError)
+
+
+class Outbox:
+    """
+    Durable queue of outgoing mail in the outbox table next to processed_files.
+
+    enqueue() only writes a row; background sender threads claim due rows,
+    deliver them, and either mark them sent or reschedule them with
+    exponential backoff and jitter. After OUTBOX_MAX_ATTEMPTS failures, or a
+    permanent 5xx failure, a row is moved to the dead state until an operator
+    retries it. Rows left in the sending state by a crash are put back to
+    pending on startup. Each row carries a fixed Message-ID, so a message
+    re-sent after such a crash can be recognised as the same message.
+
+    Rows belong to a sending account (None for the default one) and an
+    instance only claims its own account's rows, so each account can have its
+    own senders. An instance that is never started only enqueues; notify, if
+    given, is called with the account after each enqueue so senders running
+    in another process can be woken up.
+    """
+
+    def __init__(self, deliver, on_complete=None, store=None, senders=OUTBOX_SENDERS, account=None, notify=None):
+        self.deliver = deliver
+        self.on_complete = on_complete
+        self.store = store or get_store()
+        self.sender_count = senders
+        self.account = account
+        self.notify = notify
+        self._wakeup = threading.Event()
+        self._running = False
+        self._threads = []
+        self._init_table()
+
+    def _init_table(self):
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbox
+                (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 created_at REAL NOT NULL,
+                 subject TEXT NOT NULL,
+                 recipient TEXT NOT NULL,
+                 body TEXT NOT NULL,
+                 source_path TEXT,
+                 message_id TEXT NOT NULL,
+                 status TEXT NOT NULL DEFAULT 'pending',
+                 attempts INTEGER NOT NULL DEFAULT 0,
+                 next_attempt_at REAL NOT NULL,
+                 last_error TEXT,
+                 sent_at REAL)
+            ''')
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "account" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN account TEXT")
+            if "attachments" not in columns:
+                # JSON list of file paths, read only when the message is sent
+                conn.execute("ALTER TABLE outbox ADD COLUMN attachments TEXT")
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_outbox_due
+                ON outbox (status, next_attempt_at)
+            ''')
+
+    def start(self):
+        if self._running:
+            return
+        conn = self.store.connection()
+        with conn:
+            # Anything of ours still marked as sending was interrupted by a shutdown
+            conn.execute(
+                "UPDATE outbox SET status = 'pending' WHERE status = 'sending' AND account IS ?", (self.account,)
+            )
+        self._running = True
+        for i in range(self.sender_count):
+            thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Started {self.sender_count} outbox senders" + (f" for {self.account}" if self.account else ""))
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def wake(self):
+        self._wakeup.set()
+
+    def enqueue(self, subject, recipient, body, source_path=None, in_transaction=None, content_hash=None,
+                attachments=None):
+        """
+        Store a message for delivery and return its id. When source_path is
+        given, the note is marked processed (status 'queued', with its
+        content_hash) in the same transaction; in_transaction(conn,
+        message_id) can add further writes to it. attachments are file paths
+        to attach at send time.
+        """
+        now = time.time()
+        conn = self.store.connection()
+        with conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+            ).fetchone()[0]
+            if pending >= OUTBOX_MAX_PENDING:
+                raise OutboxFullError("Outbox is full, try again later")
+            cursor = conn.execute(
+                "INSERT INTO outbox (created_at, subject, recipient, body, source_path, message_id, next_attempt_at, "
+                "account, attachments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (now, subject, recipient, body, source_path, make_msgid(), now, self.account,
+                 json.dumps(attachments) if attachments else None),
+            )
+            if source_path is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO processed_files (file_path, processed_at, content_hash, status) "
+                    "VALUES (?, ?, ?, 'queued')", (source_path, now, content_hash)
+                )
+            if in_transaction is not None:
+                in_transaction(conn, cursor.lastrowid)
+        if source_path is not None:
+            self.store.cache_processed(source_path)
+        self._wakeup.set()
+        if self.notify is not None:
+            self.notify(self.account)
+        return cursor.lastrowid
+
+    def get(self, message_id):
+        row = self.store.connection().execute(
+            f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM outbox WHERE id = ?", (message_id,)
+        ).fetchone()
+        return dict(zip(OUTBOX_COLUMNS, row)) if row else None
+
+    def list(self, status=None, limit=100):
+        sql = f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM outbox"
+        params = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        rows = self.store.connection().execute(sql, params).fetchall()
+        return [dict(zip(OUTBOX_COLUMNS, row)) for row in rows]
+
+    def counts(self):
+        rows = self.store.connection().execute(
+            "SELECT status, COUNT(*) FROM outbox GROUP BY status"
+        ).fetchall()
+        return dict(rows)
+
+    def retry(self, message_id=None, status="dead"):
+        """Reschedule one message, or every message in the given status, for immediate delivery."""
+        conn = self.store.connection()
+        with conn:
+            if message_id is not None:
+                cursor = conn.execute(
+                    "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? "
+                    "WHERE id = ? AND status != 'sending'",
+                    (time.time(), message_id),
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = ?",
+                    (time.time(), status),
+                )
+        self._wakeup.set()
+        return cursor.rowcount
+
+    def purge(self, message_id=None, status="sent", older_than=0):
+        conn = self.store.connection()
+        with conn:
+            if message_id is not None:
+                cursor = conn.execute(
+                    "DELETE FROM outbox WHERE id = ? AND status != 'sending'", (message_id,)
+                )
+            else:
+                cursor = conn.execute(
+                    "DELETE FROM outbox WHERE status = ? AND created_at <= ?",
+                    (status, time.time() - older_than),
+                )
+        return cursor.rowcount
+
+    def _claim(self):
+        conn = self.store.connection()
+        now = time.time()
+        with conn:
+            row = conn.execute(
+                f"SELECT {', '.join(OUTBOX_COLUMNS)} FROM outbox "
+                "WHERE status = 'pending' AND next_attempt_at <= ? AND account IS ? "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (now, self.account),
+            ).fetchone()
+            if row is None:
+                return None
+            # The status check makes the claim safe against other senders
+            cursor = conn.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1 "
+                "WHERE id = ? AND status = 'pending'",
+                (row[0],),
+            )
+            if cursor.rowcount == 0:
+                return None
+        entry = dict(zip(OUTBOX_COLUMNS, row))
+        entry["attempts"] += 1
+        return entry
+
+    def _next_due_in(self):
+        row = self.store.connection().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending' AND account IS ?", (self.account,)
+        ).fetchone()
+        if row[0] is None:
+            return OUTBOX_POLL_INTERVAL
+        return max(0.0, min(OUTBOX_POLL_INTERVAL, row[0] - time.time()))
+
+    def _backoff(self, attempts):
+        delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)))
+        # Jitter keeps senders from retrying in lockstep after an outage
+        return delay * random.uniform(0.5, 1.0)
+
+    def _finish(self, entry, status, error=None, next_attempt_at=None, refund=False):
+        conn = self.store.connection()
+        with conn:
+            if status == "sent":
+                conn.execute(
+                    "UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                    (time.time(), entry["id"]),
+                )
+            else:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, last_error = ?, next_attempt_at = ?, attempts = attempts - ? "
+                    "WHERE id = ?",
+                    (status, str(error), next_attempt_at or time.time(), 1 if refund else 0, entry["id"]),
+                )
+        if status in ("sent", "dead") and self.on_complete is not None:
+            try:
+                self.on_complete(entry, status == "sent")
+            except Exception as e:
+                logging.error(f"Outbox completion hook failed for message {entry['id']}: {e}")
+
+    def _run(self):
+        while self._running:
+            self._wakeup.clear()
+            try:
+                entry = self._claim()
+            except sqlite3.Error as e:
+                logging.error(f"Outbox claim failed: {e}")
+                entry = None
+            if entry is None:
+                self._wakeup.wait(self._next_due_in())
+                continue
+
+            # Lines logged while handling a note's message carry the note's trace id
+            with traced(entry["source_path"]):
+                self._handle(entry)
+
+    def _handle(self, entry):
+        try:
+            self.deliver(entry)
+        except Exception as e:
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                # Out of sending budget: wait for it without using up an attempt
+                logging.info(f"Outbox message {entry['id']} deferred {retry_after:.1f}s: {e}")
+                self._finish(entry, "pending", error=e, next_attempt_at=time.time() + retry_after, refund=True)
+            elif is_permanent_failure(e) or entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                logging.error(f"Outbox message {entry['id']} dead after {entry['attempts']} attempts: {e}")
+                self._finish(entry, "dead", error=e)
+            else:
+                delay = self._backoff(entry["attempts"])
+                logging.warning(f"Outbox message {entry['id']} failed, retrying in {delay:.1f}s: {e}")
+                self._finish(entry, "pending", error=e, next_attempt_at=time.time() + delay)
+            return
+
+        logging.info(f"Outbox message {entry['id']} sent to {entry['recipient']}")
+        self._finish(entry, "sent")
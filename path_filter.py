@@ -0,0 +1,61 @@
+import fnmatch
+import os
+import re
+
+# Watch filter configuration (comma separated globs, relative to the vault root)
+WATCH_INCLUDE = os.getenv("WATCH_INCLUDE", "*.md")
+WATCH_EXCLUDE = os.getenv("WATCH_EXCLUDE", ".obsidian/**,.trash/**,.git/**")
+
+
+def _split_globs(value):
+    return [glob.strip() for glob in value.split(",") if glob.strip()]
+
+
+def _compile(globs):
+    if not globs:
+        return None
+    patterns = []
+    for glob in globs:
+        patterns.append(fnmatch.translate(glob))
+        # "**/x" should also match x at the top level
+        if glob.startswith("**/"):
+            patterns.append(fnmatch.translate(glob[3:]))
+    return re.compile("|".join(patterns))
+
+
+class PathFilter:
+    """
+    Include/exclude globs compiled once into a single regex each.
+
+    Paths are matched relative to the vault root with "/" separators. A path
+    is allowed when it matches an include glob (or there are none) and no
+    exclude glob.
+    """
+
+    def __init__(self, root, include=None, exclude=None):
+        self.root = os.path.abspath(root)
+        self._prefix = os.path.join(self.root, "")
+        self.include_globs = _split_globs(WATCH_INCLUDE) if include is None else list(include)
+        self.exclude_globs = _split_globs(WATCH_EXCLUDE) if exclude is None else list(exclude)
+        self._include = _compile(self.include_globs)
+        self._exclude = _compile(self.exclude_globs)
+
+    def relative(self, path):
+        if path.startswith(self._prefix):
+            path = path[len(self._prefix):]
+        else:
+            path = os.path.relpath(path, self.root)
+        if os.sep != "/":
+            path = path.replace(os.sep, "/")
+        return path
+
+    def allows(self, path):
+        rel = self.relative(path)
+        if self._exclude is not None and self._exclude.match(rel):
+            return False
+        return self._include is None or self._include.match(rel) is not None
+
+    def excludes_dir(self, path):
+        """True if everything below this directory is excluded."""
+        rel = self.relative(path)
+        return self._exclude is not None and self._exclude.match(rel + "/") is not None
@@ -0,0 +1,324 @@
+"""
+Polling observer for vaults on SMB/NFS shares and sync folders, where OS
+file events are missing or unreliable.
+
+Unlike watchdog's PollingObserver it does not walk the whole tree on every
+poll. It keeps a snapshot of directory mtimes and file stats and, per poll:
+
+  - stats every known directory and rescans (os.scandir) only those whose
+    mtime changed, which catches creates, deletes and renames;
+  - restats files that changed recently, since saving a note in place does
+    not touch its directory's mtime;
+  - rescans a small rotating slice of directories, so every in-place edit is
+    found within POLL_SWEEP_INTERVAL even for files that were quiet.
+
+Directory work is spread over a thread pool, and the interval stretches from
+POLL_INTERVAL_MIN to POLL_INTERVAL_MAX while nothing changes. Only files and
+directories the handler's path filter allows are kept in the snapshot.
+Handlers get the same watchdog events the native observers produce.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from watchdog.events import (
+    DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent,
+    FileModifiedEvent, FileMovedEvent,
+)
+
+from metrics import Histogram
+
+POLL_INTERVAL_MIN = float(os.getenv("POLL_INTERVAL_MIN", "1"))
+POLL_INTERVAL_MAX = float(os.getenv("POLL_INTERVAL_MAX", "10"))
+# Every directory is rescanned at least this often, to catch in-place edits of quiet files (0 disables)
+POLL_SWEEP_INTERVAL = float(os.getenv("POLL_SWEEP_INTERVAL", "600"))
+# Files changed within this many seconds are restatted on every poll
+POLL_HOT_WINDOW = float(os.getenv("POLL_HOT_WINDOW", "300"))
+POLL_WORKERS = int(os.getenv("POLL_WORKERS", "8"))
+# Each idle poll waits this much longer than the last
+POLL_BACKOFF = 1.5
+
+POLL_SECONDS = Histogram("obsidian_poll_seconds", "Time per snapshot polling pass")
+
+_ERROR = object()
+
+
+class _DirState:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files  # name -> (size, mtime_ns, inode)
+        self.subdirs = subdirs
+
+
+class _Watch:
+    def __init__(self, handler, path, recursive):
+        self.handler = handler
+        self.path = os.path.abspath(path)
+        self.recursive = recursive
+        self.path_filter = getattr(handler, "path_filter", None)
+        self.dirs = {}
+        self.hot = {}  # file path -> when it last changed
+        self.sweep = deque()
+        self.ready = False
+
+    def wants_dir(self, path):
+        return self.path_filter is None or not self.path_filter.excludes_dir(path)
+
+    def wants_file(self, path):
+        return self.path_filter is None or self.path_filter.allows(path)
+
+
+def _dir_mtime(path):
+    """A directory's mtime_ns, None if it is gone, or _ERROR if it could not be read."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    except OSError as e:
+        logging.warning(f"Polling: cannot stat {path}: {e}")
+        return _ERROR
+
+
+class SnapshotPollingObserver(threading.Thread):
+    """Drop-in for watchdog's Observer: schedule(), start(), stop(), join()."""
+
+    # Excluded directories are left out of the snapshot, so one recursive watch per vault is enough
+    prunes_excluded_dirs = True
+
+    def __init__(self, interval_min=POLL_INTERVAL_MIN, interval_max=POLL_INTERVAL_MAX,
+                 sweep_interval=POLL_SWEEP_INTERVAL, hot_window=POLL_HOT_WINDOW, workers=POLL_WORKERS):
+        super().__init__(name="snapshot-poller", daemon=True)
+        self.interval_min = interval_min
+        self.interval_max = max(interval_min, interval_max)
+        self.sweep_interval = sweep_interval
+        self.hot_window = hot_window
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="poll-scan")
+        self._watches = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._last_poll = time.monotonic()
+        self.polls = 0
+
+    def schedule(self, event_handler, path, recursive=False):
+        watch = _Watch(event_handler, path, recursive)
+        with self._lock:
+            self._watches.append(watch)
+        return watch
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        interval = self.interval_min
+        try:
+            self._snapshot_new_watches()
+            self._last_poll = time.monotonic()
+            while not self._stopped.wait(interval):
+                with POLL_SECONDS.time():
+                    active = self._poll()
+                interval = self.interval_min if active else min(self.interval_max, interval * POLL_BACKOFF)
+        finally:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _snapshot_new_watches(self):
+        with self._lock:
+            watches = [watch for watch in self._watches if not watch.ready]
+        for watch in watches:
+            start = time.perf_counter()
+            watch.dirs.update(self._walk(watch, watch.path))
+            watch.sweep.extend(watch.dirs)
+            watch.ready = True
+            files = sum(len(state.files) for state in watch.dirs.values())
+            logging.info(
+                f"Polling {watch.path}: snapshot of {len(watch.dirs)} directories and {files} files "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+
+    def _scan_dir(self, watch, path):
+        """Fresh _DirState for a directory, None if it is gone, or _ERROR if it could not be read."""
+        files = {}
+        subdirs = set()
+        try:
+            # Taken before listing, so a change made during the listing is seen again next poll
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if watch.wants_dir(entry.path):
+                                subdirs.add(entry.name)
+                        elif entry.is_file(follow_symlinks=False) and watch.wants_file(entry.path):
+                            st = entry.stat(follow_symlinks=False)
+                            files[entry.name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                    except OSError:
+                        # Removed between the listing and the stat
+                        continue
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except OSError as e:
+            # A flaky share must not look like every note was deleted
+            logging.warning(f"Polling: cannot scan {path}: {e}")
+            return _ERROR
+        return _DirState(mtime_ns, files, subdirs)
+
+    def _walk(self, watch, root):
+        """Snapshot a directory and, for recursive watches, everything below it."""
+        states = {}
+        level = [root]
+        while level:
+            scanned = self._pool.map(lambda path: (path, self._scan_dir(watch, path)), level)
+            level = []
+            for path, state in scanned:
+                if state is None or state is _ERROR:
+                    continue
+                states[path] = state
+                if watch.recursive:
+                    level.extend(os.path.join(path, name) for name in state.subdirs)
+        return states
+
+    def _poll(self):
+        """One pass over every watch; returns True if anything changed."""
+        self._snapshot_new_watches()
+        now = time.monotonic()
+        elapsed, self._last_poll = now - self._last_poll, now
+        self.polls += 1
+        with self._lock:
+            watches = list(self._watches)
+        active = False
+        for watch in watches:
+            try:
+                if self._poll_watch(watch, elapsed):
+                    active = True
+            except Exception as e:
+                logging.error(f"Polling {watch.path} failed: {e}")
+        return active
+
+    def _poll_watch(self, watch, elapsed):
+        paths = list(watch.dirs)
+        to_scan = {
+            path for path, mtime in zip(paths, self._pool.map(_dir_mtime, paths))
+            if mtime is not _ERROR and (mtime is None or mtime != watch.dirs[path].mtime_ns)
+        }
+
+        # A rotating slice of the tree, sized so it all comes round once per sweep interval
+        if self.sweep_interval > 0 and watch.sweep:
+            budget = math.ceil(len(watch.dirs) * min(1.0, elapsed / self.sweep_interval))
+            for _ in range(min(budget, len(watch.sweep))):
+                path = watch.sweep.popleft()
+                if path in watch.dirs:
+                    to_scan.add(path)
+                    watch.sweep.append(path)
+
+        created, removed, modified = {}, {}, []
+        dirs_created, dirs_deleted = [], []
+        scanned = self._pool.map(lambda path: (path, self._scan_dir(watch, path)), to_scan)
+        for path, state in scanned:
+            old = watch.dirs.get(path)
+            if state is _ERROR or old is None:
+                continue
+            if state is None:
+                # Gone: its parent's rescan reports the directory itself
+                self._collect_removed_tree(watch, path, removed)
+                continue
+            for name, stat in state.files.items():
+                previous = old.files.get(name)
+                if previous is None:
+                    created[os.path.join(path, name)] = stat
+                elif previous[:2] != stat[:2]:
+                    modified.append(os.path.join(path, name))
+            for name in old.files.keys() - state.files.keys():
+                removed[os.path.join(path, name)] = old.files[name]
+            for name in state.subdirs - old.subdirs:
+                subdir = os.path.join(path, name)
+                dirs_created.append(subdir)
+                if watch.recursive:
+                    for new_path, new_state in self._walk(watch, subdir).items():
+                        watch.dirs[new_path] = new_state
+                        watch.sweep.append(new_path)
+                        if new_path != subdir:
+                            dirs_created.append(new_path)
+                        for file_name, stat in new_state.files.items():
+                            created[os.path.join(new_path, file_name)] = stat
+            for name in old.subdirs - state.subdirs:
+                subdir = os.path.join(path, name)
+                dirs_deleted.append(subdir)
+                self._collect_removed_tree(watch, subdir, removed)
+            watch.dirs[path] = state
+
+        modified.extend(self._restat_hot(watch, to_scan))
+
+        # A file that vanished in one place and appeared in another with the same inode was moved
+        removed_by_inode = {stat[2]: path for path, stat in removed.items() if stat[2]}
+        moved = []
+        for path, stat in list(created.items()):
+            src = removed_by_inode.pop(stat[2], None) if stat[2] else None
+            if src is not None and src in removed:
+                del removed[src]
+                del created[path]
+                moved.append((src, path))
+
+        now = time.monotonic()
+        for path in (*created, *modified, *(dest for _, dest in moved)):
+            watch.hot[path] = now
+        for path in removed:
+            watch.hot.pop(path, None)
+        for src, _ in moved:
+            watch.hot.pop(src, None)
+
+        events = [DirCreatedEvent(path) for path in dirs_created]
+        events += [FileMovedEvent(src, dest) for src, dest in moved]
+        events += [FileDeletedEvent(path) for path in removed]
+        events += [DirDeletedEvent(path) for path in dirs_deleted]
+        # Native observers report a new file's content as a modification after the create
+        for path in created:
+            events += [FileCreatedEvent(path), FileModifiedEvent(path)]
+        events += [FileModifiedEvent(path) for path in modified]
+        for event in events:
+            try:
+                watch.handler.dispatch(event)
+            except Exception as e:
+                logging.error(f"Polling: handler failed on {event}: {e}")
+        return bool(events)
+
+    def _collect_removed_tree(self, watch, path, removed):
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            state = watch.dirs.pop(directory, None)
+            if state is None:
+                continue
+            for name, stat in state.files.items():
+                removed[os.path.join(directory, name)] = stat
+            stack.extend(os.path.join(directory, name) for name in state.subdirs)
+
+    def _restat_hot(self, watch, scanned_dirs):
+        """Restat recently changed files outside the directories just rescanned; returns the modified ones."""
+        cutoff = time.monotonic() - self.hot_window
+        for path in [path for path, changed in watch.hot.items() if changed < cutoff]:
+            del watch.hot[path]
+        candidates = [path for path in watch.hot if os.path.dirname(path) not in scanned_dirs]
+
+        def restat(path):
+            try:
+                return path, os.stat(path)
+            except OSError:
+                # Deleted or renamed: the directory's mtime shows that
+                return path, None
+
+        modified = []
+        for path, st in self._pool.map(restat, candidates):
+            state = watch.dirs.get(os.path.dirname(path))
+            name = os.path.basename(path)
+            if st is None or state is None or name not in state.files:
+                continue
+            stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if state.files[name][:2] != stat[:2]:
+                state.files[name] = stat
+                modified.append(path)
+        return modified
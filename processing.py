@@ -0,0 +1,103 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+# Processing pool configuration
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", "4"))
+
+
+class PathWorkerPool:
+    """
+    Thread pool that runs a handler for file paths off the watchdog thread.
+
+    A path is never handled by two workers at once: submitting a path that is
+    already queued is a no-op, and submitting one that is being handled marks
+    it to run once more after the current pass finishes.
+    """
+
+    def __init__(self, handler, workers=PROCESSING_WORKERS):
+        self.handler = handler
+        self.worker_count = workers
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._active = set()
+        self._rerun = set()
+        self._threads = []
+        self._started_at = None
+
+        self.busy_workers = 0
+        self.busy_time = 0.0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._started_at = time.monotonic()
+        for i in range(self.worker_count):
+            thread = threading.Thread(target=self._run, name=f"processing-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, path):
+        with self._lock:
+            if path in self._queued:
+                return
+            if path in self._active:
+                self._rerun.add(path)
+                return
+            self._queued.add(path)
+        self._queue.put(path)
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            with self._lock:
+                self._queued.discard(path)
+                self._active.add(path)
+                self.busy_workers += 1
+            start = time.monotonic()
+            ok = False
+            try:
+                self.handler(path)
+                ok = True
+            except Exception as e:
+                logging.error(f"Processing failed for {path}: {e}")
+            finally:
+                with self._lock:
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                    self.busy_time += time.monotonic() - start
+                    self.busy_workers -= 1
+                    self._active.discard(path)
+                    rerun = path in self._rerun
+                    self._rerun.discard(path)
+                if rerun:
+                    self.submit(path)
+
+    def stats(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            capacity = elapsed * self.worker_count
+            return {
+                "workers": self.worker_count,
+                "queue_depth": self._queue.qsize(),
+                "busy_workers": self.busy_workers,
+                "completed": self.completed,
+                "failed": self.failed,
+                "utilization": round(self.busy_time / capacity, 4) if capacity else 0.0,
+            }
@@ -0,0 +1,202 @@
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import get_store
+
+# Sending budgets (0 disables a limit); defaults sit under Gmail's published limits
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "5"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_PER_DAY = int(os.getenv("RATE_LIMIT_PER_DAY", "500"))
+# Longest a sender will block waiting for a token before giving up
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "30"))
+# Adaptive throttling after the server pushes back
+THROTTLE_BACKOFF_MIN = float(os.getenv("THROTTLE_BACKOFF_MIN", "30"))
+THROTTLE_BACKOFF_MAX = float(os.getenv("THROTTLE_BACKOFF_MAX", "900"))
+
+THROTTLE_CODES = (421, 450, 451, 452, 454)
+# Gmail answers 550 5.4.5 (and similar wording) when a quota is exhausted
+QUOTA_MARKERS = (b"5.4.5", b"quota", b"rate limit", b"too many")
+
+
+class RateLimitExceeded(smtplib.SMTPException):
+    """Raised instead of sending when the budget will not allow it soon enough."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttle_response(error):
+    """True for replies that mean "slow down" rather than "this message is bad"."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(is_throttle_response(smtplib.SMTPResponseException(code, msg))
+                   for code, msg in error.recipients.values())
+    if not isinstance(error, smtplib.SMTPResponseException):
+        return False
+    if error.smtp_code in THROTTLE_CODES:
+        return True
+    message = error.smtp_error if isinstance(error.smtp_error, bytes) else str(error.smtp_error).encode()
+    return error.smtp_code >= 500 and any(marker in message.lower() for marker in QUOTA_MARKERS)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now, scale=1.0):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * scale)
+        self.updated = now
+
+    def wait_time(self, scale=1.0):
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / (self.rate * scale)
+
+
+class RateLimiter:
+    """
+    Shared outbound budget for every SMTP sender.
+
+    Per-second and per-minute limits are token buckets; the per-day count is
+    kept in the smtp_send_counter table so it survives restarts. When the
+    server answers with a throttling reply, sending pauses for a backoff that
+    doubles on each further throttle, and the bucket rates are halved and
+    then restored gradually as sends succeed again.
+
+    Each named account gets its own limiter; its daily count is stored under
+    "<account>:<day>" so accounts do not share a budget.
+    """
+
+    def __init__(self, per_second=RATE_LIMIT_PER_SECOND, per_minute=RATE_LIMIT_PER_MINUTE,
+                 per_day=RATE_LIMIT_PER_DAY, store=None, account=None):
+        self.store = store or get_store()
+        self.account = account
+        self.per_day = per_day
+        self._buckets = []
+        if per_second:
+            self._buckets.append(TokenBucket(per_second, max(1.0, per_second)))
+        if per_minute:
+            self._buckets.append(TokenBucket(per_minute / 60.0, max(1.0, per_minute / 6.0)))
+        self._lock = threading.Lock()
+
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.backoff = THROTTLE_BACKOFF_MIN
+        self.throttled = 0
+        self.waited = 0.0
+
+        self._init_table()
+        self.day, self.day_count = self._load_day()
+
+    def _init_table(self):
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS smtp_send_counter
+                (day TEXT PRIMARY KEY, count INTEGER NOT NULL)
+            ''')
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _seconds_until_tomorrow():
+        now = datetime.now(timezone.utc)
+        tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - now).total_seconds()
+
+    def _counter_key(self, day):
+        return day if self.account is None else f"{self.account}:{day}"
+
+    def _load_day(self):
+        day = self._today()
+        row = self.store.connection().execute(
+            "SELECT count FROM smtp_send_counter WHERE day = ?", (self._counter_key(day),)
+        ).fetchone()
+        return day, row[0] if row else 0
+
+    def _persist_day(self, day, count):
+        conn = self.store.connection()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO smtp_send_counter (day, count) VALUES (?, ?)",
+                    (self._counter_key(day), count),
+                )
+        except sqlite3.Error as e:
+            logging.error(f"Failed to persist daily send count: {e}")
+
+    def acquire(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        Block until one message may be sent, then count it against the budgets.
+        Raises RateLimitExceeded if that would take longer than max_wait.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                day = self._today()
+                if day != self.day:
+                    self.day, self.day_count = day, 0
+                if self.per_day and self.day_count >= self.per_day:
+                    raise RateLimitExceeded(
+                        f"Daily sending limit of {self.per_day} reached", self._seconds_until_tomorrow()
+                    )
+                wait = max(0.0, self.paused_until - now)
+                for bucket in self._buckets:
+                    bucket.refill(now, self.scale)
+                    wait = max(wait, bucket.wait_time(self.scale))
+                if wait <= 0:
+                    for bucket in self._buckets:
+                        bucket.tokens -= 1
+                    self.day_count += 1
+                    self.waited += waited
+                    day, count = self.day, self.day_count
+                    break
+                if waited + wait > max_wait:
+                    raise RateLimitExceeded("Sending rate limit reached", wait)
+            time.sleep(wait)
+            waited += wait
+        self._persist_day(day, count)
+
+    def record_success(self):
+        with self._lock:
+            if self.scale < 1.0:
+                self.scale = min(1.0, self.scale * 1.05)
+            elif self.backoff > THROTTLE_BACKOFF_MIN:
+                self.backoff = THROTTLE_BACKOFF_MIN
+
+    def record_failure(self, error):
+        """Feed back a failed send; returns True if it was treated as throttling."""
+        if not is_throttle_response(error):
+            return False
+        with self._lock:
+            self.throttled += 1
+            self.paused_until = time.monotonic() + self.backoff
+            self.scale = max(0.1, self.scale / 2)
+            logging.warning(
+                f"SMTP server is throttling us ({error}); pausing sends for {self.backoff:.0f}s"
+            )
+            self.backoff = min(THROTTLE_BACKOFF_MAX, self.backoff * 2)
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "day": self.day,
+                "sent_today": self.day_count,
+                "daily_limit": self.per_day,
+                "rate_scale": round(self.scale, 3),
+                "paused_for_s": round(max(0.0, self.paused_until - time.monotonic()), 1),
+                "throttled": self.throttled,
+                "waited_s": round(self.waited, 3),
+            }
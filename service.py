@@ -0,0 +1,650 @@
+"""
+Core of the Obsidian email service: configuration, the outbox and SMTP pool,
+and the vault watcher. Kept free of GUI and web framework imports so the
+headless daemon starts quickly; see api.py for the HTTP API and main.py for
+the desktop app.
+"""
+import io
+import os
+from dotenv import load_dotenv
+from watchdog.events import FileMovedEvent, FileSystemEventHandler
+import time
+import threading
+from database import get_store, is_file_processed, mark_file_processed, start_maintenance, stop_maintenance
+from outbox import Outbox
+from debounce import DebounceScheduler
+from digest import DIGEST_MODE, DigestCollector
+from fingerprints import FingerprintIndex
+from path_filter import PathFilter
+from status_writer import SelfWriteRegistry, StatusWriter
+from metrics import CallbackMetric, Counter, Histogram
+from processing import PathWorkerPool
+from note_parser import parse_lines
+from tail_reader import PARSE_SECONDS, TailReader
+from vault_scan import VaultManifest, scan_vault
+from datetime import datetime
+import json
+import logging
+from attachments import ATTACHMENTS_ENABLED, AttachmentResolver, StreamingMessage, select_attachments
+from logging_setup import configure_logging, traced
+
+# Load environment variables
+try:
+    load_dotenv()
+except OSError:
+    # Silently continue if .env file is not found
+    pass
+
+# Queued, trace-tagged logging (see logging_setup.py); after .env so LOG_* settings apply
+configure_logging()
+
+# Email configuration
+EMAIL_ADDRESS = os.getenv("EMAIL_ADDRESS")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+EMAIL_BATCH_MAX = int(os.getenv("EMAIL_BATCH_MAX", "1000"))
+
+# HTTP API
+API_HOST = os.getenv("API_HOST", "localhost")
+API_PORT = int(os.getenv("API_PORT", "8002"))
+# "outbox" queues /send-email durably; "direct" sends it before answering, over asyncio SMTP
+API_SEND_MODE = os.getenv("API_SEND_MODE", "outbox").lower()
+
+# Obsidian configuration
+# OBSIDIAN_VAULT_PATH = "C:/obsidian vault"  # Replace with your path
+RECIPIENT_EMAIL = "rahulroy.agtt@gmail.com"  # Replace with your email
+# "native" uses OS file events; "polling" suits SMB/NFS shares and sync folders (see polling_observer.py)
+WATCHER_BACKEND = os.getenv("WATCHER_BACKEND", "native").lower()
+# A new note with the content of a sent one counts as a rename only if the sent note's path
+# was deleted or moved away this many seconds before; otherwise it is a new note and is sent
+RENAME_WINDOW = float(os.getenv("RENAME_WINDOW", "10"))
+
+# Handler of the running file watcher, if any
+watcher_handler = None
+# Supervisor of the vault worker processes when several vaults are watched
+vault_supervisor = None
+
+# Metrics for the watcher and send hot paths, exposed at /metrics
+WATCHER_EVENTS = Counter("obsidian_watcher_events_total", "File events seen by the watcher", ["result"])
+FILES_PROCESSED = Counter("obsidian_files_processed_total", "Debounced file processing passes by outcome", ["outcome"])
+FILE_PROCESS_SECONDS = Histogram("obsidian_file_process_seconds", "Time spent in ObsidianHandler.process_file")
+EVENT_TO_PARSED_SECONDS = Histogram("obsidian_event_to_parsed_seconds", "Time from first file event to parsed note, including debounce")
+NOTE_READ_SECONDS = Histogram("obsidian_note_read_seconds", "Time to read and parse new note content")
+SEND_SECONDS = Histogram("obsidian_send_email_seconds", "Time to hand a message to the SMTP server", ["path"])
+
+def _watcher_stat(key):
+    return lambda: watcher_handler.stats()[key] if watcher_handler is not None else None
+
+def _pool_stat(key):
+    return lambda: smtp_pool.stats()[key] if smtp_pool is not None else None
+
+CallbackMetric("obsidian_debounce_coalesced_total", "Events merged into an already pending debounce",
+               lambda: watcher_handler.debouncer.coalesced if watcher_handler is not None else None, kind="counter")
+CallbackMetric("obsidian_debounce_pending", "Paths waiting for their quiet period", _watcher_stat("debounce_pending"))
+CallbackMetric("obsidian_processing_queue_depth", "Paths queued for the processing workers", _watcher_stat("queue_depth"))
+CallbackMetric("obsidian_processing_busy_workers", "Processing workers currently busy", _watcher_stat("busy_workers"))
+CallbackMetric("obsidian_smtp_pool_idle", "Idle authenticated SMTP sessions", _pool_stat("idle"))
+CallbackMetric("obsidian_smtp_pool_hits_total", "Sends that reused a pooled session", _pool_stat("hits"), kind="counter")
+CallbackMetric("obsidian_smtp_pool_misses_total", "Sends that had to open a new session", _pool_stat("misses"), kind="counter")
+CallbackMetric("obsidian_digest_pending_notes", "Notes waiting to go out in a digest",
+               lambda: digest.pending() if digest is not None else None)
+CallbackMetric("obsidian_outbox_messages", "Outbox messages by status",
+               lambda: {(status,): count for status, count in outbox.counts().items()} if outbox is not None else None,
+               labelnames=["status"])
+
+# Named sending accounts for multi-vault setups (see supervisor.py), each a dict
+# with email, password, smtp_server and smtp_port. None is the default account above.
+accounts = {}
+
+def account_settings(account=None):
+    if account is None:
+        return {"email": EMAIL_ADDRESS, "password": EMAIL_PASSWORD, "smtp_server": SMTP_SERVER, "smtp_port": SMTP_PORT}
+    try:
+        return accounts[account]
+    except KeyError:
+        raise ValueError(f"Unknown sending account: {account}")
+
+# Shared pool of authenticated SMTP sessions per account, created on first send
+smtp_pool = None
+account_pools = {}
+smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool(account=None):
+    global smtp_pool
+    with smtp_pool_lock:
+        pool = smtp_pool if account is None else account_pools.get(account)
+        if pool is None:
+            # Imported here so processes that never send don't pay for smtplib setup
+            from rate_limit import RateLimiter
+            from smtp_pool import SMTPConnectionPool
+            settings = account_settings(account)
+            pool = SMTPConnectionPool(
+                settings["smtp_server"], settings["smtp_port"], settings["email"], settings["password"],
+                rate_limiter=RateLimiter(account=account),
+            )
+            if account is None:
+                smtp_pool = pool
+            else:
+                account_pools[account] = pool
+        return pool
+
+# Durable outbox that all sends go through, one per account, created and started on first use
+outbox = None
+account_outboxes = {}
+outbox_lock = threading.Lock()
+# Set in vault worker processes: their outboxes only enqueue, and this is
+# called with the account so the supervisor's senders pick the row up
+remote_sender = None
+
+def get_outbox(account=None):
+    global outbox
+    with outbox_lock:
+        box = outbox if account is None else account_outboxes.get(account)
+        if box is None:
+            box = Outbox(deliver_outbox_entry, on_complete=write_outbox_status, account=account, notify=remote_sender)
+            if remote_sender is None:
+                box.start()
+            if account is None:
+                outbox = box
+            else:
+                account_outboxes[account] = box
+        return box
+
+# Collector for digest mode, created on first use; like the outbox senders,
+# its flusher only runs in the process that delivers mail
+digest = None
+digest_lock = threading.Lock()
+
+def get_digest():
+    global digest
+    with digest_lock:
+        if digest is None:
+            digest = DigestCollector(get_outbox)
+            if remote_sender is None:
+                digest.start()
+        return digest
+
+# Status lines are written back by one background thread per process; the
+# watcher recognises the events those writes cause and skips them
+self_writes = None
+status_writer = None
+status_writer_lock = threading.Lock()
+
+def get_self_writes():
+    global self_writes
+    with status_writer_lock:
+        if self_writes is None:
+            # Vault workers also look up writes made by the supervisor's senders
+            self_writes = SelfWriteRegistry(check_store=remote_sender is not None)
+        return self_writes
+
+def get_status_writer():
+    global status_writer
+    registry = get_self_writes()
+    with status_writer_lock:
+        if status_writer is None:
+            status_writer = StatusWriter(registry)
+            status_writer.start()
+        return status_writer
+
+def stop_status_writer():
+    """Write any status lines still waiting; the writer starts again on next use."""
+    global status_writer
+    with status_writer_lock:
+        writer, status_writer = status_writer, None
+    if writer is not None:
+        writer.stop()
+
+def start_sending():
+    """
+    Resume delivery of queued mail: the default outbox, and in digest mode the
+    digest flusher. Database upkeep runs alongside, in the sending process only.
+    """
+    get_outbox()
+    if DIGEST_MODE:
+        get_digest()
+    start_maintenance()
+
+def stop_sending():
+    """Stop every outbox sender and close pooled SMTP sessions."""
+    stop_maintenance()
+    if digest is not None:
+        digest.stop()
+    with outbox_lock:
+        boxes = [box for box in (outbox, *account_outboxes.values()) if box is not None]
+    for box in boxes:
+        box.stop()
+    with smtp_pool_lock:
+        pools = [pool for pool in (smtp_pool, *account_pools.values()) if pool is not None]
+    for pool in pools:
+        pool.close_all()
+    stop_status_writer()
+
+
+def build_message(subject: str, recipient: str, body: str, message_id=None, sender=None):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    message = MIMEMultipart()
+    message["From"] = sender or EMAIL_ADDRESS
+    message["To"] = recipient
+    message["Subject"] = subject
+    if message_id:
+        message["Message-ID"] = message_id
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+def deliver_outbox_entry(entry):
+    # Raises the raw SMTP error so the outbox can tell transient from permanent failures
+    settings = account_settings(entry.get("account"))
+    if not settings["email"] or not settings["password"]:
+        raise ValueError("Email credentials not configured")
+    message = build_message(entry["subject"], entry["recipient"], entry["body"], entry["message_id"],
+                            sender=settings["email"])
+    if entry.get("attachments"):
+        # Files are read and encoded while the message is being sent, not before
+        message = StreamingMessage(message, json.loads(entry["attachments"]))
+    with SEND_SECONDS.time(path="outbox"):
+        get_smtp_pool(entry.get("account")).send_message(message)
+
+def write_outbox_status(entry, sent):
+    # Notes get their status line once the outbox has a final outcome
+    if entry["source_path"]:
+        paths = [entry["source_path"]]
+    elif DIGEST_MODE:
+        # A digest marks all of its notes processed once delivered
+        paths = get_digest().complete(entry["id"], sent)
+    else:
+        paths = []
+    if entry["source_path"]:
+        get_store().set_status(paths, "sent" if sent else "failed")
+    for path in paths:
+        with traced(path):
+            if sent:
+                logging.info(f"Tasks email sent successfully for {path}!")
+            append_status_to_file(path, "sent OK" if sent else "sent Failed")
+
+class ObsidianHandler(FileSystemEventHandler):
+    def __init__(self, vault_path=None, recipient=None, account=None, include=None, exclude=None):
+        self.vault_path = vault_path or os.getenv("OBSIDIAN_VAULT_PATH")
+        self.recipient = recipient or RECIPIENT_EMAIL
+        # Sending account for this vault's mail; None is the default account
+        self.account = account
+        self.path_filter = PathFilter(self.vault_path, include, exclude)
+        self.filtered_events = 0
+        # First unprocessed event time per path, for event-to-parsed latency
+        self.event_started = {}
+        # Called with new, moved and deleted top-level directories when the watch is pruned
+        self.directory_created = None
+        self.directory_moved = None
+        self.directory_deleted = None
+        # Note paths deleted or moved away, with when, so a copy elsewhere can be told from a rename
+        self.removed_paths = {}
+        self._removed_lock = threading.Lock()
+        self.fingerprints = FingerprintIndex()
+        self.manifest = VaultManifest(root=self.vault_path)
+        self.scan_report = None
+        self.tail_reader = TailReader()
+        self.attachments = AttachmentResolver(self.vault_path, self.path_filter)
+        # Watchdog thread -> debouncer -> worker pool, so slow sends never block event dispatch
+        self.workers = PathWorkerPool(self.process_file)
+        self.debouncer = DebounceScheduler(self.workers.submit)
+        self.workers.start()
+        self.debouncer.start()
+
+    def stop(self):
+        self.debouncer.stop()
+        self.workers.stop()
+        self.manifest.flush()
+
+    def stats(self):
+        stats = self.workers.stats()
+        stats["debounce_pending"] = self.debouncer.pending()
+        stats["filtered_events"] = self.filtered_events
+        stats.update(self.tail_reader.stats())
+        stats.update(self.attachments.stats())
+        stats["startup_scan"] = self.scan_report
+        return stats
+
+    def dispatch(self, event):
+        # Noise (.obsidian, .trash, images...) is dropped before any stat, DB lookup or read
+        if not event.is_directory:
+            dest_path = getattr(event, "dest_path", "")
+            if not self.path_filter.allows(event.src_path) and not (dest_path and self.path_filter.allows(dest_path)):
+                self.filtered_events += 1
+                WATCHER_EVENTS.inc(result="filtered")
+                return
+            # Our own status write-back: the note's new state is already known, nothing to read
+            path = dest_path or event.src_path
+            st = get_self_writes().match(path)
+            if st is not None:
+                self.manifest.record(path, st)
+                WATCHER_EVENTS.inc(result="self_write")
+                return
+        with traced(event.src_path):
+            super().dispatch(event)
+
+    def on_created(self, event):
+        if event.is_directory and self.directory_created is not None:
+            self.directory_created(event.src_path)
+
+    def parse_content(self, content):
+        """
+        Parse content to check format:
+        #sender: Name 
+        Today's Task
+        .
+        .
+        -------------------
+        Tomorrow's Task
+        .
+        .
+        #send
+
+        Returns (has_send_tag, sender_name, tasks, embeds). The watcher itself
+        parses incrementally through TailReader; both feed the same histogram.
+        """
+        with PARSE_SECONDS.time():
+            return parse_lines(io.StringIO(content))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.record_removal(event.src_path)
+        elif self.directory_deleted is not None:
+            self.directory_deleted(event.src_path)
+
+    def record_removal(self, file_path):
+        now = time.monotonic()
+        with self._removed_lock:
+            self.removed_paths[file_path] = now
+            for path in [path for path, removed_at in self.removed_paths.items() if now - removed_at > RENAME_WINDOW]:
+                del self.removed_paths[path]
+
+    def removed_recently(self, file_path):
+        with self._removed_lock:
+            removed_at = self.removed_paths.get(file_path)
+        return removed_at is not None and time.monotonic() - removed_at <= RENAME_WINDOW
+
+    def moved_directory_contents(self, src_path, dest_path):
+        """Report the notes of a directory moved from src_path to dest_path as moved one by one."""
+        for directory, _, files in os.walk(dest_path):
+            for name in files:
+                dest = os.path.join(directory, name)
+                self.dispatch(FileMovedEvent(os.path.join(src_path, os.path.relpath(dest, dest_path)), dest))
+
+    def on_modified(self, event):
+        if event.is_directory:
+            return
+
+        file_path = event.src_path
+        logging.info(f"File modified: {file_path}", extra={"sample": "file_modified"})
+
+        # Skip if we've already processed this file
+        if is_file_processed(file_path):
+            WATCHER_EVENTS.inc(result="already_processed")
+            logging.info(f"File already processed: {file_path}", extra={"sample": "already_processed"})
+            return
+
+        # Bursts of saves are coalesced; process_file runs once the file goes quiet
+        WATCHER_EVENTS.inc(result="scheduled")
+        self.event_started.setdefault(file_path, time.perf_counter())
+        self.debouncer.touch(file_path)
+
+    def process_file(self, file_path):
+        with traced(file_path):
+            self._process_file(file_path)
+
+    def _process_file(self, file_path):
+        st = None
+        outcome = "error"
+        started = time.perf_counter()
+        try:
+            if is_file_processed(file_path):
+                outcome = "already_processed"
+                return
+
+            # A single stat() tells us whether anything changed since the last pass
+            unchanged, st = self.fingerprints.stat_unchanged(file_path)
+            if st is None:
+                outcome = "missing"
+                return
+            if unchanged:
+                outcome = "unchanged_stat"
+                logging.info(f"File unchanged since last check: {file_path}", extra={"sample": "unchanged"})
+                return
+
+            # Reads only what was appended since the last pass when it can
+            logging.info(f"Reading file content: {file_path}", extra={"sample": "reading"})
+            with NOTE_READ_SECONDS.time():
+                digest, parsed = self.tail_reader.read(file_path)
+            event_started = self.event_started.pop(file_path, None)
+            if event_started is not None:
+                EVENT_TO_PARSED_SECONDS.observe(time.perf_counter() - event_started)
+
+            if self.fingerprints.hash_unchanged(file_path, digest):
+                # Touched but not edited (e.g. editor re-save)
+                self.fingerprints.record(file_path, st, digest)
+                outcome = "unchanged_content"
+                logging.info(f"File content unchanged: {file_path}", extra={"sample": "unchanged"})
+                return
+
+            # Same content as a note we already sent, whose old path just went away
+            original_path = self.fingerprints.path_for_hash(digest)
+            if (original_path and original_path != file_path and self.removed_recently(original_path)
+                    and is_file_processed(original_path) and not os.path.exists(original_path)):
+                mark_file_processed(file_path, digest, status="renamed")
+                self.fingerprints.record(file_path, st, digest)
+                outcome = "renamed"
+                logging.info(f"File matches already processed {original_path}: {file_path}")
+                return
+
+            self.fingerprints.record(file_path, st, digest)
+
+            has_send_tag, sender_name, tasks, embeds = parsed
+            logging.info(
+                f"Parsed content - has_send_tag: {has_send_tag}, sender_name: {sender_name}, tasks count: {len(tasks)}",
+                extra={"sample": "parsed"},
+            )
+
+            # Check required elements
+            outcome = "incomplete"
+            if not has_send_tag:
+                logging.info(f"#send tag not found in file: {file_path}", extra={"sample": "incomplete"})
+                return
+
+            if not sender_name:
+                logging.info(f"No sender name found in file: {file_path}", extra={"sample": "incomplete"})
+                return
+
+            attachments, skipped = [], []
+            if embeds and ATTACHMENTS_ENABLED:
+                attachments, skipped = select_attachments(self.attachments.resolve_all(embeds, file_path))
+
+            # A note that only embeds files still has something to send
+            if not tasks and not attachments:
+                logging.info(f"No tasks found in file: {file_path}", extra={"sample": "incomplete"})
+                return
+
+            if DIGEST_MODE:
+                # Collected now, sent later as part of one message per sender
+                section = chr(10).join(['• ' + task for task in tasks] + skipped)
+                if get_digest().add(self.account, self.recipient, sender_name, file_path, section, attachments):
+                    outcome = "digested"
+                    logging.info(f"Tasks added to the digest for {file_path}")
+                else:
+                    outcome = "digest_skipped"
+                return
+
+            try:
+                # Format email body
+                task_lines = chr(10).join('• ' + task for task in tasks)
+                if skipped:
+                    task_lines += "\n\n" + "\n".join(skipped)
+                email_body = f"""{sender_name} - {datetime.now().strftime('%Y-%m-%d')}:
+
+{task_lines}
+
+
+
+
+
+"""
+                # Queue the email; the file is marked processed in the same transaction
+                # and gets its status line once the outbox has delivered it
+                get_outbox(self.account).enqueue(
+                    f"{sender_name}- {datetime.now().strftime('%Y-%m-%d')}",
+                    self.recipient,
+                    email_body,
+                    source_path=file_path,
+                    content_hash=digest,
+                    attachments=attachments,
+                )
+                outcome = "queued"
+                logging.info(f"Tasks email queued for {file_path}")
+            except Exception as e:
+                outcome = "queue_failed"
+                logging.error(f"Failed to queue email for {file_path}. Error: {str(e)}")
+
+                # Add failure message to file
+                append_status_to_file(file_path, "sent Failed")
+
+        except Exception as e:
+            logging.error(f"Error processing file: {str(e)}")
+        finally:
+            # Remember what we handled so the next startup scan can skip it
+            if st is not None:
+                self.manifest.record(file_path, st)
+            self.event_started.pop(file_path, None)
+            FILES_PROCESSED.inc(outcome=outcome)
+            FILE_PROCESS_SECONDS.observe(time.perf_counter() - started)
+
+    def catch_up(self):
+        """Queue notes that changed while the service was not running."""
+        self.scan_report = scan_vault(self.vault_path, self.path_filter, self.manifest, self.workers.submit)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            if self.directory_moved is not None:
+                self.directory_moved(event.src_path, event.dest_path)
+            return
+        # Renames keep their fingerprint and processed state instead of being re-sent
+        self.record_removal(event.src_path)
+        self.fingerprints.move(event.src_path, event.dest_path)
+        self.tail_reader.move(event.src_path, event.dest_path)
+        if is_file_processed(event.src_path):
+            mark_file_processed(event.dest_path, status="renamed")
+            logging.info(f"Processed file moved: {event.src_path} -> {event.dest_path}")
+
+    def append_status_to_file(self, file_path, status):
+        append_status_to_file(file_path, status)
+
+def append_status_to_file(file_path, status):
+    # Timestamped now; lines for the same note are written together shortly after
+    current_time = datetime.now().strftime("%I:%M %p - %d/%m/%y")
+    get_status_writer().write(file_path, f"\nServer Sent Timestamp: {current_time} : {status}\n")
+
+def schedule_vault(observer, event_handler, vault_path):
+    """
+    Watch the vault, leaving excluded top-level directories such as .obsidian
+    and .trash out of the OS watch entirely instead of filtering their events.
+    """
+    path_filter = event_handler.path_filter
+    if getattr(observer, "prunes_excluded_dirs", False):
+        observer.schedule(event_handler, vault_path, recursive=True)
+        return
+    with os.scandir(vault_path) as entries:
+        subdirs = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    if not any(path_filter.excludes_dir(path) for path in subdirs):
+        observer.schedule(event_handler, vault_path, recursive=True)
+        return
+
+    root = os.path.abspath(vault_path)
+    # Recursive watch per top-level directory; inotify keeps reporting a
+    # renamed directory under its old name, so renames replace the watch
+    watches = {}
+
+    def is_top_level(path):
+        return os.path.dirname(os.path.abspath(path)) == root
+
+    def watch_directory(path):
+        path = os.path.abspath(path)
+        if is_top_level(path) and not path_filter.excludes_dir(path) and path not in watches:
+            watches[path] = observer.schedule(event_handler, path, recursive=True)
+
+    def unwatch_directory(path):
+        watch = watches.pop(os.path.abspath(path), None)
+        if watch is not None:
+            try:
+                observer.unschedule(watch)
+            except Exception as e:
+                logging.warning(f"Failed to stop watching {path}: {e}")
+        return watch is not None
+
+    def move_directory(src_path, dest_path):
+        watched = unwatch_directory(src_path)
+        watch_directory(dest_path)
+        if watched:
+            # The root watch is not recursive, so nothing reports the notes inside as moved
+            event_handler.moved_directory_contents(src_path, dest_path)
+
+    observer.schedule(event_handler, vault_path, recursive=False)
+    for path in subdirs:
+        watch_directory(path)
+    event_handler.directory_created = watch_directory
+    event_handler.directory_moved = move_directory
+    event_handler.directory_deleted = unwatch_directory
+
+def make_observer():
+    """The observer selected by WATCHER_BACKEND."""
+    if WATCHER_BACKEND == "polling":
+        from polling_observer import SnapshotPollingObserver
+        return SnapshotPollingObserver()
+    from watchdog.observers import Observer
+    return Observer()
+
+def start_watcher(vault_path=None):
+    """
+    Start watching the vault in the background. Returns (observer, handler),
+    or None if the vault is not configured or missing.
+    """
+    # Get the vault path from environment variables
+    obsidian_vault_path = vault_path or os.getenv("OBSIDIAN_VAULT_PATH")
+    
+    if not obsidian_vault_path:
+        logging.error("OBSIDIAN_VAULT_PATH not found in environment variables")
+        return None
+        
+    if not os.path.exists(obsidian_vault_path):
+        logging.error(f"Vault path not found: {obsidian_vault_path}")
+        return None
+
+    global watcher_handler
+    event_handler = ObsidianHandler(obsidian_vault_path)
+    watcher_handler = event_handler
+    observer = make_observer()
+    schedule_vault(observer, event_handler, obsidian_vault_path)
+    observer.start()
+    logging.info(f"Started watching Obsidian vault at: {obsidian_vault_path}")
+
+    # Watch first, then catch up, so nothing changed in between is missed
+    threading.Thread(target=event_handler.catch_up, name="vault-scan", daemon=True).start()
+    return observer, event_handler
+
+def stop_watcher(observer, event_handler):
+    observer.stop()
+    observer.join()
+    event_handler.stop()
+
+def start_file_watcher():
+    started = start_watcher()
+    if started is None:
+        return
+    observer, event_handler = started
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    stop_watcher(observer, event_handler)
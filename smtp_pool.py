@@ -0,0 +1,363 @@
+import smtplib
+import threading
+import time
+import logging
+import os
+from contextlib import contextmanager
+
+from attachments import StreamingMessage
+from metrics import Histogram
+from rate_limit import RateLimitExceeded
+
+# Pool configuration
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_KEEPALIVE_INTERVAL = float(os.getenv("SMTP_KEEPALIVE_INTERVAL", "15"))
+SMTP_CONNECT_TIMEOUT = float(os.getenv("SMTP_CONNECT_TIMEOUT", "30"))
+# SMTP wire transcripts are off unless asked for, here or at runtime with enable_smtp_debug()
+SMTP_DEBUG_LEVEL = int(os.getenv("SMTP_DEBUG_LEVEL", "0"))
+
+SMTP_PHASE_SECONDS = Histogram("obsidian_smtp_phase_seconds", "Time per SMTP phase (connect, starttls, login, data)", ["phase"])
+
+
+_debug_level = SMTP_DEBUG_LEVEL
+_debug_until = None
+wire_log = logging.getLogger("smtp.wire")
+
+
+def enable_smtp_debug(level=1, duration=None):
+    """Turn SMTP wire debugging on (level 0 turns it off), for duration seconds if given."""
+    global _debug_level, _debug_until
+    _debug_level = level
+    _debug_until = time.monotonic() + duration if duration and level else None
+
+
+def smtp_debug_level():
+    global _debug_level, _debug_until
+    if _debug_until is not None and time.monotonic() >= _debug_until:
+        _debug_level, _debug_until = 0, None
+    return _debug_level
+
+
+class WireLoggingSMTP(smtplib.SMTP):
+    """smtplib.SMTP whose debug transcript goes through logging instead of straight to stderr."""
+
+    _masking = False
+
+    def _print_debug(self, *args):
+        # Credentials never reach the log: the AUTH line and any challenge answers after it
+        if args[0] == "send:":
+            if args[1].upper().startswith("'AUTH"):
+                self._masking = True
+                args = ("send:", " ".join(args[1].split(" ")[:2]) + " ****'")
+            elif self._masking:
+                args = ("send:", "'****'")
+        elif self._masking and str(args[0]).startswith("reply: retcode") and "(334)" not in args[0]:
+            self._masking = False
+        wire_log.info(" ".join(str(arg) for arg in args))
+
+
+def send_streaming(server, message):
+    """
+    smtplib's sendmail() for a StreamingMessage: the DATA is written to the
+    socket chunk by chunk as it is produced instead of being built first.
+    """
+    sender, recipients = message.envelope()
+    server.ehlo_or_helo_if_needed()
+    code, reply = server.mail(sender)
+    if code != 250:
+        _reset(server)
+        raise smtplib.SMTPSenderRefused(code, reply, sender)
+    refused = {}
+    for recipient in recipients:
+        code, reply = server.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, reply)
+    if len(refused) == len(recipients):
+        _reset(server)
+        raise smtplib.SMTPRecipientsRefused(refused)
+    code, reply = server.docmd("data")
+    if code != 354:
+        _reset(server)
+        raise smtplib.SMTPDataError(code, reply)
+    sent = 0
+    try:
+        for chunk in message.chunks():
+            server.sock.sendall(chunk)
+            sent += len(chunk)
+        server.sock.sendall(b".\r\n")
+    except OSError as e:
+        # Mid-DATA the only way to abandon the message is to drop the session
+        server.close()
+        raise smtplib.SMTPServerDisconnected(f"Message data not sent: {e}")
+    if server.debuglevel > 0:
+        # Attachment data would swamp the transcript
+        server._print_debug("send:", f"<{sent} bytes of message data>")
+    code, reply = server.getreply()
+    if code != 250:
+        _reset(server)
+        raise smtplib.SMTPDataError(code, reply)
+    return refused
+
+
+def _reset(server):
+    try:
+        server.rset()
+    except smtplib.SMTPServerDisconnected:
+        pass
+
+
+class PooledConnection:
+    """An authenticated SMTP session plus the bookkeeping the pool needs."""
+
+    def __init__(self, server, created_at):
+        self.server = server
+        self.created_at = created_at
+        self.last_used = created_at
+        self.message_count = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Bounded pool of authenticated SMTP sessions.
+
+    Sessions are reused across sends, checked with NOOP when they have been
+    idle for a while, recycled after max_messages sends or idle_timeout seconds,
+    and re-established transparently after a disconnect.
+    """
+
+    def __init__(self, host, port, username, password, max_size=SMTP_POOL_SIZE,
+                 max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION, idle_timeout=SMTP_IDLE_TIMEOUT,
+                 keepalive_interval=SMTP_KEEPALIVE_INTERVAL, timeout=SMTP_CONNECT_TIMEOUT,
+                 rate_limiter=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.max_messages = max_messages
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        # Optional RateLimiter consulted before every message
+        self.rate_limiter = rate_limiter
+
+        self._idle = []
+        self._lock = threading.Lock()
+        # Limits the number of sessions open at the same time (idle + leased)
+        self._slots = threading.BoundedSemaphore(max_size)
+
+        self.hits = 0
+        self.misses = 0
+        self.reconnects = 0
+        self.recycled = 0
+        self.handshakes = 0
+        self.handshake_time_total = 0.0
+
+    def _connect(self):
+        start = time.perf_counter()
+        with SMTP_PHASE_SECONDS.time(phase="connect"):
+            server = WireLoggingSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.set_debuglevel(smtp_debug_level())
+            with SMTP_PHASE_SECONDS.time(phase="starttls"):
+                server.starttls()
+            logging.info("Attempting login...")
+            with SMTP_PHASE_SECONDS.time(phase="login"):
+                server.login(self.username, self.password)
+        except Exception:
+            server.close()
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.handshakes += 1
+            self.handshake_time_total += elapsed
+        logging.info(f"Opened SMTP session to {self.host}:{self.port} in {elapsed * 1000:.1f} ms")
+        return PooledConnection(server, time.monotonic())
+
+    def _is_expired(self, conn, now):
+        return (conn.message_count >= self.max_messages
+                or now - conn.last_used >= self.idle_timeout)
+
+    def _is_alive(self, conn, now):
+        # Only pay for a NOOP round trip when the session has been quiet for a while
+        if now - conn.last_used < self.keepalive_interval:
+            return True
+        try:
+            code, _ = conn.server.noop()
+            return code == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                break
+            if self._is_expired(conn, now):
+                with self._lock:
+                    self.recycled += 1
+                conn.close()
+                continue
+            if not self._is_alive(conn, now):
+                with self._lock:
+                    self.reconnects += 1
+                conn.close()
+                continue
+            with self._lock:
+                self.hits += 1
+            return conn
+
+        with self._lock:
+            self.misses += 1
+        return self._connect()
+
+    def _checkin(self, conn):
+        conn.last_used = time.monotonic()
+        if conn.message_count >= self.max_messages:
+            with self._lock:
+                self.recycled += 1
+            conn.close()
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Lease an authenticated session for the duration of the block.
+
+        If the block fails with a connection-level error the session is
+        discarded instead of being returned to the pool.
+        """
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except (smtplib.SMTPServerDisconnected, OSError):
+            if conn is not None:
+                conn.close()
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn)
+            self._slots.release()
+
+    def _send(self, conn, message):
+        # Pooled sessions outlive a debug toggle, so the level is applied per message
+        conn.server.set_debuglevel(smtp_debug_level())
+        try:
+            with SMTP_PHASE_SECONDS.time(phase="data"):
+                if isinstance(message, StreamingMessage):
+                    send_streaming(conn.server, message)
+                else:
+                    conn.server.send_message(message)
+        except smtplib.SMTPException as e:
+            if self.rate_limiter is not None:
+                self.rate_limiter.record_failure(e)
+            raise
+        conn.message_count += 1
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_success()
+
+    def send_message(self, message):
+        """
+        Send a message over a pooled session, reconnecting once on disconnect.
+        The rate limit token is taken once, before the first attempt.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    self._send(conn, message)
+                return
+            except smtplib.SMTPServerDisconnected:
+                if attempt == 1:
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                logging.warning("SMTP session dropped, reconnecting...")
+
+    def send_many(self, messages, on_result):
+        """
+        Send messages back-to-back over a single leased session.
+
+        on_result(index, error) is called once per message, with error set to
+        None on success. A dropped session is re-established and the batch
+        continues with the next message. Each message takes one rate limit
+        token, however many sessions it is tried on.
+        """
+        index = 0
+        paid = -1  # Index of the message the last token was taken for
+        reconnected = False
+        while index < len(messages):
+            try:
+                with self.connection() as conn:
+                    while index < len(messages):
+                        try:
+                            if self.rate_limiter is not None and paid != index:
+                                self.rate_limiter.acquire()
+                                paid = index
+                            self._send(conn, messages[index])
+                            on_result(index, None)
+                            reconnected = False
+                        except (smtplib.SMTPServerDisconnected, RateLimitExceeded):
+                            raise
+                        except (smtplib.SMTPException, ValueError) as e:
+                            on_result(index, e)
+                        index += 1
+                        if conn.message_count >= self.max_messages:
+                            break
+            except (smtplib.SMTPServerDisconnected, OSError) as e:
+                # Give up on a message that fails again right after a reconnect
+                if reconnected:
+                    on_result(index, e)
+                    index += 1
+                    reconnected = False
+                    continue
+                reconnected = True
+                with self._lock:
+                    self.reconnects += 1
+                logging.warning("SMTP session dropped during batch, reconnecting...")
+            except smtplib.SMTPException as e:
+                # Out of budget, or could not open a session at all; fail the rest of the batch
+                for i in range(index, len(messages)):
+                    on_result(i, e)
+                return
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "reconnects": self.reconnects,
+                "recycled": self.recycled,
+                "handshakes": self.handshakes,
+                "handshake_time_total_ms": round(self.handshake_time_total * 1000, 3),
+                "handshake_time_avg_ms": round(self.handshake_time_total * 1000 / self.handshakes, 3) if self.handshakes else 0.0,
+            }
@@ -0,0 +1,236 @@
+"""
+Status write-back to notes, and recognition of the file events it causes.
+
+Status lines are queued and written by one background thread, so lines for
+the same note that arrive close together land in a single write. In the
+default "atomic" mode the note is rewritten to a temporary file next to it
+and renamed over it. The resulting stat is registered before the rename, so
+the watcher can tell its own write from an edit and skip the event without
+reading the note. "append" appends in place as before, and "sidecar" writes
+the lines to "<note>.status" and leaves the note untouched.
+"""
+import logging
+import os
+import stat
+import threading
+import time
+
+from database import get_store
+
+# "atomic", "append" or "sidecar"
+STATUS_WRITE_MODE = os.getenv("STATUS_WRITE_MODE", "atomic").lower()
+# Status lines for the same note within this many seconds are written together
+STATUS_WRITE_DELAY = float(os.getenv("STATUS_WRITE_DELAY", "0.5"))
+# How long a registered write is waited for; its events normally arrive within milliseconds
+SELF_WRITE_TTL = 60.0
+ATOMIC_WRITE_ATTEMPTS = 3
+
+
+class SelfWriteRegistry:
+    """
+    Expected (size, mtime_ns) of files this process just wrote.
+
+    Kept in memory and, for vault worker processes that did not do the
+    writing, in the self_writes table. A file whose current stat still
+    matches is our own write; once it differs, the user has edited it since.
+    """
+
+    def __init__(self, store=None, check_store=False, ttl=SELF_WRITE_TTL):
+        self.store = store or get_store()
+        self.check_store = check_store
+        self.ttl = ttl
+        self._expected = {}  # path -> (size, mtime_ns, expires_at)
+        self._lock = threading.Lock()
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS self_writes
+                (file_path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, expires_at REAL NOT NULL)
+            ''')
+
+    def expect(self, writes):
+        """Register [(path, stat_result)] before the writes become visible."""
+        now = time.time()
+        rows = [(path, st.st_size, st.st_mtime_ns, now + self.ttl) for path, st in writes]
+        with self._lock:
+            for path, size, mtime_ns, expires_at in rows:
+                self._expected[path] = (size, mtime_ns, expires_at)
+            for path in [path for path, entry in self._expected.items() if entry[2] <= now]:
+                del self._expected[path]
+        conn = self.store.connection()
+        with conn:
+            conn.execute("DELETE FROM self_writes WHERE expires_at <= ?", (now,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO self_writes (file_path, size, mtime_ns, expires_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def match(self, path):
+        """The file's stat if its current state is our own write, else None."""
+        now = time.time()
+        with self._lock:
+            entry = self._expected.get(path)
+        if entry is None and self.check_store:
+            entry = self.store.connection().execute(
+                "SELECT size, mtime_ns, expires_at FROM self_writes WHERE file_path = ?", (path,)
+            ).fetchone()
+        if entry is None or entry[2] <= now:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (st.st_size, st.st_mtime_ns) != entry[:2]:
+            return None
+        return st
+
+
+class StatusWriter:
+    def __init__(self, registry, mode=STATUS_WRITE_MODE, delay=STATUS_WRITE_DELAY):
+        self.registry = registry
+        self.mode = mode
+        self.delay = delay
+        self._pending = {}  # path -> [line, ...]
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.writes = 0
+        self.lines = 0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="status-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write whatever is still queued, then stop."""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self, path, line):
+        with self._cond:
+            self._pending.setdefault(path, []).append(line)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+            # Give lines that belong together a moment to arrive
+            if self._running:
+                time.sleep(self.delay)
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            self.flush(batch)
+
+    def flush(self, batch):
+        if self.mode == "sidecar":
+            for path, lines in batch.items():
+                self._append(path + ".status", lines)
+        elif self.mode == "append":
+            for path, lines in batch.items():
+                self._append(path, lines)
+        else:
+            # Stage every note, register the outcomes in one go, then make them visible
+            staged = []
+            for path, lines in batch.items():
+                temp = self._stage(path, lines)
+                if temp is not None:
+                    staged.append(temp)
+            if not staged:
+                return
+            try:
+                self.registry.expect([(path, st) for path, _, _, st in staged])
+            except Exception as e:
+                logging.error(f"Failed to register status writes: {e}")
+            for path, temp_path, original, _ in staged:
+                self._commit(path, temp_path, original, batch[path])
+
+    def _append(self, path, lines):
+        try:
+            with open(path, "a", encoding="utf-8") as file:
+                file.write("".join(lines))
+                file.flush()
+                st = os.fstat(file.fileno())
+            self.registry.expect([(path, st)])
+            self.writes += 1
+            self.lines += len(lines)
+        except Exception as e:
+            logging.error(f"Failed to write status to file: {str(e)}")
+
+    def _stage(self, path, lines):
+        """Write the note plus its new lines to a temporary file; returns (path, temp, original stat, new stat)."""
+        directory, name = os.path.split(path)
+        temp_path = os.path.join(directory, f".{name}.{os.getpid()}.status-tmp")
+        try:
+            original = os.stat(path)
+            with open(path, "rb") as file:
+                content = file.read()
+            with open(temp_path, "wb") as file:
+                file.write(content)
+                file.write("".join(lines).replace("\n", os.linesep).encode("utf-8"))
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(temp_path, stat.S_IMODE(original.st_mode))
+            # A rename keeps the temporary file's size and mtime, so this is what the note will look like
+            return path, temp_path, original, os.stat(temp_path)
+        except Exception as e:
+            logging.error(f"Failed to write status to file: {str(e)}")
+            self._discard(temp_path)
+            return None
+
+    def _commit(self, path, temp_path, original, lines):
+        try:
+            current = os.stat(path)
+            if (current.st_size, current.st_mtime_ns) != (original.st_size, original.st_mtime_ns):
+                # Edited since it was read: replacing it now would lose that edit
+                self._discard(temp_path)
+                self._retry_atomic(path, lines)
+                return
+            os.replace(temp_path, path)
+        except PermissionError:
+            # Windows will not replace a file another program has open
+            self._discard(temp_path)
+            self._append(path, lines)
+            return
+        except Exception as e:
+            logging.error(f"Failed to write status to file: {str(e)}")
+            self._discard(temp_path)
+            return
+        self.writes += 1
+        self.lines += len(lines)
+
+    def _retry_atomic(self, path, lines, attempt=2):
+        staged = self._stage(path, lines)
+        if staged is None:
+            return
+        _, temp_path, original, st = staged
+        self.registry.expect([(path, st)])
+        current = os.stat(path)
+        if (current.st_size, current.st_mtime_ns) == (original.st_size, original.st_mtime_ns):
+            os.replace(temp_path, path)
+            self.writes += 1
+            self.lines += len(lines)
+        elif attempt < ATOMIC_WRITE_ATTEMPTS:
+            self._discard(temp_path)
+            self._retry_atomic(path, lines, attempt + 1)
+        else:
+            # The note keeps changing: append in place rather than lose either side
+            self._discard(temp_path)
+            self._append(path, lines)
+
+    @staticmethod
+    def _discard(temp_path):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
@@ -0,0 +1,239 @@
+"""
+Watch many vaults from one deployment.
+
+The vaults listed in a JSON file (VAULTS_CONFIG) are sharded across
+VAULT_PROCESSES worker processes. Workers watch, parse and queue mail in the
+shared outbox; the supervisor process runs the senders, with one SMTP pool,
+rate limiter and set of outbox senders per account, and restarts crashed
+workers with backoff.
+
+    {
+      "accounts": {
+        "team-a": {"email": "team-a@gmail.com", "password_env": "TEAM_A_PASSWORD"}
+      },
+      "vaults": [
+        {"path": "/srv/vaults/team-a", "recipient": "lead@example.com", "account": "team-a",
+         "exclude": [".obsidian/**", "Archive/**"]}
+      ]
+    }
+
+Accounts default to SMTP_SERVER/SMTP_PORT, and "password" may be given
+inline instead of "password_env". A vault without "account" sends from the
+default EMAIL_ADDRESS account, and without "recipient" to RECIPIENT_EMAIL.
+"include" and "exclude" replace WATCH_INCLUDE and WATCH_EXCLUDE.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+import service
+from database import init_db
+
+VAULT_PROCESSES = int(os.getenv("VAULT_PROCESSES", "2"))
+WORKER_RESTART_BACKOFF_MAX = float(os.getenv("WORKER_RESTART_BACKOFF_MAX", "60"))
+# A worker that has stayed up this long gets its restart backoff reset
+WORKER_STABLE_AFTER = 60.0
+
+
+def _globs(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [glob.strip() for glob in value.split(",") if glob.strip()]
+    return list(value)
+
+
+def load_config(path):
+    """Read and check a vaults file; returns (accounts, vaults). Raises ValueError if it is invalid."""
+    with open(path, encoding="utf-8") as file:
+        config = json.load(file)
+
+    accounts = {}
+    for name, settings in config.get("accounts", {}).items():
+        password = settings.get("password")
+        if password is None and settings.get("password_env"):
+            password = os.getenv(settings["password_env"])
+        if not settings.get("email") or not password:
+            raise ValueError(f"Account {name!r} needs an email and a password or password_env")
+        accounts[name] = {
+            "email": settings["email"],
+            "password": password,
+            "smtp_server": settings.get("smtp_server", service.SMTP_SERVER),
+            "smtp_port": int(settings.get("smtp_port", service.SMTP_PORT)),
+        }
+
+    vaults = []
+    for vault in config.get("vaults", []):
+        if not vault.get("path"):
+            raise ValueError("Every vault needs a path")
+        account = vault.get("account")
+        if account is not None and account not in accounts:
+            raise ValueError(f"Vault {vault['path']} uses unknown account {account!r}")
+        vaults.append({
+            "path": os.path.abspath(vault["path"]),
+            "recipient": vault.get("recipient"),
+            "account": account,
+            "include": _globs(vault.get("include")),
+            "exclude": _globs(vault.get("exclude")),
+        })
+    if not vaults:
+        raise ValueError("No vaults configured")
+
+    # A vault inside another would have its notes processed twice
+    paths = sorted(os.path.join(vault["path"], "") for vault in vaults)
+    for outer, inner in zip(paths, paths[1:]):
+        if inner.startswith(outer):
+            raise ValueError(f"Vaults overlap: {inner} is inside {outer}")
+    return accounts, vaults
+
+
+def run_worker(shard, vaults, notify, stop):
+    """Entry point of a worker process: watch a shard of the vaults until told to stop."""
+    # Ctrl+C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Mail is only queued here; the supervisor's senders deliver it
+    service.remote_sender = notify.put
+    if not init_db():
+        sys.exit(1)
+
+    observer = service.make_observer()
+    handlers = []
+    for vault in vaults:
+        if not os.path.isdir(vault["path"]):
+            logging.error(f"Vault path not found: {vault['path']}")
+            continue
+        handler = service.ObsidianHandler(
+            vault["path"], vault["recipient"], vault["account"], vault["include"], vault["exclude"]
+        )
+        service.schedule_vault(observer, handler, vault["path"])
+        handlers.append(handler)
+    observer.start()
+    for handler in handlers:
+        threading.Thread(target=handler.catch_up, name="vault-scan", daemon=True).start()
+    logging.info(f"Vault worker {shard} (pid {os.getpid()}) watching {len(handlers)} vault(s)")
+
+    parent = multiprocessing.parent_process()
+    exit_code = 0
+    while not stop.wait(1):
+        if parent is not None and not parent.is_alive():
+            break
+        if not observer.is_alive():
+            logging.error(f"Vault worker {shard}: observer stopped unexpectedly")
+            exit_code = 1
+            break
+    observer.stop()
+    observer.join()
+    for handler in handlers:
+        handler.stop()
+    service.stop_status_writer()
+    sys.exit(exit_code)
+
+
+class VaultSupervisor:
+    def __init__(self, vaults, accounts=None, processes=VAULT_PROCESSES):
+        self.vaults = vaults
+        self.accounts = accounts or {}
+        count = max(1, min(processes, len(vaults)))
+        self.shards = [vaults[i::count] for i in range(count)]
+        # Spawn rather than fork: the parent already runs sender and SQLite threads
+        self._context = multiprocessing.get_context("spawn")
+        self._notify = self._context.Queue()
+        self._processes = [None] * count
+        # One stop event per worker process: setting an event that a killed
+        # process was waiting on can block forever
+        self._stop_events = [None] * count
+        self._started_at = [0.0] * count
+        self._backoff = [1.0] * count
+        self._restart_at = [None] * count
+        self.restarts = [0] * count
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        service.accounts.update(self.accounts)
+        # One set of senders per account in use
+        for account in {vault["account"] for vault in self.vaults}:
+            service.get_outbox(account)
+        for shard in range(len(self.shards)):
+            self._spawn(shard)
+        for target, name in ((self._monitor, "vault-supervisor"), (self._forward_wakeups, "outbox-wakeups")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Watching {len(self.vaults)} vaults with {len(self.shards)} worker processes")
+
+    def _spawn(self, shard):
+        stop = self._context.Event()
+        process = self._context.Process(
+            target=run_worker, args=(shard, self.shards[shard], self._notify, stop),
+            name=f"vault-worker-{shard}", daemon=True,
+        )
+        process.start()
+        self._processes[shard] = process
+        self._stop_events[shard] = stop
+        self._started_at[shard] = time.monotonic()
+
+    def _monitor(self):
+        while not self._stopping.wait(1):
+            now = time.monotonic()
+            for shard, process in enumerate(self._processes):
+                if process.is_alive():
+                    if now - self._started_at[shard] >= WORKER_STABLE_AFTER:
+                        self._backoff[shard] = 1.0
+                    continue
+                if self._restart_at[shard] is None:
+                    delay = self._backoff[shard]
+                    logging.error(
+                        f"Vault worker {shard} exited with code {process.exitcode}; restarting in {delay:.0f}s"
+                    )
+                    self._restart_at[shard] = now + delay
+                    self._backoff[shard] = min(WORKER_RESTART_BACKOFF_MAX, delay * 2)
+                elif now >= self._restart_at[shard]:
+                    self._restart_at[shard] = None
+                    self.restarts[shard] += 1
+                    self._spawn(shard)
+
+    def _forward_wakeups(self):
+        while not self._stopping.is_set():
+            try:
+                account = self._notify.get(timeout=1)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            service.get_outbox(account).wake()
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        for process, stop in zip(self._processes, self._stop_events):
+            if process.is_alive():
+                stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"Vault worker {process.name} did not stop, terminating it")
+                process.terminate()
+                process.join()
+
+    def stats(self):
+        return {
+            "workers": [
+                {
+                    "shard": shard,
+                    "pid": process.pid,
+                    "alive": process.is_alive(),
+                    "restarts": self.restarts[shard],
+                    "vaults": [vault["path"] for vault in self.shards[shard]],
+                }
+                for shard, process in enumerate(self._processes)
+            ]
+        }
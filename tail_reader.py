@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import Histogram
+from note_parser import NoteParser
+
+# Tail reader configuration
+TAIL_CACHE_SIZE = int(os.getenv("TAIL_CACHE_SIZE", "256"))
+READ_CHUNK_SIZE = 64 * 1024
+# Bytes compared at each end of the consumed prefix when a note only grew
+TAIL_ANCHOR_SIZE = 4096
+
+PARSE_SECONDS = Histogram("obsidian_parse_seconds", "Time spent parsing note lines per read")
+
+
+class TailState:
+    __slots__ = ("offset", "size", "inode", "head_digest", "anchor_digest", "hasher", "parser")
+
+    def __init__(self):
+        self.offset = 0
+        self.size = 0
+        self.inode = None
+        self.head_digest = None
+        self.anchor_digest = None
+        self.hasher = hashlib.blake2b(digest_size=16)
+        self.parser = NoteParser()
+
+
+class TailReader:
+    """
+    Reads notes incrementally, remembering how far each file was consumed.
+
+    For every file it keeps the offset of the last complete line, a running
+    content hash and the parser state at that offset. When the file grows,
+    only the new bytes are read and fed to the saved parser.
+
+    Before resuming, the consumed prefix is checked against what was seen
+    last time. A note that kept its inode and grew looks like an append, so
+    only the first and last TAIL_ANCHOR_SIZE bytes before the offset are
+    compared and the work stays proportional to the edit. Anything else (the
+    same size, as when a checkbox is ticked, or a new inode) hashes the whole
+    prefix in one sequential read, still much cheaper than parsing it again.
+    A mismatch falls back to a full parse.
+    """
+
+    def __init__(self, max_files=TAIL_CACHE_SIZE):
+        self.max_files = max_files
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.full_reads = 0
+        self.tail_reads = 0
+        self.bytes_read = 0
+
+    def _window_digest(self, file, start, end):
+        file.seek(start)
+        return hashlib.blake2b(file.read(end - start), digest_size=16).digest()
+
+    def _anchors(self, file, offset):
+        head_end = min(TAIL_ANCHOR_SIZE, offset)
+        anchor_start = max(head_end, offset - TAIL_ANCHOR_SIZE)
+        return (self._window_digest(file, 0, head_end), self._window_digest(file, anchor_start, offset),
+                head_end + offset - anchor_start)
+
+    def _prefix_matches(self, file, st, state):
+        """Whether the saved state still describes the start of the file; returns (matches, bytes read)."""
+        if st.st_ino != state.inode or st.st_size < state.offset:
+            return False, 0
+        if st.st_size > state.size:
+            head_digest, anchor_digest, bytes_read = self._anchors(file, state.offset)
+            return (head_digest, anchor_digest) == (state.head_digest, state.anchor_digest), bytes_read
+        hasher = hashlib.blake2b(digest_size=16)
+        file.seek(0)
+        remaining = state.offset
+        while remaining:
+            chunk = file.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                return False, state.offset - remaining
+            hasher.update(chunk)
+            remaining -= len(chunk)
+        return hasher.digest() == state.hasher.digest(), state.offset
+
+    def read(self, file_path):
+        """
+        Bring the saved state for file_path up to date with the file on disk.
+        Returns (content_digest, (has_send_tag, sender_name, tasks, embeds)).
+        """
+        with self._lock:
+            state = self._states.pop(file_path, None)
+
+        with open(file_path, "rb") as file:
+            st = os.fstat(file.fileno())
+            bytes_read = 0
+            full_read = state is None
+            if not full_read:
+                matches, bytes_read = self._prefix_matches(file, st, state)
+                full_read = not matches
+            if full_read:
+                state = TailState()
+            state.size = st.st_size
+            state.inode = st.st_ino
+
+            file.seek(state.offset)
+            partial = b""
+            parse_time = 0.0
+            while True:
+                chunk = file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                bytes_read += len(chunk)
+                data = partial + chunk
+                cut = data.rfind(b"\n") + 1
+                if not cut:
+                    partial = data
+                    continue
+                complete, partial = data[:cut], data[cut:]
+                # Only whole lines are committed to the saved state
+                state.hasher.update(complete)
+                started = time.perf_counter()
+                for line in complete.decode("utf-8").split("\n")[:-1]:
+                    state.parser.feed(line)
+                parse_time += time.perf_counter() - started
+                state.offset += len(complete)
+
+            state.head_digest, state.anchor_digest, anchor_bytes = self._anchors(file, state.offset)
+            bytes_read += anchor_bytes
+
+        hasher = state.hasher.copy()
+        hasher.update(partial)
+        started = time.perf_counter()
+        parsed = state.parser.result(partial.decode("utf-8") if partial else None)
+        PARSE_SECONDS.observe(parse_time + time.perf_counter() - started)
+
+        with self._lock:
+            if full_read:
+                self.full_reads += 1
+            else:
+                self.tail_reads += 1
+            self.bytes_read += bytes_read
+            self._states[file_path] = state
+            while len(self._states) > self.max_files:
+                self._states.popitem(last=False)
+        return hasher.hexdigest(), parsed
+
+    def move(self, src_path, dest_path):
+        with self._lock:
+            state = self._states.pop(src_path, None)
+            if state is not None:
+                self._states[dest_path] = state
+
+    def forget(self, file_path):
+        with self._lock:
+            self._states.pop(file_path, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked_files": len(self._states),
+                "full_reads": self.full_reads,
+                "tail_reads": self.tail_reads,
+                "bytes_read": self.bytes_read,
+            }
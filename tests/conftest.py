@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import pytest
+
+# The modules live at the repository root and read their settings at import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LOG_ASYNC", "false")
+os.environ.setdefault("EMAIL_ADDRESS", "sender@example.com")
+os.environ.setdefault("EMAIL_PASSWORD", "secret")
+os.environ.setdefault("RATE_LIMIT_PER_DAY", "0")
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh processed-files database for the test."""
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "test.db"))
+    store = database.open_store()
+    yield store
+    store.close()
+    database._store = None
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
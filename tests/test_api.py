@@ -0,0 +1,167 @@
+import json
+import smtplib
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import api
+import outbox
+import service
+from rate_limit import RateLimitExceeded
+
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, message):
+        if message["To"].startswith("refused"):
+            raise smtplib.SMTPRecipientsRefused({message["To"]: (550, b"No such user")})
+        self.sent.append(message["Subject"])
+
+    def stats(self):
+        return {}
+
+    async def close_all(self):
+        pass
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    box = outbox.Outbox(lambda entry: None, store=store)
+    monkeypatch.setattr(service, "outbox", box)
+    monkeypatch.setattr(api, "async_smtp_pool", FakeAsyncPool())
+    monkeypatch.setattr(api, "idempotency_cache", None)
+    monkeypatch.setattr(api, "API_SEND_MODE", "outbox")
+    # Not entered as a context manager, so the outbox senders are not started
+    return TestClient(api.app)
+
+
+def email(subject="Hello", recipient="someone@example.com", body="Body"):
+    return {"subject": subject, "recipient": recipient, "body": body}
+
+
+def test_send_email_is_queued(client):
+    response = client.post("/send-email", json=email())
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "pending"
+    assert job["attempts"] == 0
+    assert client.get("/admin/outbox").json()["counts"] == {"pending": 1}
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/jobs/12345").status_code == 404
+
+
+def test_full_outbox_asks_to_retry_later(client, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_PENDING", 0)
+    response = client.post("/send-email", json=email())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+def test_direct_mode_sends_before_answering(client, monkeypatch):
+    monkeypatch.setattr(api, "API_SEND_MODE", "direct")
+    response = client.post("/send-email", json=email(subject="Now"))
+    assert response.status_code == 200
+    assert api.async_smtp_pool.sent == ["Now"]
+
+
+def test_direct_mode_reports_smtp_failures(client, monkeypatch):
+    monkeypatch.setattr(api, "API_SEND_MODE", "direct")
+    response = client.post("/send-email", json=email(recipient="refused@example.com"))
+    assert response.status_code == 502
+
+
+
+def results(response):
+    return sorted((json.loads(line) for line in response.text.splitlines()), key=lambda result: result["index"])
+
+
+def test_send_emails_reports_every_item(client):
+    batch = [email(subject="one"), {"subject": "no recipient"}, email(subject="three", recipient="refused@example.com"),
+             email(subject="four")]
+    response = client.post("/send-emails", json=batch)
+    assert response.status_code == 200
+    assert [result["status"] for result in results(response)] == ["sent", "invalid", "failed", "sent"]
+    assert sorted(api.async_smtp_pool.sent) == ["four", "one"]
+
+
+def test_send_emails_accepts_ndjson(client):
+    body = "\n".join(json.dumps(email(subject=f"m{i}")) for i in range(3)) + "\n"
+    response = client.post("/send-emails", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert [result["status"] for result in results(response)] == ["sent"] * 3
+
+
+def test_send_emails_rejects_a_body_that_is_not_a_list(client):
+    assert client.post("/send-emails", json=email()).status_code == 400
+
+
+def test_send_emails_rejects_oversized_batches(client, monkeypatch):
+    monkeypatch.setattr(api, "EMAIL_BATCH_MAX", 2)
+    response = client.post("/send-emails", json=[email()] * 3)
+    assert response.status_code == 413
+    assert api.async_smtp_pool.sent == []
+
+
+def test_metrics_endpoint_reports_send_timings(client, monkeypatch):
+    monkeypatch.setattr(api, "API_SEND_MODE", "direct")
+    client.post("/send-email", json=email())
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'obsidian_send_email_seconds_count{path="send_email_async"}' in response.text
+    assert "# TYPE obsidian_watcher_events_total counter" in response.text
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def send_message(self, message):
+        raise self.error
+
+
+def test_send_email_maps_authentication_errors(monkeypatch):
+    monkeypatch.setattr(api, "get_smtp_pool", lambda: FailingPool(smtplib.SMTPAuthenticationError(535, b"Bad")))
+    with pytest.raises(HTTPException) as excinfo:
+        api.send_email("Subject", "someone@example.com", "Body")
+    assert excinfo.value.status_code == 500
+    assert "App Password" in excinfo.value.detail
+
+
+def test_send_email_async_maps_rate_limits(client, monkeypatch):
+    class OutOfBudget(FakeAsyncPool):
+        async def send_message(self, message):
+            raise RateLimitExceeded("Daily sending limit reached", 41.5)
+
+    monkeypatch.setattr(api, "API_SEND_MODE", "direct")
+    monkeypatch.setattr(api, "async_smtp_pool", OutOfBudget())
+    response = client.post("/send-email", json=email())
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "42"
+
+
+def test_retry_with_the_same_key_is_replayed(client):
+    first = client.post("/send-email", json=email(), headers={"Idempotency-Key": "abc"})
+    second = client.post("/send-email", json=email(), headers={"Idempotency-Key": "abc"})
+    assert second.status_code == 202
+    assert second.json() == first.json()
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert client.get("/admin/outbox").json()["counts"] == {"pending": 1}
+
+
+def test_same_key_for_another_request_is_rejected(client):
+    client.post("/send-email", json=email(), headers={"Idempotency-Key": "abc"})
+    response = client.post("/send-email", json=email(body="Different"), headers={"Idempotency-Key": "abc"})
+    assert response.status_code == 422
+
+
+def test_identical_request_without_a_key_is_deduplicated(client):
+    first = client.post("/send-email", json=email())
+    second = client.post("/send-email", json=email())
+    assert second.json()["job_id"] == first.json()["job_id"]
+    assert client.post("/send-email", json=email(body="Another")).json()["job_id"] != first.json()["job_id"]
@@ -0,0 +1,148 @@
+import asyncio
+import smtplib
+import time
+from email.message import EmailMessage
+
+import pytest
+
+import async_smtp
+from async_smtp import AsyncSMTPPool
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired = 0
+        self.successes = 0
+        self.failures = 0
+
+    def acquire(self, max_wait=None):
+        self.acquired += 1
+
+    def record_success(self):
+        self.successes += 1
+
+    def record_failure(self, error):
+        self.failures += 1
+
+
+class FakeSession:
+    """Stands in for AsyncSMTPSession; each send pops the next scripted outcome."""
+
+    def __init__(self, outcomes, sent):
+        self.outcomes = outcomes
+        self.sent = sent
+        self.writer = object()
+        self.message_count = 0
+        self.last_used = time.monotonic()
+        self.data_sent = False
+
+    async def send_message(self, message):
+        outcome = self.outcomes.pop(0)
+        self.data_sent = outcome == "drop_after_data"
+        if outcome != "ok":
+            raise smtplib.SMTPServerDisconnected(outcome)
+        self.message_count += 1
+        self.sent.append(message["Subject"])
+
+    async def noop(self):
+        return True
+
+    async def quit(self):
+        self.close()
+
+    def close(self):
+        self.writer = None
+
+
+def make_pool(outcomes, limiter=None):
+    pool = AsyncSMTPPool("localhost", 25, "user", "password", rate_limiter=limiter)
+    pool.sent = []
+
+    async def connect():
+        pool.handshakes += 1
+        return FakeSession(outcomes, pool.sent)
+
+    pool._connect = connect
+    return pool
+
+
+def message(subject="hello"):
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "a@example.com", "b@example.com", subject
+    msg.set_content("body")
+    return msg
+
+
+def test_sessions_are_reused():
+    pool = make_pool(["ok"] * 3)
+
+    async def run():
+        for i in range(3):
+            await pool.send_message(message(f"m{i}"))
+
+    asyncio.run(run())
+    assert pool.sent == ["m0", "m1", "m2"]
+    assert pool.stats()["handshakes"] == 1
+
+
+def test_drop_before_data_is_retried_on_one_token():
+    limiter = FakeLimiter()
+    pool = make_pool(["drop_before_data", "ok"], limiter)
+    asyncio.run(pool.send_message(message()))
+    assert pool.sent == ["hello"]
+    assert pool.reconnects == 1
+    assert limiter.acquired == 1
+    assert limiter.successes == 1
+
+
+def test_drop_after_data_is_not_retried():
+    limiter = FakeLimiter()
+    pool = make_pool(["drop_after_data", "ok"], limiter)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        asyncio.run(pool.send_message(message()))
+    assert pool.sent == []
+    assert pool.stats()["handshakes"] == 1
+    assert limiter.acquired == 1
+
+
+def test_second_drop_gives_up():
+    pool = make_pool(["drop_before_data", "drop_before_data"])
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        asyncio.run(pool.send_message(message()))
+
+
+def test_concurrency_is_capped_by_max_sessions(monkeypatch):
+    pool = make_pool([])
+    pool.max_sessions = 2
+    active = []
+    peak = []
+
+    class SlowSession(FakeSession):
+        async def send_message(self, message):
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+            self.message_count += 1
+
+    async def connect():
+        pool.handshakes += 1
+        return SlowSession([], pool.sent)
+
+    pool._connect = connect
+
+    async def run():
+        await asyncio.gather(*(pool.send_message(message()) for _ in range(10)))
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert pool.stats()["handshakes"] == 2
+
+
+def test_wire_format_is_crlf_and_dot_stuffed():
+    msg = message()
+    msg.set_content("line one\n.starts with a dot\n")
+    data = async_smtp._flatten(msg)
+    assert data.endswith(b"\r\n.\r\n")
+    assert b"\r\n..starts with a dot\r\n" in data
+    assert b"\n" not in data.replace(b"\r\n", b"")
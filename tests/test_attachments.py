@@ -0,0 +1,134 @@
+import email
+import os
+import re
+
+import pytest
+
+from attachments import AttachmentResolver, StreamingMessage, select_attachments
+from benchmarks.smtp_sink import SMTPSink
+from path_filter import PathFilter
+from service import build_message
+from smtp_pool import SMTPConnectionPool
+
+
+def write(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / "vault"
+    write(root / "notes" / "daily.md", b"![[photo.png]]\n#send\n")
+    return root
+
+
+def test_link_relative_to_the_vault_root(vault):
+    path = write(vault / "images" / "photo.png")
+    write(vault / "notes" / "images" / "photo.png")
+    resolver = AttachmentResolver(str(vault))
+    assert resolver.resolve("images/photo.png", str(vault / "notes" / "daily.md")) == os.path.realpath(path)
+
+
+def test_link_relative_to_the_note(vault):
+    path = write(vault / "notes" / "scans" / "receipt.pdf")
+    resolver = AttachmentResolver(str(vault))
+    assert resolver.resolve("scans/receipt.pdf", str(vault / "notes" / "daily.md")) == os.path.realpath(path)
+
+
+def test_bare_name_resolves_to_the_file_closest_to_the_root(vault):
+    write(vault / "a" / "b" / "photo.png")
+    closest = write(vault / "z" / "photo.png")
+    resolver = AttachmentResolver(str(vault))
+    note = str(vault / "notes" / "daily.md")
+    assert resolver.resolve("photo.png", note) == os.path.realpath(closest)
+    assert resolver.resolve("photo.png", note) == os.path.realpath(closest)
+    assert resolver.stats()["attachment_cache_hits"] == 1
+
+
+def test_excluded_directories_are_not_searched(vault):
+    write(vault / ".trash" / "photo.png")
+    resolver = AttachmentResolver(str(vault), PathFilter(str(vault)))
+    assert resolver.resolve("photo.png", str(vault / "notes" / "daily.md")) is None
+
+
+def test_notes_missing_files_and_paths_outside_the_vault_are_not_attachments(vault, tmp_path):
+    write(tmp_path / "secret.txt")
+    write(vault / "notes" / "other.md")
+    resolver = AttachmentResolver(str(vault))
+    note = str(vault / "notes" / "daily.md")
+    assert resolver.resolve("other.md", note) is None
+    assert resolver.resolve("other", note) is None
+    assert resolver.resolve("../../secret.txt", note) is None
+    assert resolver.resolve_all(["missing.png", "other.md"], note) == []
+
+
+def test_resolve_all_drops_duplicates(vault):
+    path = os.path.realpath(write(vault / "photo.png"))
+    resolver = AttachmentResolver(str(vault))
+    assert resolver.resolve_all(["photo.png", "/photo.png", "photo.png"], str(vault / "notes" / "daily.md")) == [path]
+
+
+def test_select_attachments_applies_both_caps(tmp_path):
+    small = write(tmp_path / "small.bin", b"a" * 10)
+    big = write(tmp_path / "big.bin", b"b" * 100)
+    other = write(tmp_path / "other.bin", b"c" * 40)
+    last = write(tmp_path / "last.bin", b"d" * 5)
+    kept, skipped = select_attachments([small, big, other, str(tmp_path / "gone.bin"), last],
+                                       max_bytes=50, max_total=45)
+    assert kept == [small, last]
+    assert len(skipped) == 3
+    assert skipped[0].startswith("Attachment not sent: big.bin (")
+    assert "over the" in skipped[0]
+    assert "attachments are limited to" in skipped[1] and "other.bin" in skipped[1]
+    assert skipped[2] == "Attachment not sent: gone.bin (no longer in the vault)"
+
+
+def parse_data(data):
+    """The message a server stores from DATA: dot-stuffing undone, local line ends."""
+    return email.message_from_bytes(re.sub(rb"(?m)^\.\.", b".", data).replace(b"\r\n", b"\n"))
+
+
+def test_chunks_carry_the_body_and_every_file(tmp_path):
+    image = os.urandom(200 * 1024)
+    text = b".hidden line\nsecond\n"
+    paths = [write(tmp_path / "photo.png", image), write(tmp_path / "empty.txt", b""),
+             write(tmp_path / "dots.txt", text)]
+    message = build_message("Subject", "to@example.com", ".starts with a dot\nbody", sender="me@example.com")
+    streaming = StreamingMessage(message, paths + [str(tmp_path / "gone.bin")])
+    assert streaming.envelope() == ("me@example.com", ["to@example.com"])
+
+    data = b"".join(streaming.chunks())
+    assert b"\n" not in data.replace(b"\r\n", b"")
+    parsed = parse_data(data)
+    parts = parsed.get_payload()
+    assert parts[0].get_payload(decode=True) == b".starts with a dot\nbody"
+    assert [part.get_filename() for part in parts[1:]] == ["photo.png", "empty.txt", "dots.txt"]
+    assert parts[1].get_content_type() == "image/png"
+    assert [part.get_payload(decode=True) for part in parts[1:]] == [image, b"", text]
+
+
+def test_file_that_grew_past_the_cap_is_left_out(tmp_path):
+    path = write(tmp_path / "big.bin", b"x" * 100)
+    message = build_message("Subject", "to@example.com", "body", sender="me@example.com")
+    parsed = parse_data(b"".join(StreamingMessage(message, [path], max_bytes=50).chunks()))
+    assert len(parsed.get_payload()) == 1
+
+
+def test_pool_streams_attachments_to_a_server(tmp_path):
+    sink = SMTPSink()
+    sink.start()
+    try:
+        pool = SMTPConnectionPool("127.0.0.1", sink.port, "user", "password")
+        path = write(tmp_path / "photo.png", os.urandom(300 * 1024))
+        message = build_message("Subject", "to@example.com", "body", sender="me@example.com")
+        pool.send_message(StreamingMessage(message, [path]))
+        pool.send_message(build_message("Plain", "to@example.com", "body", sender="me@example.com"))
+        pool.close_all()
+        stats = sink.stats()
+        assert stats["messages"] == 2
+        assert stats["sessions"] == 1
+        assert stats["bytes_received"] > 400 * 1024
+    finally:
+        sink.stop()
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from email.message import EmailMessage
+
+import pytest
+
+from async_smtp import AsyncSMTPPool
+from benchmarks.smtp_sink import SMTPSink
+from benchmarks.synthetic_vault import generate_vault
+from note_parser import parse_file
+from smtp_pool import SMTPConnectionPool
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+@pytest.fixture
+def sink():
+    sink = SMTPSink()
+    sink.start()
+    yield sink
+    sink.stop()
+
+
+def message(subject):
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "bench@example.com", "sink@example.com", subject
+    msg.set_content("Hello\n.leading dot\n")
+    return msg
+
+
+def test_synthetic_vault_is_reproducible(tmp_path):
+    first = generate_vault(str(tmp_path / "one"), notes=50, note_size=500, send_share=0.2)
+    second = generate_vault(str(tmp_path / "two"), notes=50, note_size=500, send_share=0.2)
+    assert len(first) == 50
+    tagged = [parse_file(path)[0] for path in first]
+    assert tagged == [parse_file(path)[0] for path in second]
+    assert 0 < sum(tagged) < 50
+    assert os.path.exists(tmp_path / "one" / ".obsidian" / "workspace.json")
+
+
+def test_pool_sends_over_one_session_to_the_sink(sink):
+    pool = SMTPConnectionPool("127.0.0.1", sink.port, "bench", "bench")
+    try:
+        for i in range(3):
+            pool.send_message(message(f"m{i}"))
+    finally:
+        pool.close_all()
+    assert sink.stats()["sessions"] == 1
+    assert sink.stats()["messages"] == 3
+
+
+def test_async_pool_sends_to_the_sink(sink):
+    async def run():
+        pool = AsyncSMTPPool("127.0.0.1", sink.port, "bench", "bench")
+        try:
+            await asyncio.gather(*(pool.send_message(message(f"m{i}")) for i in range(5)))
+            return pool.stats()
+        finally:
+            await pool.close_all()
+
+    stats = asyncio.run(run())
+    assert sink.stats()["messages"] == 5
+    assert stats["handshakes"] == sink.stats()["sessions"]
+
+
+def test_end_to_end_benchmark_runs(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, os.path.join(BENCHMARKS, "run_benchmarks.py"), "--notes", "40", "--burst-edits", "5",
+         "--requests", "10", "--concurrency", "4", "--timeout", "60", "--output", str(output)],
+        check=True, capture_output=True, cwd=tmp_path, timeout=120,
+    )
+    results = json.loads(output.read_text())
+    assert set(results) >= {"cold_start", "burst", "send_email", "smtp_sink"}
+    assert results["smtp_sink"]["messages"] >= 10
@@ -0,0 +1,53 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import daemon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, env=None):
+    return subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True, capture_output=True,
+                          text=True, timeout=60).stdout
+
+
+def test_watcher_entry_point_skips_gui_and_web_imports():
+    loaded = run_python(
+        "import sys, daemon, service, watchdog.observers; "
+        "print(' '.join(sorted(m for m in ('tkinter', 'fastapi', 'uvicorn') if m in sys.modules)))"
+    )
+    assert loaded.strip() == ""
+
+
+def test_unknown_component_is_rejected(capsys):
+    assert daemon.main(["--components", "watcher,gui"]) == 2
+    assert "gui" in capsys.readouterr().err
+
+
+def test_missing_config_file_is_rejected(tmp_path, capsys):
+    assert daemon.main(["--config", str(tmp_path / "missing.env")]) == 2
+    assert "Config file not found" in capsys.readouterr().err
+
+
+def test_watcher_starts_and_stops_on_sigterm(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    env = dict(os.environ, DB_PATH=str(tmp_path / "daemon.db"), LOG_ASYNC="false")
+    process = subprocess.Popen(
+        [sys.executable, "daemon.py", "--components", "watcher", "--vault", str(vault)],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while not os.path.exists(tmp_path / "daemon.db") and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=30)
+    finally:
+        process.kill()
+    assert process.returncode == 0, output
+    assert "Shutting down" in output
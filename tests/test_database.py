@@ -0,0 +1,149 @@
+import sqlite3
+import time
+
+import database
+from database import ProcessedFileStore
+
+
+def make_store(tmp_path, **kwargs):
+    store = ProcessedFileStore(str(tmp_path / "processed.db"), **kwargs)
+    store.init_schema()
+    return store
+
+
+def rows(store):
+    return store.connection().execute("SELECT file_path FROM processed_files ORDER BY file_path").fetchall()
+
+
+def test_store_uses_wal(tmp_path):
+    store = make_store(tmp_path)
+    assert store.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    store.close()
+
+
+def test_marks_are_visible_at_once_and_written_in_batches(tmp_path):
+    store = make_store(tmp_path, batch_size=3, flush_interval=60)
+    store.mark_processed("/vault/a.md")
+    store.mark_processed("/vault/b.md")
+    assert store.is_processed("/vault/a.md")
+    assert rows(store) == []
+    store.mark_processed("/vault/c.md")
+    assert len(rows(store)) == 3
+    store.close()
+
+
+def test_marks_survive_a_restart(tmp_path):
+    store = make_store(tmp_path, flush_interval=60)
+    store.mark_processed("/vault/a.md", content_hash="abc")
+    store.close()
+
+    store = make_store(tmp_path)
+    assert store.is_processed("/vault/a.md")
+    assert not store.is_processed("/vault/b.md")
+    store.close()
+
+
+def test_lookups_fall_back_to_sqlite_once_the_cache_overflows(tmp_path):
+    store = make_store(tmp_path, cache_size=2, batch_size=1)
+    for name in "abc":
+        store.mark_processed(f"/vault/{name}.md")
+    assert len(store._cache) == 2
+    assert not store._cache_complete
+    # Evicted from memory but still processed
+    assert store.is_processed("/vault/a.md")
+    assert not store.is_processed("/vault/d.md")
+    store.close()
+
+
+def test_open_store_follows_db_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "one.db"))
+    first = database.open_store()
+    database.mark_file_processed("/vault/a.md")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "two.db"))
+    second = database.open_store()
+    try:
+        assert second is not first
+        assert not database.is_file_processed("/vault/a.md")
+    finally:
+        second.close()
+        database._store = None
+
+
+def make_baseline_db(path, paths):
+    """A database as the original init_db and mark_file_processed left it."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE processed_files (file_path TEXT PRIMARY KEY, processed_at TIMESTAMP)")
+    conn.executemany("INSERT INTO processed_files (file_path) VALUES (?)", [(p,) for p in paths])
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_migrated(tmp_path):
+    make_baseline_db(str(tmp_path / "processed.db"), ["/vault/a.md", "/vault/b.md"])
+    before = time.time()
+    store = make_store(tmp_path)
+    conn = store.connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    rows = conn.execute("SELECT file_path, processed_at, status FROM processed_files ORDER BY file_path").fetchall()
+    assert [(path, status) for path, _, status in rows] == [("/vault/a.md", "processed"), ("/vault/b.md", "processed")]
+    assert all(processed_at >= before for _, processed_at, _ in rows)
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(processed_files)")}
+    assert "idx_processed_files_processed_at" in indexes
+    assert store.is_processed("/vault/a.md")
+    store.close()
+
+
+def test_migration_takes_timestamps_and_status_from_the_outbox(tmp_path):
+    path = str(tmp_path / "processed.db")
+    make_baseline_db(path, ["/vault/sent.md", "/vault/dead.md"])
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE outbox (id INTEGER PRIMARY KEY, source_path TEXT, status TEXT, created_at REAL, "
+                 "sent_at REAL)")
+    conn.execute("INSERT INTO outbox (source_path, status, created_at, sent_at) VALUES ('/vault/sent.md', 'sent', 100, 150)")
+    conn.execute("INSERT INTO outbox (source_path, status, created_at) VALUES ('/vault/dead.md', 'dead', 200)")
+    conn.commit()
+    conn.close()
+
+    store = make_store(tmp_path)
+    rows = dict((path, (processed_at, status)) for path, processed_at, status in store.connection().execute(
+        "SELECT file_path, processed_at, status FROM processed_files"))
+    assert rows == {"/vault/sent.md": (150, "sent"), "/vault/dead.md": (200, "failed")}
+    store.close()
+
+
+def test_migration_runs_once(tmp_path):
+    make_store(tmp_path).close()
+    store = make_store(tmp_path)
+    assert store.connection().execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    store.close()
+
+
+def test_prune_keeps_recent_and_queued_notes(tmp_path):
+    store = make_store(tmp_path)
+    conn = store.connection()
+    old = time.time() - 40 * 86400
+    with conn:
+        conn.executemany(
+            "INSERT INTO processed_files (file_path, processed_at, status) VALUES (?, ?, ?)",
+            [("/vault/old.md", old, "sent"), ("/vault/queued.md", old, "queued"), ("/vault/new.md", time.time(), "sent")],
+        )
+    assert store.prune(retention_days=30, batch_size=1) == 1
+    assert [path for (path,) in rows(store)] == ["/vault/new.md", "/vault/queued.md"]
+    assert not store.is_processed("/vault/old.md")
+    assert store.prune(retention_days=0) == 0
+    store.close()
+
+
+def test_vacuum_releases_free_pages(tmp_path):
+    store = make_store(tmp_path, batch_size=1000)
+    for i in range(2000):
+        store.mark_processed(f"/vault/{i:05d}-{'x' * 100}.md")
+    store.flush()
+    conn = store.connection()
+    with conn:
+        conn.execute("DELETE FROM processed_files")
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    assert store.vacuum(batch_pages=10) > 0
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    store.close()
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from conftest import wait_for
+from debounce import DebounceScheduler
+
+
+def make_scheduler(quiet_period=0.05, max_pending=100):
+    fired = []
+    scheduler = DebounceScheduler(fired.append, quiet_period=quiet_period, max_pending=max_pending)
+    scheduler.start()
+    return scheduler, fired
+
+
+def test_burst_of_touches_fires_once_after_the_last():
+    fired = []
+    scheduler = DebounceScheduler(lambda key: fired.append((key, time.monotonic())), quiet_period=0.1)
+    scheduler.start()
+    try:
+        for _ in range(5):
+            last_touch = time.monotonic()
+            scheduler.touch("a.md")
+            time.sleep(0.03)
+        assert wait_for(lambda: fired)
+        time.sleep(0.15)
+        assert [key for key, _ in fired] == ["a.md"]
+        assert fired[0][1] - last_touch >= 0.1
+        assert scheduler.coalesced == 4
+    finally:
+        scheduler.stop()
+
+
+def test_paths_are_debounced_independently():
+    scheduler, fired = make_scheduler()
+    try:
+        scheduler.touch("a.md")
+        scheduler.touch("b.md")
+        assert wait_for(lambda: sorted(fired) == ["a.md", "b.md"])
+        assert scheduler.pending() == 0
+    finally:
+        scheduler.stop()
+
+
+def test_overflow_fires_the_oldest_path_early():
+    scheduler, fired = make_scheduler(quiet_period=60, max_pending=2)
+    try:
+        for name in ("a.md", "b.md", "c.md"):
+            scheduler.touch(name)
+        assert fired == ["a.md"]
+        assert scheduler.evicted == 1
+        assert scheduler.pending() == 2
+    finally:
+        scheduler.stop()
+
+
+def test_stale_heap_entries_are_compacted():
+    scheduler, _ = make_scheduler(quiet_period=60)
+    try:
+        for _ in range(1000):
+            scheduler.touch("a.md")
+        assert len(scheduler._heap) <= 2 * scheduler.pending() + 65
+    finally:
+        scheduler.stop()
+
+
+def test_failing_callback_does_not_stop_the_scheduler():
+    fired = []
+    done = threading.Event()
+
+    def callback(key):
+        fired.append(key)
+        if key == "bad.md":
+            raise RuntimeError("boom")
+        done.set()
+
+    scheduler = DebounceScheduler(callback, quiet_period=0.01)
+    scheduler.start()
+    try:
+        scheduler.touch("bad.md")
+        assert wait_for(lambda: fired == ["bad.md"])
+        scheduler.touch("good.md")
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
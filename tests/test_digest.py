@@ -0,0 +1,102 @@
+import pytest
+
+from digest import DigestCollector
+from outbox import Outbox
+
+
+@pytest.fixture
+def box(store):
+    return Outbox(lambda entry: None, store=store)
+
+
+def make_digest(store, box, **kwargs):
+    return DigestCollector(lambda account=None: box, store=store, **kwargs)
+
+
+def add(digest, path, body="• task", sender="Alice", recipient="lead@example.com"):
+    return digest.add(None, recipient, sender, path, body)
+
+
+def test_notes_from_one_sender_become_one_message(store, box):
+    digest = make_digest(store, box, window=3600, max_notes=10)
+    add(digest, "/vault/Monday.md", "• one")
+    add(digest, "/vault/Tuesday.md", "• two")
+    add(digest, "/vault/other.md", "• three", sender="Bob")
+    assert digest.flush() == 0
+    assert digest.flush(force=True) == 2
+
+    messages = {entry["subject"].split("-")[0]: entry for entry in box.list()}
+    assert messages["Alice"]["subject"].endswith("(2 notes)")
+    assert "Monday\n• one\n\nTuesday\n• two" in messages["Alice"]["body"]
+    assert digest.pending() == 0
+
+
+def test_group_is_sent_once_it_is_full(store, box):
+    digest = make_digest(store, box, window=3600, max_notes=2)
+    add(digest, "/vault/a.md")
+    add(digest, "/vault/b.md")
+    assert digest.flush() == 1
+
+
+def test_group_is_sent_once_its_oldest_note_is_due(store, box):
+    digest = make_digest(store, box, window=0, max_notes=10)
+    add(digest, "/vault/a.md")
+    assert digest.flush() == 1
+
+
+def test_edit_replaces_the_section(store, box):
+    digest = make_digest(store, box)
+    add(digest, "/vault/a.md", "• draft")
+    add(digest, "/vault/a.md", "• final")
+    assert digest.pending() == 1
+    digest.flush(force=True)
+    assert "• final" in box.list()[0]["body"]
+    assert "• draft" not in box.list()[0]["body"]
+
+
+def test_delivery_marks_every_note_processed(store, box):
+    digest = make_digest(store, box)
+    add(digest, "/vault/a.md")
+    add(digest, "/vault/b.md")
+    digest.flush(force=True)
+    message_id = box.list()[0]["id"]
+    # Not collected again while the digest is out
+    assert not add(digest, "/vault/a.md")
+    assert not store.is_processed("/vault/a.md")
+
+    assert sorted(digest.complete(message_id, True)) == ["/vault/a.md", "/vault/b.md"]
+    assert store.is_processed("/vault/a.md") and store.is_processed("/vault/b.md")
+    assert not add(digest, "/vault/a.md")
+
+
+def test_failed_digest_leaves_notes_unprocessed(store, box):
+    digest = make_digest(store, box)
+    add(digest, "/vault/a.md")
+    digest.flush(force=True)
+    assert digest.complete(box.list()[0]["id"], False) == ["/vault/a.md"]
+    assert not store.is_processed("/vault/a.md")
+
+
+def test_restart_applies_outcomes_recorded_meanwhile(store, box):
+    digest = make_digest(store, box)
+    add(digest, "/vault/sent.md")
+    digest.flush(force=True)
+    sent_id = box.list()[0]["id"]
+    add(digest, "/vault/purged.md", sender="Bob")
+    digest.flush(force=True)
+    purged_id = box.list()[0]["id"]
+
+    conn = store.connection()
+    with conn:
+        conn.execute("UPDATE outbox SET status = 'sent' WHERE id = ?", (sent_id,))
+    box.purge(purged_id)
+
+    restarted = make_digest(store, box)
+    restarted._reconcile()
+    assert store.is_processed("/vault/sent.md")
+    # Its message is gone, so the note can be collected again
+    assert add(restarted, "/vault/purged.md", sender="Bob")
+
+
+def test_not_a_digest_message(store, box):
+    assert make_digest(store, box).complete(12345, True) == []
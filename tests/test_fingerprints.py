@@ -0,0 +1,59 @@
+import os
+
+from fingerprints import FingerprintIndex, content_hash
+
+
+def record(index, path):
+    data = path.read_bytes()
+    index.record(str(path), os.stat(path), content_hash(data))
+    return content_hash(data)
+
+
+def test_unchanged_file_costs_only_a_stat(store, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("hello\n")
+    index = FingerprintIndex(store)
+    assert index.stat_unchanged(str(note))[0] is False
+    record(index, note)
+    unchanged, st = index.stat_unchanged(str(note))
+    assert unchanged and st.st_size == 6
+
+
+def test_touch_changes_the_stat_but_not_the_hash(store, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("hello\n")
+    index = FingerprintIndex(store)
+    digest = record(index, note)
+    st = os.stat(note)
+    os.utime(note, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert index.stat_unchanged(str(note))[0] is False
+    assert index.hash_unchanged(str(note), content_hash(note.read_bytes()))
+    assert not index.hash_unchanged(str(note), digest[::-1])
+
+
+def test_missing_file_has_no_stat(store, tmp_path):
+    assert FingerprintIndex(store).stat_unchanged(str(tmp_path / "gone.md")) == (False, None)
+
+
+def test_fingerprints_are_persisted_and_follow_moves(store, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("hello\n")
+    index = FingerprintIndex(store)
+    digest = record(index, note)
+    assert index.path_for_hash(digest) == str(note)
+
+    assert index.move(str(note), str(tmp_path / "b.md"))
+    reloaded = FingerprintIndex(store)
+    assert reloaded.path_for_hash(digest) == str(tmp_path / "b.md")
+    assert reloaded.hash_unchanged(str(tmp_path / "b.md"), digest)
+    assert not reloaded.hash_unchanged(str(note), digest)
+
+
+def test_forget_drops_the_reverse_lookup(store, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("hello\n")
+    index = FingerprintIndex(store)
+    digest = record(index, note)
+    index.forget(str(note))
+    assert index.path_for_hash(digest) is None
+    assert FingerprintIndex(store).path_for_hash(digest) is None
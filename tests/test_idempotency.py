@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyCache, IdempotencyConflict, fingerprint, request_key
+
+
+class Handler:
+    def __init__(self, status_code=202, delay=0.0, error=None):
+        self.status_code = status_code
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.status_code, {"job_id": self.calls}
+
+
+def run(cache, key, request_fingerprint, handle):
+    return asyncio.run(cache.run(key, request_fingerprint, 60, handle))
+
+
+def test_repeated_key_replays_the_first_outcome(store):
+    cache = IdempotencyCache(store)
+    handle = Handler()
+    assert run(cache, "key:a", "f1", handle) == (202, {"job_id": 1}, False)
+    assert run(cache, "key:a", "f1", handle) == (202, {"job_id": 1}, True)
+    assert handle.calls == 1
+
+
+def test_outcome_survives_a_restart(store):
+    run(IdempotencyCache(store), "key:a", "f1", Handler())
+    handle = Handler()
+    assert run(IdempotencyCache(store), "key:a", "f1", handle) == (202, {"job_id": 1}, True)
+    assert handle.calls == 0
+
+
+def test_key_reused_for_other_content_is_a_conflict(store):
+    cache = IdempotencyCache(store)
+    run(cache, "key:a", "f1", Handler())
+    with pytest.raises(IdempotencyConflict):
+        run(cache, "key:a", "f2", Handler())
+
+
+def test_failures_are_not_stored(store):
+    cache = IdempotencyCache(store)
+    with pytest.raises(RuntimeError):
+        run(cache, "key:a", "f1", Handler(error=RuntimeError("SMTP down")))
+    assert run(cache, "key:a", "f1", Handler(status_code=503))[2] is False
+    assert run(cache, "key:a", "f1", Handler())[2] is False
+    assert run(cache, "key:a", "f1", Handler())[2] is True
+
+
+def test_concurrent_duplicates_share_one_attempt(store):
+    cache = IdempotencyCache(store)
+    handle = Handler(delay=0.05)
+
+    async def both():
+        return await asyncio.gather(cache.run("key:a", "f1", 60, handle), cache.run("key:a", "f1", 60, handle))
+
+    first, second = asyncio.run(both())
+    assert handle.calls == 1
+    assert first[:2] == second[:2]
+    assert sorted([first[2], second[2]]) == [False, True]
+
+
+def test_concurrent_request_with_other_content_is_a_conflict(store):
+    cache = IdempotencyCache(store)
+
+    async def both():
+        first = asyncio.ensure_future(cache.run("key:a", "f1", 60, Handler(delay=0.05)))
+        await asyncio.sleep(0.01)
+        with pytest.raises(IdempotencyConflict):
+            await cache.run("key:a", "f2", 60, Handler())
+        return await first
+
+    assert asyncio.run(both())[2] is False
+
+
+def test_expired_outcomes_are_not_replayed(store):
+    cache = IdempotencyCache(store)
+    asyncio.run(cache.run("key:a", "f1", -1, Handler()))
+    assert run(cache, "key:a", "f1", Handler())[2] is False
+
+
+def test_request_keys():
+    content = fingerprint("Subject", "someone@example.com", "Body")
+    assert content == fingerprint("Subject", "someone@example.com", "Body")
+    assert content != fingerprint("Subject", "someone@example.com", "Other")
+    assert request_key("abc", content)[0] == "key:abc"
+    assert request_key(None, content)[0] == f"content:{content}"
@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+
+from logging_setup import DroppingQueueHandler, JsonFormatter, SampleFilter, TraceFilter, file_trace_id, traced
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def record(message, sample=None):
+    record = logging.LogRecord("root", logging.INFO, __file__, 1, message, None, None)
+    if sample is not None:
+        record.sample = sample
+    return record
+
+
+def test_sampled_lines_are_limited_per_key():
+    sample_filter = SampleFilter(burst=2, interval=60)
+    passed = [sample_filter.filter(record(f"line {i}", "hot")) for i in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert sample_filter.filter(record("other key", "cold"))
+    assert sample_filter.filter(record("not sampled"))
+
+
+def test_next_line_after_the_window_reports_the_suppressed_count():
+    sample_filter = SampleFilter(burst=1, interval=60)
+    for i in range(4):
+        sample_filter.filter(record(f"line {i}", "hot"))
+    sample_filter._windows["hot"][0] -= 61
+    late = record("late", "hot")
+    assert sample_filter.filter(late)
+    assert late.getMessage() == "late (3 similar messages suppressed)"
+
+
+def test_trace_id_follows_the_file():
+    trace_filter = TraceFilter()
+    with traced("/vault/a.md"):
+        inside = record("inside")
+        trace_filter.filter(inside)
+    outside = record("outside")
+    trace_filter.filter(outside)
+    assert inside.trace_id == file_trace_id("/vault/a.md")
+    assert outside.trace_id == "-"
+    assert file_trace_id("/vault/a.md") != file_trace_id("/vault/b.md")
+
+
+def test_json_lines():
+    line = record("hello")
+    line.trace_id = "abcd1234"
+    entry = json.loads(JsonFormatter().format(line))
+    assert (entry["message"], entry["trace_id"], entry["level"]) == ("hello", "abcd1234", "INFO")
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(2))
+    for i in range(5):
+        handler.handle(record(f"line {i}"))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_async_logging_is_flushed_at_exit():
+    code = (
+        "import logging, logging_setup\n"
+        "logging_setup.configure_logging()\n"
+        "logging_setup.configure_logging()\n"
+        "for i in range(200):\n"
+        "    logging.info(f'line {i}')\n"
+    )
+    env = dict(os.environ, LOG_ASYNC="true", LOG_FORMAT="text")
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True, timeout=60).stdout
+    lines = output.splitlines()
+    assert len(lines) == 200
+    assert lines[-1].endswith("[-] line 199")
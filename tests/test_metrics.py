@@ -0,0 +1,58 @@
+import pytest
+
+import metrics
+from metrics import CallbackMetric, Counter, Histogram, render_metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # Metrics made here stay out of the process-wide registry
+    monkeypatch.setattr(metrics, "_registry", [])
+
+
+def test_counter_renders_per_label():
+    counter = Counter("test_events_total", "Events", ["result"])
+    counter.inc(result="ok")
+    counter.inc(2, result="ok")
+    counter.inc(result="failed")
+    assert counter.render() == [
+        "# HELP test_events_total Events",
+        "# TYPE test_events_total counter",
+        'test_events_total{result="ok"} 3',
+        'test_events_total{result="failed"} 1',
+    ]
+
+
+def test_unlabelled_counter_starts_at_zero():
+    assert Counter("test_total", "Total").render()[-1] == "test_total 0"
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Time", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 2.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_histogram_time_observes_even_on_error():
+    histogram = Histogram("test_seconds", "Time", ["phase"])
+    with pytest.raises(RuntimeError):
+        with histogram.time(phase="send"):
+            raise RuntimeError("boom")
+    assert 'test_seconds_count{phase="send"} 1' in histogram.render()
+
+
+def test_callback_metric_is_read_at_scrape_time():
+    values = {("a",): 1}
+    CallbackMetric("test_depth", "Depth", lambda: values, ["queue"])
+    CallbackMetric("test_broken", "Broken", lambda: 1 / 0)
+    values[("b",)] = 2
+    text = render_metrics()
+    assert 'test_depth{queue="a"} 1\ntest_depth{queue="b"} 2\n' in text
+    assert "test_broken" not in text
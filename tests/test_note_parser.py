@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from benchmarks.bench_parser import legacy_parse_file
+from note_parser import NoteParser, parse_file, parse_lines
+
+LINES = [
+    "#sender: Alice", "#sender:Bob", "   #sender:   Carol  ", "#send", "  #send  ", "#sending", "#send now",
+    "#sender", "# heading", "#tag", "- [ ] call the bank", "  - [x] done  ", "", "   ", "-------------------",
+    "Tomorrow's Task", "plain text with #send in the middle", "ünïcode ✓",
+]
+
+
+def legacy(path):
+    """The baseline parser's output, allowing for the two documented differences."""
+    has_send_tag, sender_name, tasks = legacy_parse_file(path)
+    # The baseline kept the colon after "#sender" in the name
+    if sender_name is not None:
+        sender_name = sender_name[1:].strip() if sender_name.startswith(":") else sender_name
+    # and split("\n") reported an empty task for what follows the final newline
+    with open(path, encoding="utf-8") as file:
+        content = file.read()
+    if not content or content.endswith("\n"):
+        tasks = tasks[:-1]
+    return has_send_tag, sender_name, tasks
+
+
+def write(tmp_path, text, newline="\n"):
+    path = tmp_path / "note.md"
+    path.write_bytes(text.replace("\n", newline).encode("utf-8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    "#sender: Alice\n- [ ] one\n- [ ] two\n#send\n",
+    "#sender: Alice\n- [ ] one\n-------------------\nTomorrow\n#send",
+    "no tags at all\n\n",
+    "#send\n#sender: Late\n",
+    "#sender: First\n#sender: Second\n",
+    "",
+])
+def test_matches_the_baseline_parser(tmp_path, text):
+    path = write(tmp_path, text)
+    assert parse_file(path)[:3] == legacy(path)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_the_baseline_parser_on_random_notes(tmp_path, seed):
+    rng = random.Random(seed)
+    text = "\n".join(rng.choice(LINES) for _ in range(rng.randint(0, 40)))
+    if rng.random() < 0.5:
+        text += "\n"
+    path = write(tmp_path, text, newline=rng.choice(["\n", "\r\n"]))
+    assert parse_file(path)[:3] == legacy(path)
+
+
+def test_feeding_line_by_line_matches_a_single_pass():
+    text = "#sender: Alice\n- [ ] one\n#send\n- [ ] two"
+    parser = NoteParser()
+    lines = text.split("\n")
+    for line in lines[:-1]:
+        parser.feed(line)
+    # The unfinished last line is included without changing the saved state
+    assert parser.result(lines[-1]) == parse_lines(lines)
+    assert parser.result() == parse_lines(lines[:-1])
+
+
+def test_embeds_are_collected_and_embed_only_lines_are_not_tasks():
+    has_send_tag, sender_name, tasks, embeds = parse_lines([
+        "#sender: Alice",
+        "![[photo.png]]",
+        "- [ ] read ![[doc.pdf|the doc]] today",
+        "![[Other note#Heading]] ![[photo.png]]",
+        "#send",
+    ])
+    assert (has_send_tag, sender_name) == (True, "Alice")
+    assert tasks == ["- [ ] read ![[doc.pdf|the doc]] today"]
+    assert embeds == ["photo.png", "doc.pdf", "Other note"]
@@ -0,0 +1,170 @@
+import smtplib
+import time
+
+import pytest
+
+import outbox
+from conftest import wait_for
+from outbox import Outbox, is_permanent_failure
+from rate_limit import RateLimitExceeded
+
+
+class Deliveries:
+    """deliver() stand-in: each call raises the next scripted error, or succeeds once they run out."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.entries = []
+
+    def __call__(self, entry):
+        self.entries.append(entry)
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+@pytest.fixture
+def completed():
+    return []
+
+
+def make_outbox(store, completed, *errors):
+    deliveries = Deliveries(*errors)
+    box = Outbox(deliveries, on_complete=lambda entry, sent: completed.append((entry["id"], sent)), store=store)
+    return box, deliveries
+
+
+def run_once(box):
+    """Claim and handle the next due message the way a sender thread does."""
+    entry = box._claim()
+    assert entry is not None
+    box._handle(entry)
+    return box.get(entry["id"])
+
+
+def test_delivered_message_is_marked_sent(store, completed):
+    box, deliveries = make_outbox(store, completed)
+    message_id = box.enqueue("Subject", "someone@example.com", "Body")
+    entry = run_once(box)
+    assert entry["status"] == "sent"
+    assert entry["attempts"] == 1
+    assert entry["sent_at"] is not None
+    assert completed == [(message_id, True)]
+    assert deliveries.entries[0]["message_id"].startswith("<")
+
+
+def test_transient_failure_is_retried_with_backoff(store, completed):
+    box, deliveries = make_outbox(store, completed, smtplib.SMTPServerDisconnected("dropped"))
+    box.enqueue("Subject", "someone@example.com", "Body")
+    entry = run_once(box)
+    assert entry["status"] == "pending"
+    assert entry["last_error"] == "dropped"
+    delay = entry["next_attempt_at"] - time.time()
+    assert outbox.OUTBOX_BACKOFF_BASE * 0.5 - 1 <= delay <= outbox.OUTBOX_BACKOFF_BASE
+    assert box._claim() is None
+
+    store.connection().execute("UPDATE outbox SET next_attempt_at = 0")
+    store.connection().commit()
+    entry = run_once(box)
+    assert entry["status"] == "sent"
+    assert entry["attempts"] == 2
+    # The retry goes out under the same Message-ID
+    assert deliveries.entries[0]["message_id"] == deliveries.entries[1]["message_id"]
+    assert completed == [(entry["id"], True)]
+
+
+def test_message_is_dead_after_max_attempts(store, completed, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 3)
+    box, _ = make_outbox(store, completed, *[smtplib.SMTPServerDisconnected("dropped")] * 3)
+    message_id = box.enqueue("Subject", "someone@example.com", "Body")
+    for _ in range(3):
+        entry = run_once(box)
+        store.connection().execute("UPDATE outbox SET next_attempt_at = 0")
+        store.connection().commit()
+    assert entry["status"] == "dead"
+    assert completed == [(message_id, False)]
+
+    assert box.retry(message_id)
+    entry = run_once(box)
+    assert entry["status"] == "sent"
+    assert entry["attempts"] == 1
+
+
+def test_permanent_failure_is_dead_at_once(store, completed):
+    refused = smtplib.SMTPRecipientsRefused({"someone@example.com": (550, b"No such user")})
+    box, _ = make_outbox(store, completed, refused)
+    box.enqueue("Subject", "someone@example.com", "Body")
+    assert run_once(box)["status"] == "dead"
+
+
+def test_rate_limit_defers_without_using_an_attempt(store, completed):
+    box, _ = make_outbox(store, completed, RateLimitExceeded("Daily sending limit reached", 120))
+    box.enqueue("Subject", "someone@example.com", "Body")
+    entry = run_once(box)
+    assert entry["status"] == "pending"
+    assert entry["attempts"] == 0
+    assert entry["next_attempt_at"] - time.time() > 100
+
+
+@pytest.mark.parametrize("error, permanent", [
+    (smtplib.SMTPDataError(554, b"Message rejected"), True),
+    (smtplib.SMTPDataError(451, b"Try again later"), False),
+    (smtplib.SMTPAuthenticationError(535, b"Bad credentials"), False),
+    (smtplib.SMTPDataError(550, b"Daily user sending quota exceeded"), False),
+    (smtplib.SMTPServerDisconnected("dropped"), False),
+    (ValueError("Email credentials not configured"), True),
+])
+def test_permanent_failures(error, permanent):
+    assert is_permanent_failure(error) is permanent
+
+
+def test_messages_interrupted_by_a_crash_are_sent_after_restart(store, completed):
+    box, _ = make_outbox(store, completed)
+    message_id = box.enqueue("Subject", "someone@example.com", "Body")
+    # Claimed by a sender, then the process died before it finished
+    assert box._claim()["id"] == message_id
+    assert box.get(message_id)["status"] == "sending"
+
+    restarted, deliveries = make_outbox(store, completed)
+    restarted.start()
+    try:
+        assert wait_for(lambda: restarted.get(message_id)["status"] == "sent")
+        assert len(deliveries.entries) == 1
+    finally:
+        restarted.stop()
+
+
+def test_enqueue_marks_the_note_queued_in_the_same_transaction(store, completed):
+    box, _ = make_outbox(store, completed)
+    box.enqueue("Subject", "someone@example.com", "Body", source_path="/vault/a.md", content_hash="abc")
+    row = store.connection().execute(
+        "SELECT status, content_hash FROM processed_files WHERE file_path = ?", ("/vault/a.md",)
+    ).fetchone()
+    assert row == ("queued", "abc")
+    assert store.is_processed("/vault/a.md")
+
+
+def test_full_outbox_refuses_new_messages(store, completed, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_PENDING", 1)
+    box, _ = make_outbox(store, completed)
+    box.enqueue("Subject", "someone@example.com", "Body")
+    with pytest.raises(outbox.OutboxFullError):
+        box.enqueue("Subject", "someone@example.com", "Body")
+
+
+def test_accounts_only_claim_their_own_messages(store, completed):
+    work = Outbox(lambda entry: None, store=store, account="work")
+    default, _ = make_outbox(store, completed)
+    work.enqueue("Subject", "someone@example.com", "Body")
+    assert default._claim() is None
+    assert work._claim()["account"] == "work"
+
+
+def test_purge_keeps_messages_being_sent(store, completed):
+    box, _ = make_outbox(store, completed)
+    sent_id = box.enqueue("Subject", "someone@example.com", "Body")
+    run_once(box)
+    sending_id = box.enqueue("Subject", "someone@example.com", "Body")
+    box._claim()
+    assert box.purge(status="sent") == 1
+    assert box.get(sent_id) is None
+    assert not box.purge(sending_id)
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from path_filter import PathFilter
+
+ROOT = os.path.abspath("vault")
+
+
+def path(rel):
+    return os.path.join(ROOT, *rel.split("/"))
+
+
+@pytest.mark.parametrize("rel, allowed", [
+    ("note.md", True),
+    ("Daily/2024-01-01.md", True),
+    ("image.png", False),
+    (".obsidian/workspace.md", False),
+    (".obsidian/plugins/x/data.md", False),
+    (".trash/old.md", False),
+    (".git/HEAD", False),
+    ("Projects/.obsidian-notes.md", True),
+])
+def test_default_globs(rel, allowed):
+    assert PathFilter(ROOT, ["*.md"], [".obsidian/**", ".trash/**", ".git/**"]).allows(path(rel)) is allowed
+
+
+def test_double_star_prefix_also_matches_at_the_top_level():
+    path_filter = PathFilter(ROOT, ["*.md"], ["**/Templates/**"])
+    assert not path_filter.allows(path("Templates/daily.md"))
+    assert not path_filter.allows(path("Work/Templates/weekly.md"))
+    assert path_filter.allows(path("Work/notes.md"))
+
+
+def test_no_include_globs_allows_everything_not_excluded():
+    path_filter = PathFilter(ROOT, [], [".obsidian/**"])
+    assert path_filter.allows(path("image.png"))
+    assert not path_filter.allows(path(".obsidian/app.json"))
+
+
+def test_excluded_directories_are_recognised():
+    path_filter = PathFilter(ROOT, ["*.md"], [".obsidian/**", "Archive/**"])
+    assert path_filter.excludes_dir(path(".obsidian"))
+    assert path_filter.excludes_dir(path("Archive"))
+    assert not path_filter.excludes_dir(path("Daily"))
+
+
+def test_relative_paths_are_resolved_against_the_vault():
+    path_filter = PathFilter(ROOT, ["*.md"], [".obsidian/**"])
+    assert path_filter.relative(os.path.relpath(path("Daily/a.md"))) == "Daily/a.md"
@@ -0,0 +1,123 @@
+import os
+
+import pytest
+from watchdog.events import FileSystemEventHandler
+
+import service
+from conftest import wait_for
+from path_filter import PathFilter
+from polling_observer import SnapshotPollingObserver
+
+
+class Recorder(FileSystemEventHandler):
+    def __init__(self, root):
+        self.path_filter = PathFilter(str(root), ["*.md"], [".obsidian/**"])
+        self.events = []
+
+    def dispatch(self, event):
+        self.events.append((event.event_type, os.path.basename(event.src_path),
+                            os.path.basename(getattr(event, "dest_path", "") or "")))
+
+    def take(self):
+        events, self.events = self.events, []
+        return sorted(events)
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / "vault"
+    (root / "Daily").mkdir(parents=True)
+    (root / ".obsidian").mkdir()
+    (root / "Daily" / "a.md").write_text("a")
+    return root
+
+
+def make_observer(vault, sweep_interval=0):
+    observer = SnapshotPollingObserver(sweep_interval=sweep_interval, workers=2)
+    handler = Recorder(vault)
+    observer.schedule(handler, str(vault), recursive=True)
+    observer._snapshot_new_watches()
+    return observer, handler
+
+
+def bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 2_000_000_000))
+
+
+def test_nothing_changed_means_no_events(vault):
+    observer, handler = make_observer(vault)
+    assert observer._poll() is False
+    assert handler.take() == []
+
+
+def test_create_delete_and_rename_are_reported(vault):
+    observer, handler = make_observer(vault)
+    (vault / "Daily" / "b.md").write_text("b")
+    (vault / ".obsidian" / "ignored.md").write_text("x")
+    observer._poll()
+    assert handler.take() == [("created", "b.md", ""), ("modified", "b.md", "")]
+
+    os.rename(vault / "Daily" / "b.md", vault / "Daily" / "c.md")
+    os.remove(vault / "Daily" / "a.md")
+    observer._poll()
+    assert handler.take() == [("deleted", "a.md", ""), ("moved", "b.md", "c.md")]
+
+
+def test_new_directory_is_snapshotted_with_its_files(vault):
+    observer, handler = make_observer(vault)
+    (vault / "Projects" / "Deep").mkdir(parents=True)
+    (vault / "Projects" / "Deep" / "p.md").write_text("p")
+    observer._poll()
+    events = handler.take()
+    assert ("created", "Projects", "") in events
+    assert ("created", "p.md", "") in events
+
+    (vault / "Projects" / "Deep" / "q.md").write_text("q")
+    observer._poll()
+    assert ("created", "q.md", "") in handler.take()
+
+
+def test_in_place_edit_of_a_recent_file_is_found_by_restat(vault):
+    observer, handler = make_observer(vault)
+    (vault / "Daily" / "b.md").write_text("b")
+    observer._poll()
+    handler.take()
+    # Writing to an existing file does not change its directory's mtime
+    with open(vault / "Daily" / "b.md", "a") as file:
+        file.write("more")
+    observer._poll()
+    assert handler.take() == [("modified", "b.md", "")]
+
+
+def test_in_place_edit_of_a_quiet_file_is_found_by_the_sweep(vault):
+    observer, handler = make_observer(vault, sweep_interval=1e-9)
+    bump_mtime(vault / "Daily" / "a.md")
+    observer._poll()
+    assert handler.take() == [("modified", "a.md", "")]
+
+
+def test_interval_max_is_never_below_min():
+    assert SnapshotPollingObserver(interval_min=1, interval_max=4).interval_max == 4
+    assert SnapshotPollingObserver(interval_min=5, interval_max=1).interval_max == 5
+
+
+def test_watcher_runs_on_the_polling_observer(store, vault):
+    handler = service.ObsidianHandler(str(vault))
+    touched = []
+    handler.debouncer.touch = touched.append
+    observer = SnapshotPollingObserver(interval_min=0.05, interval_max=0.05, sweep_interval=0.05)
+    service.schedule_vault(observer, handler, str(vault))
+    observer.start()
+    try:
+        assert wait_for(lambda: all(watch.ready for watch in observer._watches))
+        with open(vault / "Daily" / "a.md", "a") as file:
+            file.write("#sender: A\n")
+        (vault / ".obsidian" / "workspace.md").write_text("noise")
+        (vault / "Daily" / "new.md").write_text("new")
+        assert wait_for(lambda: {str(vault / "Daily" / "new.md"), str(vault / "Daily" / "a.md")} <= set(touched))
+        assert not any(".obsidian" in path for path in touched)
+    finally:
+        observer.stop()
+        observer.join()
+        handler.stop()
@@ -0,0 +1,91 @@
+import threading
+import time
+
+from conftest import wait_for
+from processing import PathWorkerPool
+
+
+def test_paths_are_handled_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+    handled = []
+
+    def handler(path):
+        barrier.wait()
+        handled.append(path)
+
+    pool = PathWorkerPool(handler, workers=3)
+    pool.start()
+    try:
+        for name in ("a.md", "b.md", "c.md"):
+            pool.submit(name)
+        assert wait_for(lambda: sorted(handled) == ["a.md", "b.md", "c.md"])
+        assert pool.stats()["completed"] == 3
+    finally:
+        pool.stop()
+
+
+def test_a_path_is_never_handled_twice_at_once():
+    release = threading.Event()
+    running = []
+    overlaps = []
+    calls = []
+
+    def handler(path):
+        if running:
+            overlaps.append(path)
+        running.append(path)
+        calls.append(path)
+        release.wait(5)
+        running.pop()
+
+    pool = PathWorkerPool(handler, workers=4)
+    pool.start()
+    try:
+        pool.submit("a.md")
+        assert wait_for(lambda: calls == ["a.md"])
+        # Edits during the pass collapse into one more pass afterwards
+        for _ in range(5):
+            pool.submit("a.md")
+        release.set()
+        assert wait_for(lambda: len(calls) == 2)
+        time.sleep(0.1)
+        assert calls == ["a.md", "a.md"]
+        assert overlaps == []
+    finally:
+        pool.stop()
+
+
+def test_queued_duplicates_are_dropped():
+    release = threading.Event()
+    calls = []
+
+    def handler(path):
+        calls.append(path)
+        if path == "block.md":
+            release.wait(5)
+
+    pool = PathWorkerPool(handler, workers=1)
+    pool.start()
+    try:
+        pool.submit("block.md")
+        assert wait_for(lambda: calls == ["block.md"])
+        for _ in range(3):
+            pool.submit("a.md")
+        release.set()
+        assert wait_for(lambda: pool.stats()["completed"] == 2)
+        assert calls == ["block.md", "a.md"]
+    finally:
+        pool.stop()
+
+
+def test_handler_errors_are_counted():
+    def handler(path):
+        raise RuntimeError("boom")
+
+    pool = PathWorkerPool(handler, workers=1)
+    pool.start()
+    try:
+        pool.submit("a.md")
+        assert wait_for(lambda: pool.stats()["failed"] == 1)
+    finally:
+        pool.stop()
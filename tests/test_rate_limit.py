@@ -0,0 +1,85 @@
+import smtplib
+import time
+
+import pytest
+
+from rate_limit import RateLimitExceeded, RateLimiter, is_throttle_response
+
+
+def test_burst_is_limited_to_the_bucket(store):
+    limiter = RateLimiter(per_second=2, per_minute=0, per_day=0, store=store)
+    limiter.acquire()
+    limiter.acquire()
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        limiter.acquire(max_wait=0)
+    assert 0 < excinfo.value.retry_after <= 0.5
+
+
+def test_acquire_waits_for_the_next_token(store):
+    limiter = RateLimiter(per_second=20, per_minute=0, per_day=0, store=store)
+    started = time.monotonic()
+    for _ in range(25):
+        limiter.acquire()
+    # 20 from the full bucket, then 5 more at 20 per second
+    assert time.monotonic() - started >= 0.2
+    assert limiter.stats()["waited_s"] > 0
+
+
+def test_daily_count_survives_a_restart(store):
+    limiter = RateLimiter(per_second=0, per_minute=0, per_day=2, store=store)
+    limiter.acquire()
+    limiter.acquire()
+    restarted = RateLimiter(per_second=0, per_minute=0, per_day=2, store=store)
+    assert restarted.stats()["sent_today"] == 2
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        restarted.acquire()
+    assert excinfo.value.retry_after > 0
+
+
+def test_accounts_have_separate_daily_budgets(store):
+    RateLimiter(per_second=0, per_minute=0, per_day=1, store=store, account="work").acquire()
+    RateLimiter(per_second=0, per_minute=0, per_day=1, store=store).acquire()
+    with pytest.raises(RateLimitExceeded):
+        RateLimiter(per_second=0, per_minute=0, per_day=1, store=store, account="work").acquire()
+
+
+def test_throttle_reply_pauses_and_slows_sending(store):
+    limiter = RateLimiter(per_second=10, per_minute=0, per_day=0, store=store)
+    assert limiter.record_failure(smtplib.SMTPDataError(421, b"Try again later"))
+    stats = limiter.stats()
+    assert stats["throttled"] == 1
+    assert stats["rate_scale"] == 0.5
+    assert stats["paused_for_s"] > 0
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire(max_wait=0)
+
+    # Successes bring the rate back up gradually
+    limiter.paused_until = 0.0
+    for _ in range(20):
+        limiter.record_success()
+    assert limiter.stats()["rate_scale"] == 1.0
+
+
+def test_backoff_doubles_on_repeated_throttling(store):
+    limiter = RateLimiter(per_second=0, per_minute=0, per_day=0, store=store)
+    first = limiter.backoff
+    limiter.record_failure(smtplib.SMTPDataError(451, b"Slow down"))
+    limiter.record_failure(smtplib.SMTPDataError(451, b"Slow down"))
+    assert limiter.backoff == first * 4
+
+
+def test_ordinary_failures_do_not_throttle(store):
+    limiter = RateLimiter(per_second=0, per_minute=0, per_day=0, store=store)
+    assert not limiter.record_failure(smtplib.SMTPDataError(554, b"Message rejected"))
+    assert limiter.stats()["throttled"] == 0
+
+
+@pytest.mark.parametrize("error, throttle", [
+    (smtplib.SMTPDataError(421, b"Service not available"), True),
+    (smtplib.SMTPDataError(550, b"5.4.5 Daily user sending quota exceeded"), True),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (452, b"Too many recipients")}), True),
+    (smtplib.SMTPDataError(550, b"No such user"), False),
+    (smtplib.SMTPServerDisconnected("dropped"), False),
+])
+def test_throttle_responses(error, throttle):
+    assert is_throttle_response(error) is throttle
@@ -0,0 +1,99 @@
+import pytest
+from watchdog.events import FileDeletedEvent
+
+import service
+from database import get_store, is_file_processed, mark_file_processed
+from tail_reader import PARSE_SECONDS
+
+NOTE = "#sender: Alice\n- [ ] buy milk\n- [x] call Bob\n#send\n"
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.queued = []
+
+    def enqueue(self, subject, recipient, body, source_path=None, content_hash=None, **kwargs):
+        self.queued.append((source_path, body))
+        mark_file_processed(source_path, content_hash)
+
+
+def file_status(file_path):
+    store = get_store()
+    store.flush()
+    row = store.connection().execute("SELECT status FROM processed_files WHERE file_path = ?", (file_path,)).fetchone()
+    return row and row[0]
+
+
+def parse_count():
+    return sum(count for _, _, count in PARSE_SECONDS._series.values())
+
+
+@pytest.fixture
+def handler(store, tmp_path, monkeypatch):
+    outbox = FakeOutbox()
+    monkeypatch.setattr(service, "get_outbox", lambda account=None: outbox)
+    monkeypatch.setattr(service, "DIGEST_MODE", False)
+    handler = service.ObsidianHandler(str(tmp_path))
+    handler.outbox = outbox
+    yield handler
+    handler.stop()
+
+
+def test_note_is_queued_once(handler, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text(NOTE)
+    handler.process_file(str(note))
+    handler.process_file(str(note))
+    assert [path for path, _ in handler.outbox.queued] == [str(note)]
+    assert "• - [ ] buy milk\n• - [x] call Bob" in handler.outbox.queued[0][1]
+
+
+def test_note_without_send_tag_is_not_queued(handler, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text("#sender: Alice\n- [ ] buy milk\n")
+    handler.process_file(str(note))
+    assert handler.outbox.queued == []
+    assert not is_file_processed(str(note))
+
+
+def test_rename_seen_as_delete_and_create_is_not_resent(handler, tmp_path):
+    old, new = tmp_path / "a.md", tmp_path / "b.md"
+    old.write_text(NOTE)
+    handler.process_file(str(old))
+    old.rename(new)
+    handler.dispatch(FileDeletedEvent(str(old)))
+    handler.process_file(str(new))
+    assert len(handler.outbox.queued) == 1
+    assert file_status(str(new)) == "renamed"
+
+
+def test_new_note_with_the_content_of_a_removed_one_is_sent(handler, tmp_path):
+    old, new = tmp_path / "a.md", tmp_path / "b.md"
+    old.write_text(NOTE)
+    handler.process_file(str(old))
+    # Deleted long ago, or while nothing was watching
+    old.unlink()
+    new.write_text(NOTE)
+    handler.process_file(str(new))
+    assert [path for path, _ in handler.outbox.queued] == [str(old), str(new)]
+
+
+def test_removal_outside_the_window_is_not_a_rename(handler, tmp_path, monkeypatch):
+    old, new = tmp_path / "a.md", tmp_path / "b.md"
+    old.write_text(NOTE)
+    handler.process_file(str(old))
+    old.unlink()
+    handler.dispatch(FileDeletedEvent(str(old)))
+    monkeypatch.setattr(service, "RENAME_WINDOW", 0.0)
+    new.write_text(NOTE)
+    handler.process_file(str(new))
+    assert [path for path, _ in handler.outbox.queued] == [str(old), str(new)]
+
+
+def test_parse_content_matches_the_tail_reader_and_is_timed(handler, tmp_path):
+    note = tmp_path / "a.md"
+    note.write_text(NOTE)
+    _, parsed = handler.tail_reader.read(str(note))
+    parses = parse_count()
+    assert handler.parse_content(NOTE) == parsed
+    assert parse_count() == parses + 1
@@ -0,0 +1,123 @@
+import smtplib
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from rate_limit import RateLimitExceeded
+from smtp_pool import PooledConnection, SMTPConnectionPool
+
+
+class FakeLimiter:
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.acquired = 0
+        self.successes = 0
+        self.failures = 0
+
+    def acquire(self, max_wait=None):
+        if self.budget is not None and self.acquired >= self.budget:
+            raise RateLimitExceeded("Daily sending limit reached", 60)
+        self.acquired += 1
+
+    def record_success(self):
+        self.successes += 1
+
+    def record_failure(self, error):
+        self.failures += 1
+
+
+class FakeServer:
+    """Each send pops the next scripted outcome: "ok", "drop" or an exception to raise."""
+
+    def __init__(self, outcomes, sent):
+        self.outcomes = outcomes
+        self.sent = sent
+
+    def set_debuglevel(self, level):
+        pass
+
+    def send_message(self, message):
+        outcome = self.outcomes.pop(0)
+        if outcome == "drop":
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.sent.append(message["Subject"])
+
+    def noop(self):
+        return 250, b"OK"
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def make_pool(outcomes, limiter=None, **kwargs):
+    pool = SMTPConnectionPool("localhost", 25, "user", "password", rate_limiter=limiter, **kwargs)
+    pool.sent = []
+
+    def connect():
+        pool.handshakes += 1
+        return PooledConnection(FakeServer(outcomes, pool.sent), time.monotonic())
+
+    pool._connect = connect
+    return pool
+
+
+def message(subject="hello"):
+    msg = EmailMessage()
+    msg["From"], msg["To"], msg["Subject"] = "a@example.com", "b@example.com", subject
+    msg.set_content("body")
+    return msg
+
+
+def test_sessions_are_reused_and_recycled():
+    pool = make_pool(["ok"] * 5, max_messages=2)
+    for i in range(5):
+        pool.send_message(message(f"m{i}"))
+    assert pool.sent == [f"m{i}" for i in range(5)]
+    stats = pool.stats()
+    assert stats["handshakes"] == 3
+    assert stats["recycled"] == 2
+
+
+def test_reconnect_spends_one_token():
+    limiter = FakeLimiter()
+    pool = make_pool(["drop", "ok"], limiter)
+    pool.send_message(message())
+    assert pool.sent == ["hello"]
+    assert pool.reconnects == 1
+    assert limiter.acquired == 1
+    assert limiter.successes == 1
+
+
+def test_second_drop_is_raised():
+    pool = make_pool(["drop", "drop"])
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send_message(message())
+
+
+def test_send_many_reports_each_message():
+    limiter = FakeLimiter()
+    refused = smtplib.SMTPRecipientsRefused({"b@example.com": (550, b"No such user")})
+    pool = make_pool(["ok", refused, "drop", "ok"], limiter)
+    results = []
+    pool.send_many([message("a"), message("b"), message("c")], lambda i, e: results.append((i, e)))
+    assert [(i, e is None) for i, e in results] == [(0, True), (1, False), (2, True)]
+    assert pool.sent == ["a", "c"]
+    # "c" was tried on two sessions but counted once
+    assert limiter.acquired == 3
+    assert limiter.successes == 2
+
+
+def test_send_many_fails_the_rest_when_out_of_budget():
+    limiter = FakeLimiter(budget=1)
+    pool = make_pool(["ok"] * 3, limiter)
+    results = []
+    pool.send_many([message("a"), message("b"), message("c")], lambda i, e: results.append((i, e)))
+    assert results[0] == (0, None)
+    assert [i for i, e in results[1:] if isinstance(e, RateLimitExceeded)] == [1, 2]
+    assert pool.sent == ["a"]
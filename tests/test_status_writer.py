@@ -0,0 +1,107 @@
+import os
+
+import pytest
+from watchdog.events import FileModifiedEvent, FileMovedEvent
+
+import service
+from conftest import wait_for
+from status_writer import SelfWriteRegistry, StatusWriter
+
+
+@pytest.fixture
+def registry(store):
+    return SelfWriteRegistry(store)
+
+
+@pytest.fixture
+def note(tmp_path):
+    (tmp_path / "vault").mkdir()
+    path = tmp_path / "vault" / "note.md"
+    path.write_text("#sender: Alice\n- [ ] task\n#send\n")
+    return path
+
+
+def test_atomic_write_appends_every_line_in_one_write(registry, note):
+    writer = StatusWriter(registry, mode="atomic")
+    inode = os.stat(note).st_ino
+    writer.flush({str(note): ["\nfirst\n", "\nsecond\n"]})
+    assert note.read_text() == "#sender: Alice\n- [ ] task\n#send\n\nfirst\n\nsecond\n"
+    assert os.stat(note).st_ino != inode
+    assert writer.writes == 1 and writer.lines == 2
+    assert [name for name in os.listdir(note.parent)] == ["note.md"]
+
+
+def test_own_write_is_recognised_until_the_user_edits(registry, note):
+    StatusWriter(registry, mode="atomic").flush({str(note): ["\nsent OK\n"]})
+    assert registry.match(str(note)) is not None
+    with open(note, "a") as file:
+        file.write("- [ ] added by the user\n")
+    assert registry.match(str(note)) is None
+
+
+def test_other_processes_find_writes_in_the_store(store, note):
+    StatusWriter(SelfWriteRegistry(store), mode="append").flush({str(note): ["\nsent OK\n"]})
+    assert SelfWriteRegistry(store, check_store=True).match(str(note)) is not None
+    assert SelfWriteRegistry(store).match(str(note)) is None
+
+
+def test_expired_registration_is_ignored(store, note):
+    registry = SelfWriteRegistry(store, ttl=-1)
+    StatusWriter(registry, mode="append").flush({str(note): ["\nsent OK\n"]})
+    assert registry.match(str(note)) is None
+
+
+def test_edit_between_read_and_replace_is_kept(registry, note, monkeypatch):
+    writer = StatusWriter(registry, mode="atomic")
+    stage = writer._stage
+
+    def stage_then_edit(path, lines):
+        staged = stage(path, lines)
+        if not getattr(stage_then_edit, "edited", False):
+            stage_then_edit.edited = True
+            with open(path, "a") as file:
+                file.write("- [ ] typed meanwhile\n")
+        return staged
+
+    monkeypatch.setattr(writer, "_stage", stage_then_edit)
+    writer.flush({str(note): ["\nsent OK\n"]})
+    assert note.read_text().endswith("- [ ] typed meanwhile\n\nsent OK\n")
+    assert registry.match(str(note)) is not None
+
+
+def test_sidecar_mode_leaves_the_note_alone(registry, note):
+    before = note.read_text()
+    StatusWriter(registry, mode="sidecar").flush({str(note): ["\nsent OK\n"]})
+    assert note.read_text() == before
+    assert (note.parent / "note.md.status").read_text() == "\nsent OK\n"
+
+
+def test_lines_queued_together_are_written_together(registry, note):
+    writer = StatusWriter(registry, mode="atomic", delay=0.05)
+    writer.start()
+    writer.write(str(note), "\none\n")
+    writer.write(str(note), "\ntwo\n")
+    writer.stop()
+    assert note.read_text().endswith("\none\n\ntwo\n")
+    assert writer.writes == 1
+
+
+def test_watcher_skips_events_caused_by_its_own_write(store, note, monkeypatch):
+    monkeypatch.setattr(service, "self_writes", SelfWriteRegistry(store))
+    handler = service.ObsidianHandler(str(note.parent))
+    touched = []
+    handler.debouncer.touch = touched.append
+    try:
+        StatusWriter(service.get_self_writes(), mode="atomic").flush({str(note): ["\nsent OK\n"]})
+        temp = str(note.parent / ".note.md.status-tmp")
+        handler.dispatch(FileMovedEvent(temp, str(note)))
+        handler.dispatch(FileModifiedEvent(str(note)))
+        assert touched == []
+        assert handler.manifest.matches(str(note), os.stat(note))
+
+        with open(note, "a") as file:
+            file.write("- [ ] user edit\n")
+        handler.dispatch(FileModifiedEvent(str(note)))
+        assert wait_for(lambda: touched == [str(note)])
+    finally:
+        handler.stop()
@@ -0,0 +1,82 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.smtp_sink import SMTPSink
+from conftest import wait_for
+from supervisor import VaultSupervisor, load_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_config(tmp_path, config):
+    path = tmp_path / "vaults.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def test_config_is_loaded_with_defaults(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEAM_PASSWORD", "secret")
+    accounts, vaults = load_config(write_config(tmp_path, {
+        "accounts": {"team": {"email": "team@example.com", "password_env": "TEAM_PASSWORD", "smtp_port": "2525"}},
+        "vaults": [
+            {"path": str(tmp_path / "a"), "account": "team", "exclude": ".obsidian/**, Archive/**"},
+            {"path": str(tmp_path / "b"), "recipient": "lead@example.com"},
+        ],
+    }))
+    assert accounts["team"]["password"] == "secret"
+    assert accounts["team"]["smtp_port"] == 2525
+    assert vaults[0]["exclude"] == [".obsidian/**", "Archive/**"]
+    assert vaults[0]["include"] is None
+    assert vaults[1]["account"] is None
+    assert vaults[1]["recipient"] == "lead@example.com"
+
+
+@pytest.mark.parametrize("config, error", [
+    ({"vaults": []}, "No vaults"),
+    ({"vaults": [{"recipient": "x@example.com"}]}, "needs a path"),
+    ({"vaults": [{"path": "/srv/a", "account": "nobody"}]}, "unknown account"),
+    ({"accounts": {"team": {"email": "team@example.com"}}, "vaults": [{"path": "/srv/a"}]}, "needs an email"),
+    ({"vaults": [{"path": "/srv/a"}, {"path": "/srv/a/inner"}]}, "overlap"),
+])
+def test_invalid_configs_are_rejected(tmp_path, config, error):
+    with pytest.raises(ValueError, match=error):
+        load_config(write_config(tmp_path, config))
+
+
+def test_vaults_are_sharded_across_processes():
+    vaults = [{"path": f"/srv/{name}", "account": None} for name in "abcde"]
+    assert [len(shard) for shard in VaultSupervisor(vaults, processes=2).shards] == [3, 2]
+    assert len(VaultSupervisor(vaults[:1], processes=4).shards) == 1
+
+
+def test_worker_processes_queue_mail_that_the_supervisor_sends(tmp_path):
+    sink = SMTPSink()
+    sink.start()
+    vaults = [tmp_path / "a", tmp_path / "b"]
+    for vault in vaults:
+        vault.mkdir()
+        # Picked up by each worker's startup scan
+        (vault / "note.md").write_text("#sender: Alice\n- [ ] task\n#send\n")
+    config = write_config(tmp_path, {"vaults": [{"path": str(vault)} for vault in vaults]})
+    env = dict(os.environ, DB_PATH=str(tmp_path / "vaults.db"), SMTP_SERVER="127.0.0.1", SMTP_PORT=str(sink.port),
+               DEBOUNCE_QUIET_PERIOD="0.1", RATE_LIMIT_PER_DAY="0", STATUS_WRITE_DELAY="0")
+    process = subprocess.Popen(
+        [sys.executable, "daemon.py", "--components", "watcher", "--vaults", config, "--processes", "2"],
+        cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    try:
+        assert wait_for(lambda: sink.stats()["messages"] == 2, timeout=30)
+        assert wait_for(lambda: all("sent OK" in (vault / "note.md").read_text() for vault in vaults), timeout=30)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            output, _ = process.communicate(timeout=30)
+        finally:
+            process.kill()
+            sink.stop()
+    assert process.returncode == 0, output
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from note_parser import parse_file
+from tail_reader import TAIL_ANCHOR_SIZE, TailReader
+
+LINES = ["#sender: Alice"] + [f"- [ ] journal line {i:05d}" for i in range(700)]
+
+
+@pytest.fixture
+def note(tmp_path):
+    path = tmp_path / "note.md"
+    path.write_text("\n".join(LINES) + "\n")
+    return path
+
+
+def rewrite(path, old, new):
+    path.write_text(path.read_text().replace(old, new))
+
+
+def test_append_reads_only_the_new_bytes(note):
+    reader = TailReader()
+    reader.read(str(note))
+    before = reader.stats()["bytes_read"]
+    with open(note, "a") as file:
+        file.write("#send\n")
+    digest, parsed = reader.read(str(note))
+
+    assert parsed == parse_file(str(note))
+    stats = reader.stats()
+    assert (stats["full_reads"], stats["tail_reads"]) == (1, 1)
+    # The appended line plus the anchor windows checked and saved, never the whole note
+    assert stats["bytes_read"] - before <= len("#send\n") + 4 * TAIL_ANCHOR_SIZE
+    assert os.path.getsize(note) > 4 * TAIL_ANCHOR_SIZE
+
+
+def test_same_length_edit_in_the_middle_is_noticed(note):
+    reader = TailReader()
+    first_digest, _ = reader.read(str(note))
+    rewrite(note, "- [ ] journal line 00200", "- [x] journal line 00200")
+
+    digest, parsed = reader.read(str(note))
+    assert digest != first_digest
+    assert "- [x] journal line 00200" in parsed[2]
+    assert reader.stats()["full_reads"] == 2
+    # The prefix verification counts as I/O
+    assert reader.stats()["bytes_read"] >= 3 * os.path.getsize(note)
+
+    with open(note, "a") as file:
+        file.write("#send\n")
+    assert reader.read(str(note))[1] == parse_file(str(note))
+
+
+def test_edit_near_the_end_then_append_is_noticed(note):
+    reader = TailReader()
+    reader.read(str(note))
+    rewrite(note, "- [ ] journal line 00699", "- [x] journal line 00699\n#send")
+    assert reader.read(str(note))[1] == parse_file(str(note))
+    assert reader.stats()["full_reads"] == 2
+
+
+def test_truncation_and_rewrite_start_over(note):
+    reader = TailReader()
+    reader.read(str(note))
+    note.write_text("#sender: Bob\n- [ ] short\n")
+    assert reader.read(str(note))[1] == (False, "Bob", ["- [ ] short"], [])
+
+    # A different file renamed over the note, the way editors save atomically
+    replacement = note.with_name("replacement.md")
+    replacement.write_text("#sender: Bob\n- [ ] short\n- [ ] more\n#send\n")
+    os.replace(replacement, note)
+    assert reader.read(str(note))[1] == (True, "Bob", ["- [ ] short", "- [ ] more"], [])
+    assert reader.stats()["full_reads"] == 3
+
+
+def test_partial_last_line_is_not_committed(note):
+    reader = TailReader()
+    with open(note, "a") as file:
+        file.write("#se")
+    assert reader.read(str(note))[1][0] is False
+    with open(note, "a") as file:
+        file.write("nd\n")
+    assert reader.read(str(note))[1][0] is True
+    assert reader.stats()["tail_reads"] == 1
+
+
+def test_digest_matches_a_fresh_reader(note):
+    reader = TailReader()
+    reader.read(str(note))
+    with open(note, "a") as file:
+        file.write("- [ ] appended\n")
+    assert reader.read(str(note))[0] == TailReader().read(str(note))[0]
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from database import mark_file_processed
+from path_filter import PathFilter
+from vault_scan import VaultManifest, scan_vault
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / "vault"
+    for rel in ("a.md", "Daily/b.md", "Daily/Deep/c.md", ".obsidian/d.md", "image.png"):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(rel)
+    return root
+
+
+def scan(store, vault):
+    manifest = VaultManifest(store, root=str(vault))
+    queued = []
+    report = scan_vault(str(vault), PathFilter(str(vault), ["*.md"], [".obsidian/**"]), manifest, queued.append)
+    return report, sorted(os.path.relpath(path, vault) for path in queued), manifest
+
+
+def record_all(manifest, vault, rels):
+    for rel in rels:
+        path = str(vault / rel)
+        manifest.record(path, os.stat(path))
+    manifest.flush()
+
+
+def test_first_scan_queues_every_included_note(store, vault):
+    report, queued, _ = scan(store, vault)
+    assert queued == ["Daily/Deep/c.md", "Daily/b.md", "a.md"]
+    assert report["files"] == 3
+    assert report["queued"] == 3
+
+
+def test_only_changed_notes_are_queued_next_time(store, vault):
+    _, _, manifest = scan(store, vault)
+    record_all(manifest, vault, ["a.md", "Daily/b.md", "Daily/Deep/c.md"])
+
+    (vault / "Daily" / "b.md").write_text("edited while stopped")
+    (vault / "new.md").write_text("created while stopped")
+    report, queued, _ = scan(store, vault)
+    assert queued == ["Daily/b.md", "new.md"]
+    assert report["unchanged"] == 2
+
+
+def test_processed_notes_are_recorded_instead_of_queued(store, vault):
+    mark_file_processed(str(vault / "a.md"))
+    report, queued, _ = scan(store, vault)
+    assert "a.md" not in queued
+    assert report["already_processed"] == 1
+    # The manifest now knows it, so the next scan does not even look it up
+    assert scan(store, vault)[0]["unchanged"] == 1
+
+
+def test_deleted_notes_leave_the_manifest(store, vault):
+    _, _, manifest = scan(store, vault)
+    record_all(manifest, vault, ["a.md", "Daily/b.md"])
+    (vault / "a.md").unlink()
+    report, _, _ = scan(store, vault)
+    assert report["removed"] == 1
+    assert VaultManifest(store, root=str(vault)).paths() == {str(vault / "Daily" / "b.md")}
+
+
+def test_manifest_only_loads_its_own_vault(store, tmp_path):
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "x.md").write_text("x")
+    manifest = VaultManifest(store, root=str(other))
+    manifest.record(str(other / "x.md"), os.stat(other / "x.md"))
+    manifest.flush()
+    assert len(VaultManifest(store, root=str(tmp_path / "vault"))) == 0
+    assert len(VaultManifest(store, root=str(other))) == 1
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+from watchdog.observers import Observer
+
+import service
+from conftest import wait_for
+from database import is_file_processed, mark_file_processed
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / "vault"
+    (root / ".obsidian").mkdir(parents=True)
+    (root / "Daily").mkdir()
+    (root / "Daily" / "a.md").write_text("#sender: A\n- [ ] sent already\n#send\n")
+    (root / "Daily" / "b.md").write_text("#sender: B\n- [ ] draft\n")
+    return root
+
+
+@pytest.fixture
+def watched(store, vault):
+    handler = service.ObsidianHandler(str(vault))
+    touched = []
+    handler.debouncer.touch = touched.append
+    observer = Observer()
+    service.schedule_vault(observer, handler, str(vault))
+    observer.start()
+    yield handler, touched
+    observer.stop()
+    observer.join()
+    handler.stop()
+
+
+def test_excluded_top_level_directory_prunes_the_watch(watched, vault):
+    _, touched = watched
+    (vault / ".obsidian" / "workspace.md").write_text("noise")
+    (vault / "Daily" / "b.md").write_text("#sender: B\n- [ ] edited\n")
+    assert wait_for(lambda: str(vault / "Daily" / "b.md") in touched)
+    assert not any(".obsidian" in path for path in touched)
+
+
+def test_renamed_top_level_directory_reports_new_paths(watched, vault):
+    handler, touched = watched
+    mark_file_processed(str(vault / "Daily" / "a.md"))
+
+    os.rename(vault / "Daily", vault / "Journal")
+    # The notes inside are moved with their processed state
+    assert wait_for(lambda: is_file_processed(str(vault / "Journal" / "a.md")))
+
+    with open(vault / "Journal" / "b.md", "a") as file:
+        file.write("- [ ] more\n")
+    assert wait_for(lambda: str(vault / "Journal" / "b.md") in touched)
+    assert not any(path.startswith(str(vault / "Daily")) for path in touched)
+
+
+def test_directory_moved_into_the_vault_is_watched(watched, vault, tmp_path):
+    _, touched = watched
+    outside = tmp_path / "Projects"
+    outside.mkdir()
+    (outside / "c.md").write_text("#sender: C\n")
+    os.rename(outside, vault / "Projects")
+    # Let the new directory's watch be set up before writing into it
+    time.sleep(0.2)
+
+    with open(vault / "Projects" / "c.md", "a") as file:
+        file.write("- [ ] task\n")
+    assert wait_for(lambda: str(vault / "Projects" / "c.md") in touched)
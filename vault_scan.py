@@ -0,0 +1,167 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from database import get_store, is_file_processed
+
+# Startup scan configuration
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "8"))
+SCAN_PROGRESS_INTERVAL = float(os.getenv("SCAN_PROGRESS_INTERVAL", "2"))
+MANIFEST_BATCH_SIZE = 500
+
+
+class VaultManifest:
+    """
+    Persisted (size, mtime_ns) per vault file as of the last time it was handled.
+
+    Loaded into memory once; updates are buffered and written to the
+    vault_manifest table in batches. With root, only entries under that
+    directory are loaded, so several vaults can share the table.
+    """
+
+    def __init__(self, store=None, root=None):
+        self.store = store or get_store()
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pending = {}
+        conn = self.store.connection()
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vault_manifest
+                (file_path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)
+            ''')
+        if root is None:
+            rows = conn.execute("SELECT file_path, size, mtime_ns FROM vault_manifest")
+        else:
+            prefix = os.path.join(root, "")
+            rows = conn.execute(
+                "SELECT file_path, size, mtime_ns FROM vault_manifest WHERE file_path >= ? AND file_path < ?",
+                (prefix, prefix + "\uffff"),
+            )
+        for file_path, size, mtime_ns in rows:
+            self._entries[file_path] = (size, mtime_ns)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def matches(self, file_path, st):
+        with self._lock:
+            return self._entries.get(file_path) == (st.st_size, st.st_mtime_ns)
+
+    def paths(self):
+        with self._lock:
+            return set(self._entries)
+
+    def record(self, file_path, st):
+        entry = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if self._entries.get(file_path) == entry:
+                return
+            self._entries[file_path] = entry
+            self._pending[file_path] = entry
+            flush_now = len(self._pending) >= MANIFEST_BATCH_SIZE
+        if flush_now:
+            self.flush()
+
+    def remove(self, file_paths):
+        with self._lock:
+            for file_path in file_paths:
+                self._entries.pop(file_path, None)
+                self._pending[file_path] = None
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts = [(path, entry[0], entry[1]) for path, entry in pending.items() if entry is not None]
+        deletes = [(path,) for path, entry in pending.items() if entry is None]
+        conn = self.store.connection()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO vault_manifest (file_path, size, mtime_ns) VALUES (?, ?, ?)", upserts
+                )
+                conn.executemany("DELETE FROM vault_manifest WHERE file_path = ?", deletes)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to write vault manifest: {e}")
+
+
+def _scan_directory(path, path_filter):
+    """List one directory; returns (subdirectories, [(file_path, stat_result)])."""
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not path_filter.excludes_dir(entry.path):
+                            subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and path_filter.allows(entry.path):
+                        files.append((entry.path, entry.stat(follow_symlinks=False)))
+                except OSError:
+                    continue
+    except OSError as e:
+        logging.warning(f"Cannot scan {path}: {e}")
+    return subdirs, files
+
+
+def scan_vault(vault_path, path_filter, manifest, submit, workers=SCAN_WORKERS):
+    """
+    Catch up on changes made while the service was not running.
+
+    Walks the vault with os.scandir, one directory per task on a thread pool,
+    and compares each included file's stat with the manifest. Files that are
+    new or changed and not yet processed are passed to submit(); nothing is
+    read. Returns a summary with counts and the duration.
+    """
+    start = time.monotonic()
+    last_report = start
+    seen = set()
+    counts = {"directories": 0, "files": 0, "queued": 0, "unchanged": 0, "already_processed": 0}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan") as executor:
+        running = {executor.submit(_scan_directory, vault_path, path_filter)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, files = future.result()
+                counts["directories"] += 1
+                for subdir in subdirs:
+                    running.add(executor.submit(_scan_directory, subdir, path_filter))
+                for file_path, st in files:
+                    counts["files"] += 1
+                    seen.add(file_path)
+                    if manifest.matches(file_path, st):
+                        counts["unchanged"] += 1
+                    elif is_file_processed(file_path):
+                        counts["already_processed"] += 1
+                        manifest.record(file_path, st)
+                    else:
+                        counts["queued"] += 1
+                        submit(file_path)
+
+            now = time.monotonic()
+            if now - last_report >= SCAN_PROGRESS_INTERVAL:
+                last_report = now
+                logging.info(
+                    f"Vault scan: {counts['directories']} directories, {counts['files']} files, "
+                    f"{counts['queued']} queued ({now - start:.1f}s)"
+                )
+
+    # Forget files that disappeared while we were down
+    removed = manifest.paths() - seen
+    manifest.remove(removed)
+    manifest.flush()
+
+    counts["removed"] = len(removed)
+    counts["duration_s"] = round(time.monotonic() - start, 3)
+    logging.info(
+        f"Vault scan finished in {counts['duration_s']}s: {counts['files']} files, "
+        f"{counts['queued']} queued, {counts['unchanged']} unchanged"
+    )
+    return counts